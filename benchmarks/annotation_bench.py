@@ -0,0 +1,171 @@
+"""アノテーションの多い合成コーパスを使ってDatabaseLoaderの共参照・述語項・意味役割の読み込み速度を計測する
+    USAGE: リポジトリのルートで実行する
+        python -m benchmarks.annotation_bench --docs 100 --sents 20
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from nlelement import database, myprogress, nlelement
+from nlelement.testutil import testsamplemaker
+
+
+class LegacyDatabaseLoader(database.DatabaseLoader):
+    """照応詞・先行詞ごとにget_token_refで(SID, TID)を問い合わせていた以前の実装(比較用)
+    """
+    def get_token_ref(self, token_id):
+        cursor = self.connector.cursor()
+        cursor.execute("""SELECT sent.SID, token.TID From SENTENCES as sent, TOKENS as token
+            where sent.id = token.sentence_id and token.id = ?
+        """, (token_id,))
+        return cursor.fetchone()
+
+    def __legacy_ref__(self, ant_token_id, ant_stid):
+        if ant_stid is not None:
+            return nlelement.TokenReference(*ant_stid)
+        elif ant_token_id <= database.EXOREFERENCE_ID_BEGIN:
+            return nlelement.ExoReference(-ant_token_id+database.EXOREFERENCE_ID_BEGIN)
+        return None
+
+    def load_semroles(self, document, doc_id):
+        cursor = self.connector.cursor()
+        cursor.execute("""
+            SELECT * FROM SemanticRole WHERE PREDICATE IN (
+                SELECT ID FROM TOKENS WHERE DOCUMENT_ID = ?
+            )
+            """, (doc_id,))
+        for pred_token_id, semrole, ant_token_id in cursor.fetchall():
+            pred_stid = self.get_token_ref(pred_token_id)
+            ant_stid = self.get_token_ref(ant_token_id)
+            if pred_stid is not None:
+                pred = document.refer(nlelement.TokenReference(*pred_stid))
+                ant_ref = self.__legacy_ref__(ant_token_id, ant_stid)
+                if not self.load_exophora and isinstance(ant_ref, nlelement.ExoReference):
+                    continue
+                if ant_ref is not None and pred:
+                    if not hasattr(pred, 'semroles'):
+                        setattr(pred, 'semroles', dict())
+                    pred.semroles[semrole] = ant_ref
+        cursor.execute("""
+            SELECT * FROM VerbSemantic WHERE PREDICATE IN (
+                SELECT ID FROM TOKENS WHERE DOCUMENT_ID = ?
+            )
+            """, (doc_id,))
+        for pred_token_id, semantic in cursor.fetchall():
+            pred_stid = self.get_token_ref(pred_token_id)
+            if pred_stid is not None:
+                pred = document.refer(nlelement.TokenReference(*pred_stid))
+                if pred:
+                    setattr(pred, 'semantic_label', semantic)
+
+    def load_coreference_links(self, document, doc_id):
+        cursor = self.connector.cursor()
+        queries = (
+            ("""SELECT ANAPHORA, 'coref', LINKTYPE, ANTECEDENT FROM Coreference WHERE ANAPHORA IN (
+                SELECT ID FROM TOKENS WHERE SENTENCE_ID IN (SELECT ID FROM SENTENCES WHERE DOCUMENT_ID = ?)
+            )"""),
+            ("""SELECT * FROM PredicateTerm WHERE Predicate IN (
+                SELECT ID FROM TOKENS WHERE SENTENCE_ID IN (SELECT ID FROM SENTENCES WHERE DOCUMENT_ID = ?)
+            )"""),
+        )
+        for sql in queries:
+            cursor.execute(sql, (doc_id,))
+            for ana_token_id, case, link_type, ant_token_id in cursor.fetchall():
+                ana_stid = self.get_token_ref(ana_token_id)
+                ant_stid = self.get_token_ref(ant_token_id)
+                if ana_stid is not None:
+                    ana_ref = nlelement.TokenReference(*ana_stid)
+                    anaphora = document.refer(ana_ref)
+                    ant_ref = self.__legacy_ref__(ant_token_id, ant_stid)
+                    if ant_stid and all(map(lambda x: x>=0, ant_stid)):
+                        ant_surface = document.refer(ant_ref).surface
+                    elif isinstance(ant_ref, nlelement.ExoReference):
+                        ant_surface = "Exophora {}".format(ant_ref.exo_value)
+                    else:
+                        ant_surface = ""
+                    if not self.load_exophora and isinstance(ant_ref, nlelement.ExoReference):
+                        continue
+                    entry = nlelement.CoreferenceEntry(ana_ref, ant_ref, -1, -1, ant_surface)
+                    entry.link_type = link_type
+                    anaphora.coreference_link[case] = entry
+        cursor.close()
+
+
+def make_annotated_db(filename, doc_num, sent_num, chunk_num, seed=0):
+    """すべての名詞に共参照、すべての動詞に述語項(外界照応を含む)・意味役割・意味ラベルを付けた合成文書のデータベース
+    Returns:
+        int: 保存したアノテーションの数
+    """
+    samples = testsamplemaker.NlElementSampleMaker()
+    documents = samples.synthetic_documents(doc_num, sent_num=sent_num, chunk_num=chunk_num, seed=seed)
+    rand = random.Random(seed)
+    annotation_num = 0
+    for doc in documents:
+        nouns = []
+        for tok in nlelement.tokens(doc):
+            ref = nlelement.make_reference(tok)
+            if tok.part == '名詞':
+                if nouns:
+                    samples.maker.add_coreference_link(doc, tok.sid, tok.tid, 'coref', *rand.choice(nouns))
+                    annotation_num += 1
+                nouns.append((tok.sid, tok.tid))
+            elif tok.part == '動詞':
+                for case in ('ga', 'o', 'ni'):
+                    samples.maker.add_coreference_link(doc, tok.sid, tok.tid, case, *rand.choice(nouns))
+                tok.coreference_link['ga'] = nlelement.CoreferenceEntry(ref, nlelement.ExoReference(1), 0, 0, '')
+                samples.maker.add_semantic_role(doc, tok.sid, tok.tid, '動作主', *rand.choice(nouns))
+                tok.semantic_label = '移動'
+                annotation_num += 5
+    with database.DatabaseWriter(filename, bulk=True) as writer:
+        writer.add_documents(documents)
+    return annotation_num
+
+
+def measure(label, func, *args, **kwargs):
+    begin = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - begin
+    print('{:<32}{:>10.3f} sec'.format(label, elapsed))
+    return result, elapsed
+
+
+def bench_annotation(filename, doc_num):
+    """文書ごとのアノテーションの読み込みにかかる時間とクエリ数の比較
+    文・単語は事前にロードしておき、load_coreference_linksとload_semrolesだけを計測する
+    """
+    elapsed_list = []
+    for name, loader_class in (('legacy', LegacyDatabaseLoader), ('joined', database.DatabaseLoader)):
+        with loader_class(filename, load_exophora=True) as loader:
+            documents = list(zip(loader.iter_document_rows(), loader.load_documents(batch_size=64)))
+            queries = []
+            loader.connector.set_trace_callback(queries.append)
+            def load_annotations():
+                for (doc_id, _), document in documents:
+                    loader.load_coreference_links(document, doc_id)
+                    loader.load_semroles(document, doc_id)
+            _, elapsed = measure('annotations ({})'.format(name), load_annotations)
+            loader.connector.set_trace_callback(None)
+            print('{:<32}{:>10.1f} queries/doc'.format('', len(queries) / doc_num))
+            elapsed_list.append(elapsed)
+    print('{:<32}{:>10.2f} x'.format('  speedup', elapsed_list[0] / elapsed_list[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=100)
+    parser.add_argument('--sents', type=int, default=20)
+    parser.add_argument('--chunks', type=int, default=5)
+    args = parser.parse_args()
+    myprogress.Progress_Mode = 'none'
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'annotated.db')
+        annotation_num, _ = measure(
+            'create annotated db', make_annotated_db, filename, args.docs, args.sents, args.chunks
+        )
+        print('{:<32}{:>10d} annotations'.format('', annotation_num))
+        bench_annotation(filename, args.docs)
+
+
+if __name__ == '__main__':
+    main()
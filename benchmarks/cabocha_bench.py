@@ -0,0 +1,232 @@
+"""合成コーパスを使ってcabocha_extended.CabochaLoaderの読み込み速度を計測する
+    USAGE: リポジトリのルートで実行する
+        python -m benchmarks.cabocha_bench --files 64 --docs 4 --sents 20 --workers 2 4
+"""
+import argparse
+import io
+import itertools
+import os
+import re
+import tempfile
+import time
+import tracemalloc
+from nlelement import cabocha_extended, database, loadercommon, myprogress
+from benchmarks.database_bench import make_synthetic_db
+from nlelement.testutil import testsamplemaker
+
+
+def make_synthetic_files(dirname, file_num, doc_num, sent_num, chunk_num):
+    """合成文書をCaboCha形式で書き出し、書き出した行数を返す
+    """
+    samples = testsamplemaker.NlElementSampleMaker()
+    line_num = 0
+    for i in range(file_num):
+        documents = samples.synthetic_documents(doc_num, sent_num=sent_num, chunk_num=chunk_num)
+        text = ''.join(cabocha_extended.dump_doc(doc) for doc in documents)
+        with open(os.path.join(dirname, 'synthetic_{:04d}.cab'.format(i)), 'w', encoding='utf-8') as file:
+            file.write(text)
+        line_num += text.count('\n')
+    return line_num
+
+
+# 合成コーパスのトークン行に付けるアノテーション列(NTC形式, 標準形式)
+NTC_ANNOTATIONS = (
+    'O', 'B-PERSON', 'id=1', 'type=pred,ga=1;0.9;0.1,o=exog;0.6;0.4', 'eq=1;1.0;0.0',
+    'type=pred,ga=exo1,ni=2;0.5;0.5', 'I-PERSON',
+)
+STANDARD_ANNOTATIONS = ('O', 'B-PERSON', 'id="1"', 'ga="1"', 'type="pred"', 'o="exog"', 'I-PERSON')
+
+
+class LegacyCabochaLoader(cabocha_extended.CabochaLoader):
+    """アノテーション列を行ごとにre.matchで解析していた以前の実装(比較用)
+    """
+    def __handle_annotation__(self, tok, annotations):
+        for anno in annotations[2:]:
+            anno = anno.rstrip('\n')
+            if re.match(r'(B|I)-.+', anno):
+                tok.named_entity = anno[0]
+                tok.named_entity_part = anno[1] if len(anno) > 2 else ''
+            elif re.match(r'(I|O)', anno):
+                pass
+            elif not self.use_standard and re.match(r'([^=]+=[-\w\d\.;]+,?)+', anno):
+                for id_resolver in anno.split(','):
+                    match = re.match(r'([^=]+)=([-\w\d\.;]+)', id_resolver)
+                    if match:
+                        self.__handle_ntc_annotation__(tok, match.group(1), match.group(2))
+            elif self.use_standard and re.match(r'[^=]+=\"[\w\d\.]+\"', anno):
+                match = re.match(r'([^=]+)=\"([\w\d\.]+)\"', anno)
+                if match:
+                    self.__handle_ntc_annotation__(tok, match.group(1), match.group(2))
+            elif self.use_standard:
+                for id_resolver in anno.split(' '):
+                    match = re.match(r'([^=]+)=\"([\w\d\.]+)\"', id_resolver)
+                    if match:
+                        self.__handle_ntc_annotation__(tok, match.group(1), match.group(2))
+
+    def __handle_ntc_annotation__(self, tok, left, right):
+        if left == 'id':
+            tup = tuple(right.split())
+            self.entity_ids[int(tup[0])] = tok
+        elif left == 'type':
+            tok.pas_type = right
+        else:
+            if not hasattr(tok, "entity_links"):
+                setattr(tok, "entity_links", dict())
+            tup = tuple(right.split(";"))
+            if len(tup) == 1:
+                tup = (tup[0], 1.0, 0.0)
+            if len(tup) == 3 or left not in ['ga', 'o', 'ni', 'eq']:
+                if left not in tok.entity_links:
+                    tok.entity_links[left] = []
+                mt = re.match(r"exo([\dg])", tup[0])
+                ref_id = int(tup[0]) if not mt else tup[0]
+                tok.entity_links[left].append((ref_id, float(tup[1]), float(tup[2])))
+
+
+def legacy_doc_to_format(document, dump_type='label'):
+    """文字列の連結で文書全体の文字列を作っていた以前のCabochaDumper.doc_to_format(比較用)
+    """
+    dumper = cabocha_extended.CabochaDumper
+    dumper.preprocess_doc(document, dump_type)
+    fmt_text = ''
+    for sentence in document.sentences:
+        sent_text = ''
+        for chunk in sentence.chunks:
+            sent_text += dumper.chunk_to_format(chunk)
+            for token in chunk.tokens:
+                result = ''
+                result += token.surface
+                result += '\t'
+                result += token.part + ','
+                result += dumper.default_aster(token.attr1) + ','
+                result += dumper.default_aster(token.attr2) + ','
+                result += '*' + ','
+                result += dumper.default_aster(token.conj_type) + ','
+                result += dumper.default_aster(token.conj_form) + ','
+                result += token.basic_surface + ','
+                result += token.read + ','
+                result += token.read + '\t'
+                result += 'B-'+token.named_entity if token.named_entity != '' else 'O'
+                entity_anno = dumper.__annotation_to_format__(token)
+                if entity_anno:
+                    result += '\t'
+                    result += entity_anno
+                result += '\n'
+                sent_text += result
+        sent_text += 'EOS\n'
+        fmt_text += sent_text
+    fmt_text += 'EOT\n'
+    dumper.postproccess_doc(document)
+    return fmt_text
+
+
+def make_annotated_text(doc_num, sent_num, chunk_num, annotations):
+    """合成文書のトークン行にアノテーション列を付けたCaboCha形式のテキスト
+    """
+    samples = testsamplemaker.NlElementSampleMaker()
+    documents = samples.synthetic_documents(doc_num, sent_num=sent_num, chunk_num=chunk_num)
+    cycle = itertools.cycle(annotations)
+    lines = []
+    for line in ''.join(cabocha_extended.dump_doc(doc) for doc in documents).splitlines():
+        if line.startswith(('*', 'EOS', 'EOT')):
+            lines.append(line)
+        else:
+            lines.append('\t'.join(line.split('\t')[:2] + [next(cycle)]))
+    return '\n'.join(lines) + '\n'
+
+
+def measure(label, func, *args, **kwargs):
+    begin = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - begin
+    print('{:<32}{:>10.3f} sec'.format(label, elapsed))
+    return result, elapsed
+
+
+def bench_load(dirname, line_num, workers_list):
+    """1プロセスでの読み込みとプロセスプールでの読み込みの比較(lines/sec)
+    """
+    loader = cabocha_extended.CabochaLoader(dirname)
+    loadercommon.feature_cache.clear()
+    _, base = measure('load()', loader.load)
+    print('{:<32}{:>10.0f} lines/sec'.format('', line_num / base))
+    print('{:<32}{:>10.1%} feature cache hit rate'.format('', loadercommon.feature_cache.hit_rate()))
+    for workers in workers_list:
+        _, elapsed = measure('load_parallel(workers={})'.format(workers), loader.load_parallel, workers=workers)
+        print('{:<32}{:>10.0f} lines/sec'.format('', line_num / elapsed))
+        print('{:<32}{:>10.2f} x'.format('  speedup', base / elapsed))
+
+
+def bench_annotation(doc_num, sent_num, chunk_num, repeat):
+    """アノテーション付きのテキストを解析する速度の以前の実装との比較(lines/sec)
+    """
+    for use_standard, annotations in ((False, NTC_ANNOTATIONS), (True, STANDARD_ANNOTATIONS)):
+        text = make_annotated_text(doc_num, sent_num, chunk_num, annotations)
+        line_num = text.count('\n') * repeat
+        syntax = 'standard' if use_standard else 'ntc'
+        elapsed_list = []
+        for name, loader_class in (('legacy', LegacyCabochaLoader), ('compiled', cabocha_extended.CabochaLoader)):
+            loader = loader_class('', use_standard=use_standard)
+            def parse():
+                for _ in range(repeat):
+                    loader.__load_document__(io.StringIO(text))
+            _, elapsed = measure('{} ({})'.format(name, syntax), parse)
+            print('{:<32}{:>10.0f} lines/sec'.format('', line_num / elapsed))
+            elapsed_list.append(elapsed)
+        print('{:<32}{:>10.2f} x'.format('  speedup', elapsed_list[0] / elapsed_list[1]))
+
+
+def bench_dump(db_filename):
+    """load_as_iterの文書を文書ごとの文字列にしてから書き込む場合とdump_toで書き込む場合の比較
+    """
+    def legacy(stream):
+        with database.DatabaseLoader(db_filename) as loader:
+            for doc in loader.load_as_iter():
+                stream.write(legacy_doc_to_format(doc).encode('utf-8'))
+    def streaming(stream):
+        with database.DatabaseLoader(db_filename) as loader:
+            cabocha_extended.dump_to(stream, loader.load_as_iter(), from_label=True)
+    with database.DatabaseLoader(db_filename) as loader:
+        documents = loader.load()
+    begin = time.process_time()
+    for doc in documents:
+        legacy_doc_to_format(doc)
+    format_base = time.process_time() - begin
+    begin = time.process_time()
+    cabocha_extended.dump_to(io.StringIO(), documents, from_label=True)
+    format_elapsed = time.process_time() - begin
+    print('{:<32}{:>10.3f} cpu sec'.format('format (string concat)', format_base))
+    print('{:<32}{:>10.3f} cpu sec'.format('format (dump_to)', format_elapsed))
+    print('{:<32}{:>10.2f} x'.format('  speedup', format_base / format_elapsed))
+    for label, func in (('load_as_iter + string', legacy), ('load_as_iter + dump_to', streaming)):
+        with open(os.devnull, 'wb') as stream:
+            tracemalloc.start()
+            measure(label, func, stream)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        print('{:<32}{:>10.1f} KiB peak'.format('', peak / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=64)
+    parser.add_argument('--docs', type=int, default=4)
+    parser.add_argument('--sents', type=int, default=20)
+    parser.add_argument('--chunks', type=int, default=5)
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--repeat', type=int, default=5, help='アノテーション解析の計測で同じテキストを解析する回数')
+    args = parser.parse_args()
+    myprogress.Progress_Mode = 'none'
+    with tempfile.TemporaryDirectory() as tmpdir:
+        line_num, _ = measure(
+            'create synthetic files', make_synthetic_files, tmpdir, args.files, args.docs, args.sents, args.chunks
+        )
+        bench_load(tmpdir, line_num, args.workers)
+        db_filename = os.path.join(tmpdir, 'synthetic.db')
+        make_synthetic_db(db_filename, args.docs * 16, args.sents, args.chunks)
+        bench_dump(db_filename)
+    bench_annotation(args.docs * 16, args.sents, args.chunks, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
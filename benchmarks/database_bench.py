@@ -0,0 +1,119 @@
+"""合成コーパスを使ってDatabaseLoaderの処理速度を計測する
+    USAGE: リポジトリのルートで実行する
+        python -m benchmarks.database_bench --docs 200 --sents 20
+"""
+import argparse
+import os
+import tempfile
+import time
+from nlelement import database, myprogress
+from nlelement.testutil import testsamplemaker
+
+
+def make_synthetic_db(filename, doc_num, sent_num, chunk_num):
+    """合成文書を保存したデータベースを作成する
+    """
+    samples = testsamplemaker.NlElementSampleMaker()
+    documents = samples.synthetic_documents(doc_num, sent_num=sent_num, chunk_num=chunk_num)
+    loader = database.DatabaseLoader(filename)
+    loader.create_tables()
+    loader.update_views()
+    loader.save(documents)
+    loader.__exit__(None, None, None)
+    return documents
+
+
+def count_rows(filename):
+    with database.DatabaseLoader(filename) as loader:
+        return sum(
+            loader.connector.execute("SELECT COUNT(*) FROM {}".format(table)).fetchone()[0]
+            for table in database.BULK_INSERT_SQL
+        )
+
+
+def measure(label, func, *args, **kwargs):
+    begin = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - begin
+    print('{:<32}{:>10.3f} sec'.format(label, elapsed))
+    return result, elapsed
+
+
+def bench_load(filename, batch_sizes):
+    """文ごと・単語ごとにクエリを発行するロードと、文書をまとめてロードする場合の比較
+    """
+    with database.DatabaseLoader(filename) as loader:
+        _, base = measure('load_documents()', loader.load_documents)
+        for batch_size in batch_sizes:
+            _, elapsed = measure(
+                'load_documents(batch_size={})'.format(batch_size), loader.load_documents, batch_size=batch_size
+            )
+            print('{:<32}{:>10.2f} x'.format('  speedup', base / elapsed))
+
+
+def bench_parallel(filename, workers_list):
+    """単一プロセスのバッチロードとプロセスプールによるロードの比較
+    """
+    with database.DatabaseLoader(filename) as loader:
+        _, base = measure('load_documents(batch_size=16)', loader.load_documents, batch_size=16)
+        for workers in workers_list:
+            for transport in ('document', 'bytes'):
+                _, elapsed = measure(
+                    'parallel(workers={}, {})'.format(workers, transport),
+                    loader.load_documents_parallel, workers=workers, transport=transport
+                )
+                print('{:<32}{:>10.2f} x'.format('  speedup', base / elapsed))
+
+
+def bench_save(tmpdir, documents):
+    """1行ずつINSERTする保存とexecutemanyでまとめて保存する場合の比較(rows/sec)
+    """
+    for label, bulk in (('save()', False), ('save(bulk=True)', True)):
+        filename = os.path.join(tmpdir, 'save_bulk.db' if bulk else 'save.db')
+        loader = database.DatabaseLoader(filename)
+        loader.create_tables()
+        loader.update_views()
+        _, elapsed = measure(label, loader.save, documents, bulk=bulk)
+        loader.__exit__(None, None, None)
+        rows = count_rows(filename)
+        print('{:<32}{:>10.0f} rows/sec ({} rows)'.format('', rows / elapsed, rows))
+
+
+def bench_build(tmpdir, documents, batch_size):
+    """インデックスを作ってから追加する場合と、DatabaseWriter.buildでインデックスを最後に作る場合の比較(rows/sec)
+    """
+    def add_documents(filename):
+        with database.DatabaseWriter(filename, bulk=True) as writer:
+            writer.add_documents(iter(documents), batch_size=batch_size)
+    def build(filename):
+        database.build(filename, iter(documents), batch_size=batch_size)
+    elapsed_list = []
+    for label, func in (('add_documents()', add_documents), ('build()', build)):
+        filename = os.path.join(tmpdir, 'build_{}.db'.format(len(elapsed_list)))
+        _, elapsed = measure(label, func, filename)
+        rows = count_rows(filename)
+        print('{:<32}{:>10.0f} rows/sec ({} rows)'.format('', rows / elapsed, rows))
+        elapsed_list.append(elapsed)
+    print('{:<32}{:>10.2f} x'.format('  speedup', elapsed_list[0] / elapsed_list[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=200)
+    parser.add_argument('--sents', type=int, default=20)
+    parser.add_argument('--chunks', type=int, default=5)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4])
+    args = parser.parse_args()
+    myprogress.Progress_Mode = 'none'
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'synthetic.db')
+        documents, _ = measure('create synthetic db', make_synthetic_db, filename, args.docs, args.sents, args.chunks)
+        bench_load(filename, args.batch_sizes)
+        bench_parallel(filename, args.workers)
+        bench_save(tmpdir, documents)
+        bench_build(tmpdir, documents, 50)
+
+
+if __name__ == '__main__':
+    main()
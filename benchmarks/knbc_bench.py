@@ -0,0 +1,72 @@
+"""合成したKNBC形式のコーパスを使ってKNBCInput.KNBCLoaderの読み込み速度を計測する
+    USAGE: リポジトリのルートで実行する
+        python -m benchmarks.knbc_bench --docs 200 --sents 10 --workers 2 4
+"""
+import argparse
+import os
+import tempfile
+import time
+from nlelement import KNBCInput
+
+SENTENCE = (
+    '# S-ID:{name}_1-1-1-{sid:02d} KNP:96/10/27 MOD:2005/03/08',
+    '* 2D <文頭><体言>',
+    '+ 2D <文頭><体言>',
+    '太郎 たろう 太郎 名詞 6 人名 5 * 0 * 0 "代表表記:太郎/たろう" <文頭><自立><内容語><文節主辞><NE:PERSON:single>',
+    'は は は 助詞 9 副助詞 2 * 0 * 0 NIL <付属>',
+    '* 2D <体言>',
+    '+ 2D <体言>',
+    '携帯 けいたい 携帯 名詞 6 サ変名詞 2 * 0 * 0 "代表表記:携帯/けいたい" <自立><内容語><文節主辞>',
+    'を を を 助詞 9 格助詞 1 * 0 * 0 NIL <付属>',
+    '* -1D <文末>',
+    '+ -1D <文末>',
+    '買う かう 買う 動詞 2 * 0 子音動詞ワ行 12 基本形 2 "代表表記:買う/かう" <自立><内容語><文節主辞>',
+    'EOS',
+)
+
+
+def make_synthetic_corpus(root, doc_num, sent_num):
+    """KNBCと同じディレクトリ構成(corpus1/文書名/文書名_文番号)で合成コーパスを書き出す
+    """
+    for i in range(doc_num):
+        name = 'KN{:04d}_Synth'.format(i)
+        dirname = os.path.join(root, 'corpus1', name)
+        os.makedirs(dirname)
+        for sid in range(1, sent_num + 1):
+            filename = os.path.join(dirname, '{}_1-1-1-{:02d}'.format(name, sid))
+            with open(filename, 'w', encoding='euc-jp') as file:
+                file.write('\n'.join(SENTENCE).format(name=name, sid=sid) + '\n')
+
+
+def measure(label, func, *args, **kwargs):
+    begin = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - begin
+    print('{:<32}{:>10.3f} sec'.format(label, elapsed))
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=200)
+    parser.add_argument('--sents', type=int, default=10)
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4])
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        make_synthetic_corpus(tmpdir, args.docs, args.sents)
+        _, base = measure('load()', KNBCInput.KNBCLoader(tmpdir).load)
+        for workers in args.workers:
+            _, elapsed = measure(
+                'load_parallel(workers={})'.format(workers), KNBCInput.KNBCLoader(tmpdir).load_parallel, workers
+            )
+            print('{:<32}{:>10.2f} x'.format('  speedup', base / elapsed))
+        cache_dir = os.path.join(tmpdir, 'cache')
+        measure('load() (cold cache)', KNBCInput.KNBCLoader(tmpdir, cache_dir=cache_dir).load)
+        loader = KNBCInput.KNBCLoader(tmpdir, cache_dir=cache_dir)
+        _, elapsed = measure('load() (warm cache)', loader.load)
+        print('{:<32}{:>10.2f} x'.format('  speedup', base / elapsed))
+        print('{:<32}{:>10d} hits'.format('', loader.cache.hits))
+
+
+if __name__ == '__main__':
+    main()
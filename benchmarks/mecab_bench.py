@@ -0,0 +1,82 @@
+"""MeCabParserとMorphUnpackerの処理速度を計測する
+    USAGE: リポジトリのルートで実行する(MeCabの辞書がない環境ではMorphUnpackerのみ計測する)
+        python -m benchmarks.mecab_bench --sents 2000 --workers 2 4
+"""
+import argparse
+import time
+from nlelement.loaders import mecab
+
+SAMPLE_SENTENCES = (
+    '太郎は昨日東京で新しい車を買った。',
+    '花子が図書館で借りた本を読んでいる。',
+    '明日の会議は午後三時から始まる予定です。',
+    '彼はその問題について何も知らないと言った。',
+)
+# MorphUnpackerの計測に使う素性文字列(ipadic形式)
+SAMPLE_FEATURES = (
+    '名詞,固有名詞,人名,名,*,*,太郎,タロウ,タロー',
+    '助詞,係助詞,*,*,*,*,は,ハ,ワ',
+    '名詞,副詞可能,*,*,*,*,昨日,キノウ,キノー',
+    '助詞,格助詞,一般,*,*,*,で,デ,デ',
+    '動詞,自立,*,*,五段・ワ行促音便,連用タ接続,買う,カッ,カッ',
+    '助動詞,*,*,*,特殊・タ,基本形,た,タ,タ',
+    '記号,句点,*,*,*,*,。,。,。',
+)
+
+
+def measure(label, func, *args, **kwargs):
+    begin = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - begin
+    print('{:<32}{:>10.3f} sec'.format(label, elapsed))
+    return result, elapsed
+
+
+def bench_unpacker(token_num):
+    """素性文字列を毎回分割して変換する場合とキャッシュを使う場合の比較(tokens/sec)
+    """
+    unpacker = mecab.MorphUnpacker.ipadic()
+    features = [SAMPLE_FEATURES[i % len(SAMPLE_FEATURES)] for i in range(token_num)]
+    def unpack():
+        for feature in features:
+            unpacker.unpack('表層', feature.split(','))
+    def unpack_string():
+        for feature in features:
+            unpacker.unpack_string('表層', feature)
+    _, base = measure('unpack()', unpack)
+    print('{:<32}{:>10.0f} tokens/sec'.format('', token_num / base))
+    _, elapsed = measure('unpack_string()', unpack_string)
+    print('{:<32}{:>10.0f} tokens/sec'.format('', token_num / elapsed))
+    print('{:<32}{:>10.2f} x'.format('  speedup', base / elapsed))
+
+
+def bench_parser(sent_num, workers_list):
+    """1スレッドでの解析と複数スレッドでの解析の比較(tokens/sec)
+    """
+    try:
+        parser = mecab.MeCabParser()
+    except RuntimeError:
+        print('MeCab is not available, skip parse_many')
+        return
+    texts = [SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)] for i in range(sent_num)]
+    sentences, base = measure('parse_many(workers=1)', parser.parse_many, texts)
+    token_num = sum(len(sent.tokens) for sent in sentences)
+    print('{:<32}{:>10.0f} tokens/sec'.format('', token_num / base))
+    for workers in workers_list:
+        _, elapsed = measure('parse_many(workers={})'.format(workers), parser.parse_many, texts, workers=workers)
+        print('{:<32}{:>10.0f} tokens/sec'.format('', token_num / elapsed))
+        print('{:<32}{:>10.2f} x'.format('  speedup', base / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sents', type=int, default=2000)
+    parser.add_argument('--tokens', type=int, default=200000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4])
+    args = parser.parse_args()
+    bench_unpacker(args.tokens)
+    bench_parser(args.sents, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""合成コーパスを使って文書をロードした際の単語あたりのメモリ使用量を計測する
+    USAGE: リポジトリのルートで実行する
+        python -m benchmarks.memory_bench --docs 200 --sents 20
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+from nlelement import database, myprogress, nlelement
+from benchmarks.database_bench import make_synthetic_db
+
+
+def bytes_per_token(filename, compact):
+    """データベースの全文書をロードし、ロード後に保持しているメモリを単語数で割った値を返す
+    """
+    with database.DatabaseLoader(filename, compact=compact) as loader:
+        gc.collect()
+        tracemalloc.start()
+        documents = loader.load_documents(batch_size=16)
+        gc.collect()
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    token_num = sum(len(sentence.tokens) for doc in documents for sentence in doc.sentences)
+    return current / token_num, token_num
+
+
+def columns_bytes_per_token(filename):
+    """データベースの全文書を列指向の表現でロードした場合の単語あたりのメモリ使用量
+    """
+    with database.DatabaseLoader(filename) as loader:
+        gc.collect()
+        tracemalloc.start()
+        corpus = loader.load_columns()
+        gc.collect()
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    return current / corpus.token_count()
+
+
+# 記号表でまとめている単語の文字列属性
+TOKEN_STRING_ATTRS = (
+    'surface', 'basic_surface', 'read', 'part', 'attr1', 'attr2', 'pos', 'conj_type', 'conj_form', 'named_entity'
+)
+
+
+def string_sharing(filename):
+    """単語の文字列属性が単語ごとに別のオブジェクトだった場合と、実際に保持している文字列のメモリ量(bytes)
+    空文字列はもともと1つのオブジェクトなので数えない
+    """
+    with database.DatabaseLoader(filename) as loader:
+        documents = loader.load_documents(batch_size=16)
+    unshared = 0
+    objects = dict()
+    token_num = 0
+    for doc in documents:
+        for sentence in doc.sentences:
+            for token in sentence.tokens:
+                token_num += 1
+                for attr in TOKEN_STRING_ATTRS:
+                    value = getattr(token, attr)
+                    if type(value) is str and value:
+                        size = sys.getsizeof(value)
+                        unshared += size
+                        objects[id(value)] = size
+    return unshared, sum(objects.values()), token_num
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=200)
+    parser.add_argument('--sents', type=int, default=20)
+    parser.add_argument('--chunks', type=int, default=5)
+    args = parser.parse_args()
+    myprogress.Progress_Mode = 'none'
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'synthetic.db')
+        make_synthetic_db(filename, args.docs, args.sents, args.chunks)
+        base, token_num = bytes_per_token(filename, False)
+        print('{:<32}{:>10.1f} bytes/token ({} tokens)'.format('DatabaseLoader()', base, token_num))
+        compact, _ = bytes_per_token(filename, True)
+        print('{:<32}{:>10.1f} bytes/token'.format('DatabaseLoader(compact=True)', compact))
+        print('{:<32}{:>10.2f} x'.format('  reduction', base / compact))
+        column = columns_bytes_per_token(filename)
+        print('{:<32}{:>10.1f} bytes/token'.format('load_columns()', column))
+        print('{:<32}{:>10.2f} x'.format('  reduction', base / column))
+        unshared, shared, token_num = string_sharing(filename)
+        print('{:<32}{:>10.1f} bytes/token'.format('token strings (not shared)', unshared / token_num))
+        print('{:<32}{:>10.1f} bytes/token'.format('token strings (symbols)', shared / token_num))
+        print('{:<32}{:>10.1f} bytes/token'.format('  saved', (unshared - shared) / token_num))
+
+
+if __name__ == '__main__':
+    main()
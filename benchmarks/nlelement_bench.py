@@ -0,0 +1,147 @@
+"""合成文書を使って文書内の参照解決や文字位置の計算の処理時間を計測する
+    USAGE: リポジトリのルートで実行する
+        python -m benchmarks.nlelement_bench --sents 250 500 1000
+"""
+import argparse
+import time
+from nlelement import nlelement
+from nlelement.testutil import testsamplemaker
+
+
+def measure(func, *args, repeat=3):
+    """repeat回実行した中で最も短い処理時間を返す
+    """
+    best = None
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - begin
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def linear_refer_sentence(doc, sid):
+    """索引を使わない(以前の)refer_sentenceの実装
+    """
+    try:
+        return next(filter(lambda x: x.sid == sid, doc.sentences))
+    except StopIteration:
+        return None
+
+
+def resolve_all(doc, refer_sentence):
+    """文書中のすべての単語の参照を文経由で解決する
+    """
+    for tok in nlelement.tokens(doc):
+        ref = nlelement.make_reference(tok)
+        assert refer_sentence(doc, ref.sid).tokens[ref.tid] is tok
+
+
+def linear_get_position(doc, tok):
+    """索引を使わない(以前の)get_positionの単語の場合の実装
+    """
+    return sum(map(lambda t: len(t.surface), filter(lambda t: t.sid < tok.sid or t.sid == tok.sid and t.tid < tok.tid, nlelement.tokens(doc))))
+
+
+def linear_position_to_token(doc, position):
+    """索引を使わない(以前の)position_to_tokenの実装
+    """
+    lensum = 0
+    for tok in nlelement.tokens(doc):
+        if lensum + len(tok.surface) > position:
+            return tok
+        lensum += len(tok.surface)
+    return None
+
+
+def round_trip_positions(doc, get_position, position_to_token, step):
+    """step単語おきに単語→文字位置→単語の変換を行う
+    """
+    for tok in list(nlelement.tokens(doc))[::step]:
+        assert position_to_token(doc, get_position(doc, tok)) is tok
+
+
+def bench_positions(documents, step):
+    print('{:<10}{:>10}{:>14}{:>14}'.format('sentences', 'queries', 'linear(sec)', 'indexed(sec)'))
+    for doc in documents:
+        query_num = len(list(nlelement.tokens(doc))[::step])
+        linear = measure(round_trip_positions, doc, linear_get_position, linear_position_to_token, step, repeat=1)
+        indexed = measure(round_trip_positions, doc, nlelement.get_position, nlelement.position_to_token, step)
+        print('{:<10}{:>10}{:>14.4f}{:>14.4f}'.format(len(doc.sentences), query_num, linear, indexed))
+
+
+def linear_convert_tid(dest_doc, src_doc, ref):
+    """累積和を使わない(以前の)ReferenceConverterの単語の変換(conv_type='head', count_funcなし)
+    """
+    count = 0
+    for sent in src_doc.sentences:
+        if sent.sid == ref.sid:
+            for token in sent.tokens:
+                if token.tid == ref.tid:
+                    break
+                count += token.get_length()
+            break
+        count += sent.get_length()
+    dest_count = 0
+    for sent in dest_doc.sentences:
+        length = sent.get_length()
+        if dest_count + length > count:
+            for token in sent.tokens:
+                length = token.get_length()
+                if dest_count + length > count:
+                    return nlelement.TokenReference(sent.sid, token.tid)
+                dest_count += length
+            return nlelement.TokenReference(sent.sid, -1)
+        dest_count += length
+    return nlelement.TokenReference(-1, -1)
+
+
+def bench_converter(documents, step):
+    """同じ文書の単語を1文字ずつに分割した文書への参照の変換
+    """
+    print('{:<10}{:>10}{:>14}{:>14}'.format('sentences', 'refs', 'linear(sec)', 'indexed(sec)'))
+    for doc in documents:
+        char_doc = nlelement.Document()
+        for sent in doc.sentences:
+            char_sent = nlelement.Sentence()
+            char_sent.sid = sent.sid
+            for tid, char in enumerate(sent.get_surface()):
+                token = nlelement.Token()
+                token.sid, token.tid, token.surface = sent.sid, tid, char
+                char_sent.tokens.append(token)
+            char_doc.sentences.append(char_sent)
+        refs = [nlelement.make_reference(tok) for tok in list(nlelement.tokens(doc))[::step]]
+        converter = nlelement.ReferenceConverter(char_doc, doc)
+        assert converter.convert_many(refs) == [linear_convert_tid(char_doc, doc, ref) for ref in refs]
+        linear = measure(lambda: [linear_convert_tid(char_doc, doc, ref) for ref in refs], repeat=1)
+        indexed = measure(lambda: nlelement.ReferenceConverter(char_doc, doc).convert_many(refs))
+        print('{:<10}{:>10}{:>14.4f}{:>14.4f}'.format(len(doc.sentences), len(refs), linear, indexed))
+
+
+def bench_refer_sentence(documents):
+    print('{:<10}{:>10}{:>14}{:>14}'.format('sentences', 'tokens', 'linear(sec)', 'indexed(sec)'))
+    for doc in documents:
+        token_num = sum(len(sentence.tokens) for sentence in doc.sentences)
+        linear = measure(resolve_all, doc, linear_refer_sentence)
+        indexed = measure(resolve_all, doc, nlelement.Document.refer_sentence)
+        print('{:<10}{:>10}{:>14.4f}{:>14.4f}'.format(len(doc.sentences), token_num, linear, indexed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sents', type=int, nargs='+', default=[250, 500, 1000])
+    parser.add_argument('--chunks', type=int, default=5)
+    parser.add_argument('--position-step', type=int, default=10, help='文字位置や参照の変換を行う単語の間隔')
+    args = parser.parse_args()
+    samples = testsamplemaker.NlElementSampleMaker()
+    documents = [
+        samples.synthetic_document('BENCH_{}'.format(sent_num), sent_num=sent_num, chunk_num=args.chunks)
+        for sent_num in args.sents
+    ]
+    bench_refer_sentence(documents)
+    bench_positions(documents, args.position_step)
+    bench_converter(documents, args.position_step)
+
+
+if __name__ == '__main__':
+    main()
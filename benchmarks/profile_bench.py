@@ -0,0 +1,65 @@
+"""DatabaseWriter, DatabaseLoaderの接続の設定(CONNECTION_PROFILES)ごとの書き込み・読み込み速度を計測する
+    USAGE: リポジトリのルートで実行する(一時ディレクトリの置き場所で結果が大きく変わるので--dirで指定できる)
+        python -m benchmarks.profile_bench --docs 500 --sents 20 --dir .
+"""
+import argparse
+import os
+import tempfile
+from nlelement import database, myprogress
+from nlelement.testutil import testsamplemaker
+from benchmarks.database_bench import count_rows, measure
+
+
+def bench_write(tmpdir, documents, batch_size):
+    """既定の設定とbulk_loadで合成文書を書き込む速度の比較(rows/sec)
+    """
+    filenames = {}
+    elapsed_list = []
+    for profile in (None, 'bulk_load'):
+        filename = os.path.join(tmpdir, '{}.db'.format(profile or 'default'))
+        def write():
+            with database.DatabaseWriter(filename, bulk=True, profile=profile) as writer:
+                writer.add_documents(iter(documents), batch_size=batch_size)
+        _, elapsed = measure('write ({})'.format(profile or 'default'), write)
+        rows = count_rows(filename)
+        print('{:<32}{:>10.0f} rows/sec ({} rows)'.format('', rows / elapsed, rows))
+        filenames[profile] = filename
+        elapsed_list.append(elapsed)
+    print('{:<32}{:>10.2f} x'.format('  speedup', elapsed_list[0] / elapsed_list[1]))
+    return filenames[None]
+
+
+def bench_read(filename, repeat):
+    """既定の設定とread_onlyでload_as_iterする速度の比較
+    """
+    elapsed_list = []
+    for profile in (None, 'read_only'):
+        def read():
+            for _ in range(repeat):
+                with database.DatabaseLoader(filename, profile=profile) as loader:
+                    for _ in loader.load_as_iter(batch_size=16):
+                        pass
+        _, elapsed = measure('load_as_iter ({})'.format(profile or 'default'), read)
+        elapsed_list.append(elapsed)
+    print('{:<32}{:>10.2f} x'.format('  speedup', elapsed_list[0] / elapsed_list[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=500)
+    parser.add_argument('--sents', type=int, default=20)
+    parser.add_argument('--chunks', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--dir', default=None, help='データベースを作る一時ディレクトリの親ディレクトリ')
+    args = parser.parse_args()
+    myprogress.Progress_Mode = 'none'
+    samples = testsamplemaker.NlElementSampleMaker()
+    documents = samples.synthetic_documents(args.docs, sent_num=args.sents, chunk_num=args.chunks)
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmpdir:
+        filename = bench_write(tmpdir, documents, args.batch_size)
+        bench_read(filename, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
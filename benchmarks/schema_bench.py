@@ -0,0 +1,70 @@
+"""スキーマv1のデータベースをmigrateでv2に移行する前後のロード速度を計測する
+    USAGE: リポジトリのルートで実行する
+        python -m benchmarks.schema_bench --docs 200 --sents 20
+"""
+import argparse
+import os
+import tempfile
+from nlelement import database, myprogress
+from benchmarks.database_bench import make_synthetic_db, measure
+
+# 現在のスキーマをv1(Schema_Version導入前のTables.sql, Indices.sql)の状態に戻すスクリプト
+DOWNGRADE_V1_SQL = """
+    DROP TABLE Schema_Version;
+    DROP INDEX Sentence_Doc_Sid_Idx;
+    DROP INDEX Chunk_Sent_Cid_Idx;
+    DROP INDEX Token_Sent_Tid_Idx;
+    DROP INDEX Token_Doc_Idx;
+    DROP INDEX Token_Tag_Cover_Idx;
+    CREATE INDEX Sentence_Idx ON Sentences(DOCUMENT_ID);
+    CREATE INDEX Chunk_Idx ON Chunks(SENTENCE_ID);
+    CREATE INDEX Token_Sent_Idx ON Tokens(SENTENCE_ID);
+    CREATE INDEX Token_Doc_Idx ON Tokens(SENTENCE_ID);
+    CREATE INDEX Token_Tag_Idx ON Token_Tags(TOKEN);
+    CREATE INDEX DOCNAME_IDX ON Documents(Name);
+"""
+QUERIES = (
+    "SELECT * FROM SENTENCES WHERE DOCUMENT_ID = 1 ORDER BY SID",
+    "SELECT * FROM CHUNKS WHERE SENTENCE_ID = 1 ORDER BY CID",
+    "SELECT * FROM TOKENS WHERE SENTENCE_ID = 1 ORDER BY TID",
+    "SELECT * FROM TOKENS WHERE DOCUMENT_ID = 1",
+)
+
+
+def print_plans(loader):
+    for sql in QUERIES:
+        plan = ' / '.join(row[-1] for row in loader.connector.execute("EXPLAIN QUERY PLAN " + sql))
+        print('  {}\n    -> {}'.format(sql, plan))
+
+
+def bench_loads(loader, label):
+    _, elapsed = measure('load_documents() ({})'.format(label), loader.load_documents)
+    _, batch_elapsed = measure('batch_size=16 ({})'.format(label), loader.load_documents, batch_size=16)
+    return elapsed, batch_elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=200)
+    parser.add_argument('--sents', type=int, default=20)
+    parser.add_argument('--chunks', type=int, default=5)
+    args = parser.parse_args()
+    myprogress.Progress_Mode = 'none'
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'synthetic.db')
+        make_synthetic_db(filename, args.docs, args.sents, args.chunks)
+        with database.DatabaseLoader(filename) as loader:
+            loader.connector.executescript(DOWNGRADE_V1_SQL)
+            print('schema v{}'.format(loader.schema_version()))
+            print_plans(loader)
+            before = bench_loads(loader, 'v1')
+            measure('migrate()', loader.migrate)
+            print('schema v{}'.format(loader.schema_version()))
+            print_plans(loader)
+            after = bench_loads(loader, 'v2')
+        for label, base, elapsed in zip(('load_documents()', 'batch_size=16'), before, after):
+            print('{:<32}{:>10.2f} x'.format('  speedup ' + label, base / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""group_concatで表層を集計するビューと、表層の表(materialize_surfaces)の上のビューに対するクエリ速度を計測する
+    USAGE: リポジトリのルートで実行する
+        python -m benchmarks.view_bench --docs 200 --sents 20
+"""
+import argparse
+import os
+import tempfile
+from nlelement import database, myprogress
+from benchmarks.database_bench import make_synthetic_db, measure
+
+QUERIES = (
+    ('CoreferenceView (1 doc)', "SELECT * FROM CoreferenceView WHERE doc_name = 'SYNTH_000000'"),
+    ('CoreferenceView (all)', "SELECT COUNT(*) FROM CoreferenceView"),
+    ('PredicateView (all)', "SELECT COUNT(*) FROM PredicateView"),
+    ('LinkView (all)', "SELECT COUNT(*) FROM LinkView"),
+)
+
+
+def run_queries(loader, repeat):
+    results = []
+    for label, sql in QUERIES:
+        def query():
+            for _ in range(repeat):
+                rows = loader.connector.execute(sql).fetchall()
+            return rows
+        rows, elapsed = measure(label, query)
+        results.append((rows, elapsed / repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=200)
+    parser.add_argument('--sents', type=int, default=20)
+    parser.add_argument('--chunks', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    myprogress.Progress_Mode = 'none'
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'synthetic.db')
+        make_synthetic_db(filename, args.docs, args.sents, args.chunks)
+        with database.DatabaseLoader(filename) as loader:
+            print('group_concat views')
+            before = run_queries(loader, args.repeat)
+            measure('materialize_surfaces()', loader.materialize_surfaces)
+            print('materialized views')
+            after = run_queries(loader, args.repeat)
+        for (label, _), (rows, base), (new_rows, elapsed) in zip(QUERIES, before, after):
+            assert sorted(rows) == sorted(new_rows), label
+            print('{:<32}{:>10.1f} ms -> {:.1f} ms ({:.1f} x)'.format(label, base * 1000, elapsed * 1000, base / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,9 +5,14 @@ KNBコーパスから素性をロードする
 TODO　だいぶコードが複雑になってきたのでリファクタリングしたい
 
 """
+import collections
 import glob
+import hashlib
+import multiprocessing
 import os
+import pickle
 import re
+import tempfile
 from enum import Enum
 from . import nlelement
 
@@ -247,6 +252,16 @@ def __convert_corpusid__(corpusids):
     cpid += int(corpusids[2])*100
     cpid += int(corpusids[3])
     return cpid
+def __document_name__(directory_path):
+    """文書ディレクトリの名前(=文書名)
+    """
+    return directory_path.replace('\\', '/').split('/')[-1]
+def __document_files__(directory_path):
+    """文書ディレクトリ内のコーパスファイルを文番号の順に並べたリスト
+    """
+    directory_path = directory_path.replace('\\', '/')
+    filenames = glob.glob(directory_path+'/'+__document_name__(directory_path)+'*')
+    return sorted(filenames, key=lambda filename: __convert_corpusid__(filename.split('_')[-1].split('-')))
 class CorpusFile:
     """ロードされたコーパスファイルを構造化
     """
@@ -267,6 +282,66 @@ class CorpusFile:
         """
         return self.text
 
+class DocumentCache:
+    """解析済みの文書をディスクに保存するキャッシュ
+    文書ディレクトリ内のファイル名と内容のハッシュをキーにするので、コーパスが変更されたら自動的に読み直す
+    """
+    # 文書の構造(解析処理)を変えた場合は上げて古いキャッシュを無効にする
+    version = 1
+    def __init__(self, cache_dir):
+        """
+        Args:
+            cache_dir (str): キャッシュファイルを保存するディレクトリ(なければ作成する)
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+    def key(self, directory_path):
+        """文書ディレクトリの内容から求めたキャッシュのキー
+        """
+        sha = hashlib.sha1('{}:{}'.format(DocumentCache.version, __document_name__(directory_path)).encode('utf-8'))
+        for filename in __document_files__(directory_path):
+            with open(filename, 'rb') as file:
+                data = file.read()
+            sha.update(os.path.basename(filename).encode('utf-8'))
+            sha.update(len(data).to_bytes(8, 'little'))
+            sha.update(data)
+        return sha.hexdigest()
+    def __path__(self, key):
+        return os.path.join(self.cache_dir, key + '.pickle')
+    def get(self, key):
+        """キャッシュされた文書を返す、ない(あるいは読めない)場合はNone
+        """
+        try:
+            with open(self.__path__(key), 'rb') as file:
+                document = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return document
+    def put(self, key, document):
+        self.put_bytes(key, pickle.dumps(document, pickle.HIGHEST_PROTOCOL))
+    def put_bytes(self, key, data):
+        """pickle済みの文書を保存する
+        書きかけのファイルを読まないように一時ファイルに書いてから置き換える
+        """
+        fd, tmpname = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(tmpname, self.__path__(key))
+        except BaseException:
+            os.remove(tmpname)
+            raise
+
+def __load_directory__(directory_path):
+    """ワーカープロセスで文書ディレクトリを解析し、pickleした文書を返す
+    呼び出し元でそのままキャッシュに書き込めるように、pickleはワーカー側で1度だけ行う
+    """
+    return pickle.dumps(Document(directory_path), pickle.HIGHEST_PROTOCOL)
+
 class KNBCLoaderIter:
     """KNBコーパス中のアノテーション済みテキストをロードする
     イテレータ風に使える予定だけどまだ1番目のファイルのロードしかできてない
@@ -286,22 +361,89 @@ class KNBCLoaderIter:
             self.__cur_dir__ = pathexpr(next(self.dir_iter))
         except StopIteration:
             raise
-        result = Document(self.__cur_dir__)
+        result = self.loader.load_directory(self.__cur_dir__)
         return result
 class KNBCLoader:
     """KNBコーパス中のアノテーション済みテキストをロードする
     イテレータ風に使える予定だけどまだ1番目のファイルのロードしかできてない
     """
-    def __init__(self, knb_dir_name):
+    def __init__(self, knb_dir_name, cache_dir=None):
         """KNBコーパスのインストールディレクトリの位置を指定して初期化を行う
         Args:
             knb_dir_name (str): KNBコーパスをインストールしたディレクトリ
+            cache_dir (str): 指定した場合は解析済みの文書をこのディレクトリにキャッシュする
         """
         self.rootpath = knb_dir_name
         self.corpuspath = knb_dir_name+pathexpr('/corpus1')
         self.directories = glob.glob(pathexpr(self.corpuspath+'/*'))
+        self.cache = DocumentCache(cache_dir) if cache_dir is not None else None
     def __iter__(self):
         return KNBCLoaderIter(self)
+    def load_directory(self, directory_path):
+        """文書ディレクトリを1つ読み込む、キャッシュがあればそちらを使う
+        """
+        if self.cache is None:
+            return Document(directory_path)
+        key = self.cache.key(directory_path)
+        document = self.cache.get(key)
+        if document is None:
+            document = Document(directory_path)
+            self.cache.put(key, document)
+        return document
+    def load(self):
+        return list(self)
+    def iter_load_parallel(self, workers=None):
+        """複数のプロセスで文書ディレクトリを解析し、directoriesの順に文書を1つずつ返すジェネレータ
+        キャッシュにある文書はプロセスに渡さずにそのまま返す
+        Args:
+            workers (int): ワーカープロセス数(Noneの場合はCPU数)
+        Raises:
+            LoadError: 解析に失敗した文書の情報を含む
+        """
+        workers = workers or os.cpu_count() or 1
+        max_pending = workers * 2
+        with multiprocessing.Pool(workers) as pool:
+            # (文書ディレクトリ, キャッシュのキー, キャッシュにあった文書, 解析中の結果)を文書順に保持する
+            pending = collections.deque()
+            running = 0
+            for directory_path in self.directories:
+                directory_path = pathexpr(directory_path)
+                key = self.cache.key(directory_path) if self.cache is not None else None
+                document = self.cache.get(key) if key is not None else None
+                if document is not None:
+                    pending.append((directory_path, key, document, None))
+                else:
+                    pending.append((directory_path, key, None, pool.apply_async(__load_directory__, (directory_path,))))
+                    running += 1
+                while pending and (pending[0][3] is None or running >= max_pending):
+                    document, done = self.__pop_pending__(pending)
+                    running -= done
+                    yield document
+            while pending:
+                yield self.__pop_pending__(pending)[0]
+    def __pop_pending__(self, pending):
+        """先頭の文書を取り出して(文書, 解析を待ったかどうか)を返す
+        ワーカーで発生した例外は文書ディレクトリのパスを付けたLoadErrorにする
+        """
+        directory_path, key, document, result = pending.popleft()
+        if result is None:
+            return document, 0
+        try:
+            data = result.get()
+        except Exception as inst:
+            newinst = LoadError(inst=inst)
+            if not newinst.document_name:
+                newinst.document_name = __document_name__(directory_path)
+            newinst.set_args()
+            newinst.args = ('Load Failed {0}\n{1}'.format(directory_path, newinst.args[0]),)
+            raise newinst from inst
+        if key is not None:
+            self.cache.put_bytes(key, data)
+        return pickle.loads(data), 1
+    def load_parallel(self, workers=None):
+        """複数のプロセスでloadと同じ文書のリストを読み込む
+        """
+        return list(self.iter_load_parallel(workers))
 class Document(nlelement.Document):
     """KNBC用の文章データ
     構造の定義は基底クラスで行っているので
@@ -314,14 +456,11 @@ class Document(nlelement.Document):
             directory_path (str): 対応するディレクトリのパスを指定する
         """
         nlelement.Document.__init__(self)
-        directory_path = directory_path.replace('\\', '/')
-        self.name = directory_path.split('/')[-1]
-        filenames = glob.glob(directory_path+'/'+self.name+'*')
+        self.name = __document_name__(directory_path)
         corpuslist = []
-        for filename in filenames:
+        for filename in __document_files__(directory_path):
             corpus = CorpusFile(filename)
             corpuslist.append((corpus, corpus.fileid, 0))
-        corpuslist.sort(key=lambda item: item[1])
         for (sid, sent) in enumerate(corpuslist):
             corpus = sent[0]
             try:
@@ -0,0 +1,260 @@
+"""文書中の単語・文節・文の属性を列(配列)ごとに保持する列指向の表現
+    素性抽出で使う属性(surface, basic_surface, pos, part, sid, tid, 文節ID, 係り先ID)だけを
+    整数の配列として保持するので、単語ごとにTokenオブジェクトを生成しない
+    文字列はコーパス全体で共有するStringTableで整数IDに変換して保持する
+
+    USAGE: 文書のリストから列指向の表現を作り、単語の表層を列挙する
+        >>>corpus = columns.CorpusColumns.from_documents(documents)
+        >>>for surface in corpus.values('surface'):
+        ...    print(surface)
+        >>>token = corpus[0].tokens[3]  # この時点で初めてTokenオブジェクトが生成される
+"""
+import sys
+from array import array
+from collections.abc import Sequence
+from . import nlelement
+
+# 整数IDとして保持する単語の文字列属性
+TOKEN_STRING_FIELDS = ('surface', 'basic_surface', 'pos', 'part')
+# 整数のまま保持する単語の属性(chunkは文書内の文節の通し番号)
+TOKEN_INT_FIELDS = ('sid', 'tid', 'chunk')
+
+class StringTable:
+    """文字列と整数IDの対応表(IDは登録順に0から振る)
+    """
+    def __init__(self):
+        self.strings = []
+        self.ids = dict()
+
+    def intern(self, string):
+        """文字列のIDを取得する(未登録なら登録する)
+        """
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            string = sys.intern(string) if type(string) is str else string
+            self.strings.append(string)
+            self.ids[string] = string_id
+        return string_id
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+    def __len__(self):
+        return len(self.strings)
+
+class ElementView(Sequence):
+    """インデックスでアクセスされた時点でfactory(index)から要素を生成するシーケンス
+    """
+    def __init__(self, length, factory):
+        self.length = length
+        self.factory = factory
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.factory(i) for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('element index out of range')
+        return self.factory(index)
+
+    def __iter__(self):
+        return map(self.factory, range(self.length))
+
+class DocumentColumns:
+    """1つの文書の列指向の表現
+    MEMBERS:
+        * name - 文書名
+        * strings - 文字列のIDの対応表(CorpusColumnsの中では共有される)
+        * surface, basic_surface, pos, part - 単語の文字列属性のID(単語数の配列)
+        * sid, tid - 単語の文ID、単語ID(単語数の配列)
+        * chunk - 単語を含む文節の文書内での通し番号(単語数の配列)
+        * chunk_cid, chunk_link, chunk_head, chunk_func - 文節の文節ID、係り先文節ID、head_position、func_position(文節数の配列)
+        * chunk_token_offsets - 文節iの単語はchunk_token_offsets[i]からchunk_token_offsets[i+1]の範囲(文節数+1の配列)
+        * sentence_sid - 文の文ID(文数の配列)
+        * sentence_token_offsets, sentence_chunk_offsets - 文ごとの単語、文節の範囲(文数+1の配列)
+    """
+    def __init__(self, name='', strings=None):
+        self.name = name
+        self.strings = strings if strings is not None else StringTable()
+        for field in TOKEN_STRING_FIELDS + TOKEN_INT_FIELDS:
+            setattr(self, field, array('i'))
+        self.chunk_cid, self.chunk_link = array('i'), array('i')
+        self.chunk_head, self.chunk_func = array('i'), array('i')
+        self.chunk_token_offsets = array('i', [0])
+        self.sentence_sid = array('i')
+        self.sentence_token_offsets = array('i', [0])
+        self.sentence_chunk_offsets = array('i', [0])
+        self.tokens = ElementView(0, self.token)
+        self.chunks = ElementView(0, self.chunk_at)
+        self.sentences = ElementView(0, self.sentence)
+
+    @staticmethod
+    def from_document(document: nlelement.Document, strings=None):
+        """Documentから列指向の表現を作成する(文節に含まれない単語は保持しない)
+        """
+        columns = DocumentColumns(document.name, strings)
+        for sentence in document.sentences:
+            columns.add_sentence(sentence.sid, (
+                (
+                    chunk.cid, chunk.link_id, chunk.head_position, chunk.func_position,
+                    ((tok.tid, tok.surface, tok.basic_surface, tok.pos, tok.part) for tok in chunk.tokens)
+                ) for chunk in sentence.chunks
+            ))
+        return columns
+
+    def add_sentence(self, sid, chunks):
+        """文を末尾に追加する
+        Args:
+            sid (int): 文ID
+            chunks (iterable): (cid, link_id, head_position, func_position, tokens)のCID順の列
+                tokensは(tid, surface, basic_surface, pos, part)のTID順の列
+        """
+        intern = self.strings.intern
+        sentence_index = len(self.sentence_sid)
+        for cid, link_id, head_position, func_position, tokens in chunks:
+            chunk_index = len(self.chunk_cid)
+            self.chunk_cid.append(cid)
+            self.chunk_link.append(link_id)
+            self.chunk_head.append(head_position)
+            self.chunk_func.append(func_position)
+            for tid, surface, basic_surface, pos, part in tokens:
+                self.sid.append(sid)
+                self.tid.append(tid)
+                self.chunk.append(chunk_index)
+                self.surface.append(intern(surface))
+                self.basic_surface.append(intern(basic_surface))
+                self.pos.append(intern(pos))
+                self.part.append(intern(part))
+            self.chunk_token_offsets.append(len(self.tid))
+        self.sentence_sid.append(sid)
+        self.sentence_token_offsets.append(len(self.tid))
+        self.sentence_chunk_offsets.append(len(self.chunk_cid))
+        self.tokens.length = len(self.tid)
+        self.chunks.length = len(self.chunk_cid)
+        self.sentences.length = sentence_index + 1
+
+    def __len__(self):
+        """単語数
+        """
+        return len(self.tid)
+
+    def values(self, field):
+        """単語の属性fieldの値を先頭から列挙する(文字列属性はIDから文字列に戻す)
+        """
+        column = getattr(self, field)
+        if field in TOKEN_STRING_FIELDS:
+            return map(self.strings.__getitem__, column)
+        return iter(column)
+
+    def token(self, index):
+        """文書内でindex番目の単語のTokenを生成する(保持している属性のみ設定される)
+        """
+        token = nlelement.Token()
+        token.sid, token.tid = self.sid[index], self.tid[index]
+        strings = self.strings.strings
+        token.surface = strings[self.surface[index]]
+        token.basic_surface = strings[self.basic_surface[index]]
+        token.pos = strings[self.pos[index]]
+        token.part = strings[self.part[index]]
+        return token
+
+    def __make_chunk__(self, index, sid, tokens):
+        chunk = nlelement.Chunk()
+        chunk.sid, chunk.cid = sid, self.chunk_cid[index]
+        chunk.link_id = self.chunk_link[index]
+        chunk.head_position, chunk.func_position = self.chunk_head[index], self.chunk_func[index]
+        chunk.tokens = tokens
+        chunk.token_num = len(tokens)
+        return chunk
+
+    def chunk_at(self, index):
+        """文書内でindex番目の文節のChunkを生成する(係り先の参照は設定されない)
+        """
+        begin, end = self.chunk_token_offsets[index], self.chunk_token_offsets[index + 1]
+        sid = self.sid[begin] if begin < end else -1
+        return self.__make_chunk__(index, sid, [self.token(i) for i in range(begin, end)])
+
+    def sentence(self, index):
+        """index番目の文のSentenceを生成する(文節の係り先、係り元の参照も設定される)
+        """
+        sentence = nlelement.Sentence()
+        sentence.sid = self.sentence_sid[index]
+        token_begin = self.sentence_token_offsets[index]
+        sentence.tokens = [
+            self.token(i) for i in range(token_begin, self.sentence_token_offsets[index + 1])
+        ]
+        for chunk_index in range(self.sentence_chunk_offsets[index], self.sentence_chunk_offsets[index + 1]):
+            begin = self.chunk_token_offsets[chunk_index] - token_begin
+            end = self.chunk_token_offsets[chunk_index + 1] - token_begin
+            sentence.chunks.append(
+                self.__make_chunk__(chunk_index, sentence.sid, sentence.tokens[begin:end])
+            )
+        for chunk in sentence.chunks:
+            if 0 <= chunk.link_id < len(sentence.chunks):
+                link = sentence.chunks[chunk.link_id]
+                chunk.link = link
+                link.reverse_link_ids.append(chunk.cid)
+                link.reverse_links.append(chunk)
+        return sentence
+
+    def to_document(self):
+        """Documentを生成する
+        """
+        document = nlelement.Document()
+        document.name = self.name
+        document.sentences = list(self.sentences)
+        return document
+
+class CorpusColumns(Sequence):
+    """複数の文書の列指向の表現(文字列のIDの対応表を文書間で共有する)
+    """
+    def __init__(self, strings=None):
+        self.strings = strings if strings is not None else StringTable()
+        self.documents = []
+
+    @staticmethod
+    def from_documents(documents):
+        corpus = CorpusColumns()
+        for document in documents:
+            corpus.add_document(document)
+        return corpus
+
+    def add_document(self, document: nlelement.Document):
+        """Documentを列指向の表現に変換して末尾に追加する
+        """
+        columns = DocumentColumns.from_document(document, self.strings)
+        self.documents.append(columns)
+        return columns
+
+    def new_document(self, name):
+        """空の文書を末尾に追加する(add_sentenceで文を追加する)
+        """
+        columns = DocumentColumns(name, self.strings)
+        self.documents.append(columns)
+        return columns
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __getitem__(self, index):
+        return self.documents[index]
+
+    def token_count(self):
+        return sum(len(columns) for columns in self.documents)
+
+    def values(self, field):
+        """コーパス全体の単語の属性fieldの値を先頭から列挙する
+        """
+        for columns in self.documents:
+            yield from columns.values(field)
+
+    def iter_documents(self):
+        """Documentを1つずつ生成するジェネレータ
+        """
+        for columns in self.documents:
+            yield columns.to_document()
@@ -285,9 +285,7 @@ def count_syncha_stat_of(corpus, outfilename):
     from nlelement import cabocha_extended
     with database.DatabaseLoader(corpus) as loader:
         process = subprocess.Popen(['./predicate/external/syncha-0.3.1.1/syncha', '-I', '2', '-O', '2', '-k'], stdin=subprocess.PIPE)
-        for doc in loader.load_as_iter():
-            input_str = cabocha_extended.dump_doc(doc, from_label=True)
-            process.stdin.write(input_str.encode('utf-8'))
+        cabocha_extended.dump_to(process.stdin, loader.load_as_iter(), from_label=True)
         process.stdin.close()
         process.wait()
 
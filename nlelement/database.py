@@ -2,16 +2,31 @@ import sqlite3
 import os
 import sys
 import gc
+import collections
+import multiprocessing
+import pathlib
+import pickle
+import queue
+import re
+import zlib
 from . import myprogress
 from . import nlelement
+from . import columns
 from . import loadercommon
+from .loaders.common import LoadError
 
 EXOREFERENCE_ID_BEGIN = -10  # 外界照応IDはDB上では-10から負の方向に進める EXOID_DB = (EXOID_ORG + 10)
+# Tables.sql, Indices.sqlで作成するスキーマのバージョン(Schema_Versionテーブルに記録する)
+SCHEMA_VERSION = 2
+# バージョンごとの移行用スクリプト(移行先のバージョン: ファイル名)、インデックスは移行後にIndices.sqlで作り直す
+MIGRATION_SQL = {
+    2: 'Migrate_v2.sql',
+}
 
 def __get_sqlpath__(filename):
     """このライブラリが保持しているsqlファイルのパスを取得
     """
-    root = os.path.split(os.path.split(os.path.abspath(__file__))[0])[0]
+    root = os.path.split(os.path.abspath(__file__))[0]
     return os.path.join(root, "sqlcode", filename)
 
 def __get_sqlcode__(filename):
@@ -19,9 +34,111 @@ def __get_sqlcode__(filename):
         result = '\n'.join(fp.readlines())
     return result
 
+# add_documents_bulkでテーブルごとにexecutemanyするSQL(この順番で挿入する)
+BULK_INSERT_SQL = {
+    'Documents': "INSERT INTO DOCUMENTS(ID, NAME) VALUES (?, ?)",
+    'Sentences': "INSERT INTO SENTENCES(ID, DOCUMENT_ID, SID) VALUES (?, ?, ?)",
+    'Chunks': "INSERT INTO CHUNKS(ID, DOCUMENT_ID, SENTENCE_ID, CID, LINK, HEAD, FUNC) VALUES (?, ?, ?, ?, ?, ?, ?)",
+    'Tokens': """INSERT INTO TOKENS(
+            ID, DOCUMENT_ID, SENTENCE_ID, CHUNK_ID, TID, SURFACE, BASE, READ, PART, ATTR1, ATTR2, CONJ_TYPE, CONJ_FORM, NAMED_ENTITY, PAS_TYPE
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+    'Token_Tags': "INSERT INTO Token_Tags(token, name, value) VALUES (?, ?, ?)",
+    # add_coreference_linksと同じく照応詞の重複(UNIQUE制約違反)は無視する
+    'Coreference': "INSERT OR IGNORE INTO Coreference(ANAPHORA, LINKTYPE, ANTECEDENT) VALUES (?, ?, ?)",
+    'PredicateTerm': "INSERT INTO PredicateTerm(PREDICATE, CASEPT, LINKTYPE, ANTECEDENT) VALUES (?, ?, ?, ?)",
+    'SemanticRole': "INSERT INTO SemanticRole(PREDICATE, SEMROLE, ANTECEDENT) VALUES (?, ?, ?)",
+    'VerbSemantic': "INSERT INTO VerbSemantic(PREDICATE, SEMANTIC) VALUES (?, ?)",
+    'Pas_Annotated': "INSERT INTO Pas_Annotated VALUES (?, ?)",
+    'Pth_Annotated': "INSERT INTO Pth_Annotated VALUES (?, ?)",
+    'Pth_Annotated_Sent': "INSERT INTO Pth_Annotated_Sent VALUES (?)",
+}
+
+def encode_document(document):
+    """プロセス間の受け渡し用に文書を圧縮したバイト列に変換する
+    """
+    return zlib.compress(pickle.dumps(document, pickle.HIGHEST_PROTOCOL))
+
+def decode_document(data):
+    """encode_documentで変換したバイト列から文書を復元する
+    """
+    return pickle.loads(zlib.decompress(data))
+
+# DatabaseLoader, DatabaseWriterで選べる接続の設定
+# pragmas: 接続直後に実行するPRAGMA, uri: 読み込み専用で開くときのURIのクエリ,
+# defer_indices: DatabaseWriterが新しく作ったテーブルのインデックスを書き込みの最後に作成する
+CONNECTION_PROFILES = {
+    # コーパスの構築用: 同期を省き、インデックスは最後にまとめて作る(異常終了時はWALに書かれた分まで残る)
+    'bulk_load': {
+        'pragmas': (
+            ('journal_mode', 'WAL'),
+            ('synchronous', 'OFF'),
+            ('cache_size', -256 * 1024),
+            ('temp_store', 'MEMORY'),
+        ),
+        'defer_indices': True,
+    },
+    # 分析用: 他のプロセスが書き込まないファイルを変更不可として開き、メモリマップで読む
+    'read_only': {
+        'uri': 'mode=ro&immutable=1',
+        'pragmas': (
+            ('query_only', 'ON'),
+            ('mmap_size', 1024 * 1024 * 1024),
+            ('cache_size', -64 * 1024),
+            ('temp_store', 'MEMORY'),
+        ),
+    },
+}
+
+# load_as_iter_parallelのワーカープロセスごとのDatabaseLoader
+__worker_loader__ = None
+
+def __init_worker__(filename, load_exophora, compact, profile=None):
+    global __worker_loader__
+    __worker_loader__ = DatabaseLoader(
+        filename, load_exophora=load_exophora, read_only=True, compact=compact, profile=profile
+    )
+
+def __load_shard__(doc_rows, transport):
+    documents = __worker_loader__.load_document_batch(doc_rows)
+    if transport == 'bytes':
+        return [encode_document(doc) for doc in documents]
+    return documents
+
+def __decode_token_features__(features):
+    """Tokensテーブルの(part, attr1, attr2, conj_type, conj_form, named_entity)から単語に設定する属性の組を求める
+    """
+    part, attr1, attr2, conj_type, conj_form, named_entity = features
+    is_noun = part == '名詞'
+    return (
+        part, loadercommon.part_id[part] if part in loadercommon.part_id else 10, attr1, attr2,
+        '-'.join((part, attr1, attr2)), conj_type, conj_form, named_entity,
+        is_noun and attr1 == 'サ変', is_noun and attr1 == '一般', is_noun and attr1 == '副詞可能',
+    )
+
 class DatabaseLoader:
-    def __init__(self, filename, load_exophora=False):
-        self.connector = sqlite3.connect(filename)
+    def __init__(self, filename, load_exophora=False, read_only=False, compact=False, profile=None):
+        """
+        Args:
+            filename (str): データベースのファイル名
+            load_exophora (bool): 外界照応もロードするか
+            read_only (bool): 読み込み専用で接続する(ファイルが存在しなければエラー)
+            compact (bool): 文・文節・単語を__slots__を使うCompact系のクラスでロードする
+            profile (str): 接続の設定(CONNECTION_PROFILESのキー)、'read_only'の場合はread_onlyも有効になる
+        """
+        if profile is not None and profile not in CONNECTION_PROFILES:
+            raise ValueError('unknown profile: {}'.format(profile))
+        self.profile = profile
+        settings = CONNECTION_PROFILES.get(profile, {})
+        self.compact = compact
+        self.sentence_class, self.chunk_class, self.token_class = nlelement.element_classes(compact)
+        self.filename = filename
+        if read_only or 'uri' in settings:
+            uri = pathlib.Path(filename).absolute().as_uri() + '?' + settings.get('uri', 'mode=ro')
+            self.connector = sqlite3.connect(uri, uri=True)
+        else:
+            self.connector = sqlite3.connect(filename)
+        for name, value in settings.get('pragmas', ()):
+            self.connector.execute('PRAGMA {} = {}'.format(name, value))
         self.chunkid_contains_list = dict()
         self.chunkid_localize_table = dict()
         #self.tokenid_localize_table = dict()
@@ -29,36 +146,134 @@ class DatabaseLoader:
         self.file = None
         self.load_exophora = load_exophora
     def __del__(self):
-        if self.connector:
-            self.connector.close()
-            self.connector = None
+        self.close()
     def __enter__(self):
         return self
     def __exit__(self, exc_type, exc_value, traceback):
-        if self.connector:
+        self.close()
+    def close(self):
+        if getattr(self, 'connector', None):
+            if self.profile == 'bulk_load':
+                # WALはファイルに記録されるので、他の接続が読めるように通常のジャーナルに戻してから閉じる
+                try:
+                    self.connector.commit()
+                    self.connector.execute('PRAGMA journal_mode = DELETE')
+                except sqlite3.Error:
+                    pass
             self.connector.close()
             self.connector = None
+    def pragmas(self):
+        """現在の接続のPRAGMAの値(CONNECTION_PROFILESに現れるもの)を返す
+        """
+        names = sorted({name for settings in CONNECTION_PROFILES.values() for name, _ in settings.get('pragmas', ())})
+        return {name: self.connector.execute('PRAGMA {}'.format(name)).fetchone()[0] for name in names}
     def update_views(self):
         """ビューを作り直す
+        文・文節の表層の表(materialize_surfaces)がある場合はその表を参照するビューにする
         """
         cursor = self.connector.cursor()
         result = cursor.executescript(
-            __get_sqlcode__('UpdateView.sql')
+            __get_sqlcode__('UpdateViewMaterialized.sql' if self.has_surface_tables() else 'UpdateView.sql')
         )
         self.connector.commit()
         cursor.close()
-    def create_tables(self):
+    def has_surface_tables(self):
+        cursor = self.connector.cursor()
+        cursor.execute("SELECT COUNT(*) FROM SQLITE_MASTER WHERE TYPE='table' AND NAME IN ('Sentence_Surface', 'Chunk_Surface')")
+        result = cursor.fetchone()[0] == 2
+        cursor.close()
+        return result
+    def materialize_surfaces(self):
+        """文・文節の表層をSentence_Surface, Chunk_Surfaceに保存し、ビューをその表の上に作り直す
+        表層を毎回group_concatで集計しなくなるので、SentenceViewを結合するCoreferenceViewなどが速くなる
+        2回目以降は前回以降に追加された文・文節(IDがより大きいもの)だけを追加する
+        """
+        cursor = self.connector.cursor()
+        cursor.executescript(__get_sqlcode__('MaterializeSurfaces.sql'))
+        self.connector.commit()
+        cursor.close()
+        self.update_views()
+    def __refresh_surfaces__(self):
+        """表層の表(materialize_surfaces)がある場合は、追加した文・文節の表層を表に追加する
+        """
+        if self.has_surface_tables():
+            self.materialize_surfaces()
+    def create_tables(self, indices=True):
         """初期化時にテーブルを作成
+        Args:
+            indices (bool): Falseの場合はインデックスを作らない(後でcreate_indicesを呼ぶ)
         """
         cursor = self.connector.cursor()
         result = cursor.executescript(
             __get_sqlcode__("Tables.sql")
         )
-        result = cursor.executescript(
-            __get_sqlcode__("Indices.sql")
-        )
+        if indices:
+            result = cursor.executescript(
+                __get_sqlcode__("Indices.sql")
+            )
+        cursor.execute("INSERT INTO Schema_Version(VERSION) VALUES (?)", (SCHEMA_VERSION,))
+        self.connector.commit()
+        cursor.close()
+    def create_indices(self):
+        """Indices.sqlのインデックスのうちまだないものを作成する
+        """
+        cursor = self.connector.cursor()
+        cursor.executescript(__get_sqlcode__("Indices.sql"))
         self.connector.commit()
         cursor.close()
+    def drop_indices(self):
+        """Indices.sqlで作成するインデックスを削除する(大量に追加する前に使う)
+        """
+        cursor = self.connector.cursor()
+        for name in re.findall(r'CREATE INDEX IF NOT EXISTS (\w+)', __get_sqlcode__("Indices.sql")):
+            cursor.execute("DROP INDEX IF EXISTS {}".format(name))
+        self.connector.commit()
+        cursor.close()
+    def schema_version(self):
+        """データベースのスキーマのバージョンを返す
+        Schema_Versionテーブルがなければバージョン1(テーブル自体がなければ0)とみなす
+        """
+        cursor = self.connector.cursor()
+        cursor.execute("SELECT NAME FROM SQLITE_MASTER WHERE TYPE='table'")
+        tables = {name.lower() for name, in cursor.fetchall()}
+        if 'schema_version' in tables:
+            cursor.execute("SELECT MAX(VERSION) FROM Schema_Version")
+            version = cursor.fetchone()[0] or 1
+        else:
+            version = 1 if 'documents' in tables else 0
+        cursor.close()
+        return version
+    def migrate(self):
+        """既存のデータベースを現在のスキーマ(SCHEMA_VERSION)にその場で移行する
+        移行は1つのトランザクションで行うので、失敗した場合は元のスキーマのまま残る
+        Returns:
+            int: 移行後のスキーマのバージョン
+        """
+        version = self.schema_version()
+        if version == 0:
+            raise ValueError('{} has no tables to migrate'.format(self.filename))
+        if version >= SCHEMA_VERSION:
+            return version
+        script = ['BEGIN;']
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            script.append(__get_sqlcode__(MIGRATION_SQL[target]))
+        script.append(__get_sqlcode__("Indices.sql"))
+        script.append("DELETE FROM Schema_Version;")
+        script.append("INSERT INTO Schema_Version(VERSION) VALUES ({});".format(SCHEMA_VERSION))
+        script.append('COMMIT;')
+        cursor = self.connector.cursor()
+        self.connector.commit()
+        try:
+            cursor.executescript('\n'.join(script))
+        except sqlite3.Error:
+            if self.connector.in_transaction:
+                self.connector.rollback()
+            raise
+        finally:
+            cursor.close()
+        self.connector.execute("ANALYZE")
+        self.connector.commit()
+        return SCHEMA_VERSION
     def clear(self):
         """初期化のために既存のテーブルの内容を消去
         """
@@ -68,8 +283,16 @@ class DatabaseLoader:
         )
         self.connector.commit()
         cursor.close()
-    def save_in_additional(self, documents):
+        if self.has_surface_tables():
+            # 表層の表は作り直すまで使えないので、ビューも元に戻す
+            self.connector.executescript("DROP TABLE Sentence_Surface; DROP TABLE Chunk_Surface;")
+            self.update_views()
+    def save_in_additional(self, documents, bulk=False, refresh_surfaces=True):
         """nlelementオブジェクトを追加保存する
+        Args:
+            bulk (bool): Trueの場合はadd_documents_bulkでまとめて追加する
+            refresh_surfaces (bool): Trueの場合は表層の表があれば追加した文書の表層を表に追加する
+                (DatabaseWriterは閉じる時にまとめて追加するのでFalseを渡す)
         """
         if isinstance(documents, list):
             if documents:
@@ -77,8 +300,13 @@ class DatabaseLoader:
                     #file_path = os.path.expanduser('~/Dropbox/Logs/db_coref.log')
                     #self.file = open(file_path, 'a')
                     cursor = self.connector.cursor()
-                    self.add_documents(cursor, documents, show_progress=False)
+                    if bulk:
+                        self.add_documents_bulk(cursor, documents, show_progress=False)
+                    else:
+                        self.add_documents(cursor, documents, show_progress=False)
                     cursor.close()
+                    if refresh_surfaces:
+                        self.__refresh_surfaces__()
                     #self.file.close()
                 else:
                     raise TypeError(
@@ -90,8 +318,10 @@ class DatabaseLoader:
                 type(documents).__name__
             ))
         
-    def save(self, documents):
+    def save(self, documents, bulk=False):
         """nlelementオブジェクトをダンプする
+        Args:
+            bulk (bool): Trueの場合はadd_documents_bulkでまとめて追加する
         """
         if isinstance(documents, list):
             if documents:
@@ -99,9 +329,13 @@ class DatabaseLoader:
                     #file_path = os.path.expanduser('~/Dropbox/Logs/db_coref.log')
                     #self.file = open(file_path, 'w')
                     cursor = self.connector.cursor()
-                    self.add_documents(cursor, documents)
+                    if bulk:
+                        self.add_documents_bulk(cursor, documents)
+                    else:
+                        self.add_documents(cursor, documents)
                     self.connector.commit()
                     cursor.close()
+                    self.__refresh_surfaces__()
                     #self.file.close()
                 else:
                     raise TypeError(
@@ -174,6 +408,132 @@ class DatabaseLoader:
         if show_progress:
             progress.finish()
         did_globaldid_map = None
+    def add_documents_bulk(self, cursor: sqlite3.Cursor, documents, batch_size=100, show_progress=True):
+        """add_documentsと同じ内容をテーブルごとのexecutemanyでまとめて追加する
+        主キーはクライアント側で採番するので挿入ごとにIDを問い合わせる必要がなく、
+        文節の係り先や照応の参照先も同じ走査の中で解決する
+        Args:
+            batch_size (int): 1回のexecutemanyにまとめる文書数
+        """
+        next_ids = dict()
+        for table in ('Documents', 'Sentences', 'Chunks', 'Tokens'):
+            cursor.execute("SELECT MAX(ID) FROM {}".format(table))
+            max_id = cursor.fetchone()[0]
+            next_ids[table] = max_id + 1 if max_id is not None else 1
+        length = len(documents)
+        if show_progress:
+            progress = myprogress.make_progress(max_value=length)
+        for begin in range(0, length, batch_size):
+            rows = {table: [] for table in BULK_INSERT_SQL}
+            for doc in documents[begin:begin+batch_size]:
+                self.__document_to_rows__(doc, rows, next_ids)
+            for table, sql in BULK_INSERT_SQL.items():
+                if rows[table]:
+                    cursor.executemany(sql, rows[table])
+            if show_progress:
+                progress.update(min(begin + batch_size, length))
+        if show_progress:
+            progress.finish()
+    @staticmethod
+    def __bulk_token_id__(token_id_table, reference):
+        """__refer_token_id__と同じ規則でメモリ上の対応表から単語のIDを引く
+        """
+        if not isinstance(reference, nlelement.TokenReference):
+            if reference is None:
+                return -1
+            else:
+                raise TypeError(
+                    'reference must be TokenReference , not {0}'.format(type(reference).__name__)
+                )
+        return token_id_table.get(reference.to_tuple(), -2)
+    def __document_to_rows__(self, document, rows, next_ids):
+        """文書1つ分の各テーブルのレコードをrowsに追加する
+        Args:
+            rows (dict<str, list>): テーブル名ごとのレコードのリスト
+            next_ids (dict<str, int>): テーブル名ごとの次に割り当てる主キー
+        """
+        def redefine(func_position, head_position):
+            return func_position if func_position > 0 else head_position
+        def new_id(table):
+            result = next_ids[table]
+            next_ids[table] += 1
+            return result
+        doc_id = new_id('Documents')
+        rows['Documents'].append((doc_id, document.name))
+        sid_globalsid_map = dict()
+        token_id_table = dict()
+        for sent in document.sentences:
+            sid_globalsid_map[sent.sid] = new_id('Sentences')
+            rows['Sentences'].append((sid_globalsid_map[sent.sid], doc_id, sent.sid))
+        for sent in document.sentences:
+            sent_id = sid_globalsid_map[sent.sid]
+            if len(sent.chunks) == 0 and len(sent.tokens) != 0:
+                for tok in sent.tokens:
+                    token_id = new_id('Tokens')
+                    token_id_table.setdefault((sent.sid, tok.tid), token_id)
+                    rows['Tokens'].append((
+                        token_id, doc_id, sent_id, -1, tok.tid, tok.surface, tok.basic_surface, tok.read, tok.part,
+                        tok.attr1, tok.attr2, tok.conj_type, tok.conj_form, tok.named_entity, None
+                    ))
+                continue
+            cid_globalcid_map = dict()
+            for chunk in sent.chunks:
+                cid_globalcid_map[chunk.cid] = new_id('Chunks')
+            for chunk in sent.chunks:
+                rows['Chunks'].append((
+                    cid_globalcid_map[chunk.cid], doc_id, sent_id, chunk.cid,
+                    cid_globalcid_map[chunk.link_id] if chunk.link_id in range(0, len(sent.tokens)) else -1,
+                    chunk.head_position, redefine(chunk.func_position, chunk.head_position)
+                ))
+                for tok in chunk.tokens:
+                    token_id = new_id('Tokens')
+                    token_id_table.setdefault((sent.sid, tok.tid), token_id)
+                    rows['Tokens'].append((
+                        token_id, doc_id, sent_id, cid_globalcid_map[chunk.cid], tok.tid, tok.surface, tok.basic_surface,
+                        tok.read, tok.part, tok.attr1, tok.attr2, tok.conj_type, tok.conj_form, tok.named_entity, tok.pas_type
+                    ))
+                    for name in sorted(vars(tok)):
+                        value = getattr(tok, name)
+                        if name not in DatabaseLoader.default_tok_attr_set and isinstance(value, (str, float, int, bool)):
+                            rows['Token_Tags'].append((token_id, name, value))
+        for token in nlelement.tokens(document):
+            for name, coref in token.coreference_link.items():
+                if name != 'coref' and name not in {'ga', 'o', 'ni'}:
+                    continue
+                anaphora_id = DatabaseLoader.__bulk_token_id__(token_id_table, coref.anaphora_ref)
+                if not isinstance(coref.antecedent_ref, nlelement.ExoReference):
+                    antecedent_id = DatabaseLoader.__bulk_token_id__(token_id_table, coref.antecedent_ref)
+                else:
+                    antecedent_id = EXOREFERENCE_ID_BEGIN - coref.antecedent_ref.exo_value
+                if anaphora_id and anaphora_id >= 0:
+                    if name == 'coref':
+                        rows['Coreference'].append((anaphora_id, coref.link_type, antecedent_id))
+                    else:
+                        rows['PredicateTerm'].append((anaphora_id, name, coref.link_type, antecedent_id))
+        for token in nlelement.tokens(document):
+            if hasattr(token, 'semroles'):
+                pred_id = DatabaseLoader.__bulk_token_id__(token_id_table, nlelement.make_reference(token))
+                for semrole, semtok_ref in token.semroles.items():
+                    if not isinstance(semtok_ref, nlelement.ExoReference):
+                        semtok_id = DatabaseLoader.__bulk_token_id__(token_id_table, semtok_ref)
+                    else:
+                        semtok_id = EXOREFERENCE_ID_BEGIN - semtok_ref.exo_value
+                    if pred_id and pred_id >= 0:
+                        rows['SemanticRole'].append((pred_id, semrole, semtok_id))
+            if hasattr(token, 'semantic_label'):
+                pred_id = DatabaseLoader.__bulk_token_id__(token_id_table, nlelement.make_reference(token))
+                if pred_id and pred_id >= 0:
+                    rows['VerbSemantic'].append((pred_id, token.semantic_label))
+        if getattr(document, 'pas_annotated', False):
+            rows['Pas_Annotated'].append((doc_id, document.name))
+        if getattr(document, 'pt_annotated', False):
+            rows['Pth_Annotated'].append((doc_id, document.name))
+            first_sentence_ids = dict()
+            for sent in document.sentences:
+                first_sentence_ids.setdefault(sent.sid, sid_globalsid_map[sent.sid])
+            for sent in document.sentences:
+                if getattr(sent, 'pt_annotated', False):
+                    rows['Pth_Annotated_Sent'].append((first_sentence_ids[sent.sid],))
     def add_sentences(self, cursor: sqlite3.Cursor, document: nlelement.Document, doc_id):
         sid_globalsid_map = dict()
         for sent in document.sentences:
@@ -341,6 +701,7 @@ class DatabaseLoader:
 
     default_tok_attrs = dir(nlelement.Token())
     default_tok_attrs.append("semantic_label")
+    default_tok_attr_set = set(default_tok_attrs)
     def add_tokens(self, cursor: sqlite3.Cursor, chunk: nlelement.Chunk, doc_id, sent_id, chunk_id):
         """データベースに単語を追加する
         """
@@ -412,27 +773,177 @@ class DatabaseLoader:
                 sent = document.refer_sentence(sid)
                 setattr(sent, "pt_annotated", True)
         cursor.close()
-    def load_as_iter(self):
+    @staticmethod
+    def __document_filter__(names=None, id_range=None, where=None, where_params=()):
+        """Documentsテーブルに対する絞り込み条件をSQLの条件式とパラメータに変換する
+        """
+        clauses = []
+        params = []
+        if names is not None:
+            names = list(names)
+            clauses.append("NAME IN ({})".format(','.join('?' * len(names))))
+            params.extend(names)
+        if id_range is not None:
+            begin, end = id_range
+            if begin is not None:
+                clauses.append("ID >= ?")
+                params.append(begin)
+            if end is not None:
+                clauses.append("ID < ?")
+                params.append(end)
+        if where:
+            clauses.append("({})".format(where))
+            params.extend(where_params)
+        return clauses, params
+    def iter_document_rows(self, prefetch=64, names=None, id_range=None, where=None, where_params=(), order_by='ID'):
+        """Documentsテーブルの(ID, NAME)をID順(あるいは名前順)に列挙するジェネレータ
+        テーブル全体をfetchallせず、ID順(名前順)にprefetch件ずつ取得する
+        Args:
+            prefetch (int): 1回のクエリで先読みする文書数
+            names (iterable<str>): 指定した場合はこの名前の文書だけを列挙する
+            id_range (tuple<int, int>): 指定した場合は[begin, end)のIDの文書だけを列挙する(Noneは上限/下限なし)
+            where (str): Documentsテーブルに対する追加のWHERE条件式(ex. "NAME LIKE ?")
+            where_params (tuple): whereのプレースホルダに渡す値
+            order_by (str): 'ID'の場合はID順、'NAME'の場合は名前順(NAMEはUNIQUEなのでそのインデックスを使う)
+        """
+        if order_by not in ('ID', 'NAME'):
+            raise ValueError('unknown order: {}'.format(order_by))
+        clauses, params = DatabaseLoader.__document_filter__(names, id_range, where, where_params)
+        sql = "SELECT ID, NAME FROM DOCUMENTS WHERE {0} ORDER BY {1} LIMIT ?".format(
+            ' and '.join(["{} > ?".format(order_by)] + clauses), order_by
+        )
+        key_index = 0 if order_by == 'ID' else 1
         cursor = self.connector.cursor()
-        cursor.execute("SELECT * FROM DOCUMENTS")
-        for doc_id, name in cursor.fetchall():
-            yield self.load_document(doc_id, name)
+        last_key = -1 if order_by == 'ID' else ''
+        while True:
+            cursor.execute(sql, [last_key] + params + [prefetch])
+            doc_rows = cursor.fetchall()
+            if not doc_rows:
+                break
+            last_key = doc_rows[-1][key_index]
+            yield from doc_rows
+            if len(doc_rows) < prefetch:
+                break
         cursor.close()
+    def load_as_iter(self, batch_size=None, prefetch=64, names=None, id_range=None, where=None, where_params=(),
+                     order_by='ID'):
+        """文書を1つずつロードするジェネレータ
+        文書の一覧は先読みの範囲(prefetch件)しか保持しないので、コーパスの大きさによらずメモリ使用量は一定
+        Args:
+            batch_size (int): 指定した場合はbatch_size文書ずつload_document_batchでまとめてロードする
+            prefetch, names, id_range, where, where_params, order_by: iter_document_rowsを参照
+        """
+        batch = []
+        for doc_row in self.iter_document_rows(prefetch, names, id_range, where, where_params, order_by):
+            if not batch_size:
+                yield self.load_document(*doc_row)
+                continue
+            batch.append(doc_row)
+            if len(batch) >= batch_size:
+                yield from self.load_document_batch(batch)
+                batch = []
+        if batch:
+            yield from self.load_document_batch(batch)
         gc.collect()
 
-    def load_documents(self):
+    def load_as_iter_parallel(self, workers=None, ordered=True, shard_size=16, transport='document',
+                              prefetch=64, names=None, id_range=None, where=None, where_params=()):
+        """文書を複数のプロセスでロードするジェネレータ
+        文書IDをshard_size件ずつのシャードに分け、各ワーカーが読み込み専用の接続でload_document_batchを実行する
+        ワーカーに渡していて結果を受け取っていないシャードは高々workers * 2個
+        Args:
+            workers (int): ワーカープロセス数(Noneの場合はCPU数)
+            ordered (bool): Trueの場合はID順に、Falseの場合はロードが終わった順に返す
+            shard_size (int): 1つのワーカーにまとめて渡す文書数
+            transport (str): 'document'の場合はDocumentを、'bytes'の場合はencode_documentで変換したバイト列を返す
+            prefetch, names, id_range, where, where_params: iter_document_rowsを参照
+        """
+        if transport not in ('document', 'bytes'):
+            raise ValueError('unknown transport: {}'.format(transport))
+        if self.filename == ':memory:':
+            raise ValueError('in-memory database can not be shared with worker processes')
+        workers = workers or os.cpu_count() or 1
+        max_pending = workers * 2
+        def shards():
+            shard = []
+            for doc_row in self.iter_document_rows(prefetch, names, id_range, where, where_params):
+                shard.append(doc_row)
+                if len(shard) >= shard_size:
+                    yield shard
+                    shard = []
+            if shard:
+                yield shard
+        worker_profile = 'read_only' if self.profile == 'read_only' else None
+        with multiprocessing.Pool(
+            workers, __init_worker__, (self.filename, self.load_exophora, self.compact, worker_profile)
+        ) as pool:
+            if ordered:
+                pending = collections.deque()
+                for shard in shards():
+                    pending.append(pool.apply_async(__load_shard__, (shard, transport)))
+                    if len(pending) >= max_pending:
+                        yield from pending.popleft().get()
+                while pending:
+                    yield from pending.popleft().get()
+            else:
+                results = queue.Queue()
+                def receive():
+                    result = results.get()
+                    if isinstance(result, BaseException):
+                        raise result
+                    return result
+                running = 0
+                for shard in shards():
+                    pool.apply_async(
+                        __load_shard__, (shard, transport), callback=results.put, error_callback=results.put
+                    )
+                    running += 1
+                    if running >= max_pending:
+                        yield from receive()
+                        running -= 1
+                while running:
+                    yield from receive()
+                    running -= 1
+
+    def load_documents_parallel(self, workers=None, ordered=True, shard_size=16, transport='document'):
+        """すべての文書を複数のプロセスでロードする
+        Args:
+            workers, ordered, shard_size, transport: load_as_iter_parallelを参照
+        """
+        documents = []
+        progress = myprogress.make_progress(max_value=self.get_document_count())
+        for document in self.load_as_iter_parallel(workers, ordered, shard_size, transport):
+            documents.append(document)
+            progress.update(len(documents))
+        progress.finish()
+        return documents
+
+    def load_documents(self, batch_size=None):
+        """すべての文書をロードする
+        Args:
+            batch_size (int): 指定した場合はbatch_size文書ずつload_document_batchでまとめてロードする
+        """
         documents = []
         cursor = self.connector.cursor()
         length = self.get_document_count()
         progress = myprogress.make_progress(max_value=length)
         count = 0
         cursor.execute("SELECT * FROM DOCUMENTS")
-        for doc_id, name in cursor.fetchall():
-            documents.append(
-                self.load_document(doc_id, name)
-            )
-            count += 1
-            progress.update(count)
+        doc_rows = cursor.fetchall()
+        if batch_size:
+            for begin in range(0, len(doc_rows), batch_size):
+                documents.extend(
+                    self.load_document_batch(doc_rows[begin:begin+batch_size])
+                )
+                count = len(documents)
+                progress.update(count)
+        else:
+            for doc_id, name in doc_rows:
+                documents.append(
+                    self.load_document(doc_id, name)
+                )
+                count += 1
+                progress.update(count)
 
         progress.finish()
         cursor.close()
@@ -457,18 +968,152 @@ class DatabaseLoader:
             )
         cursor.close()
         return documents
+    @staticmethod
+    def __load_error__(inst, name):
+        """文書の組み立てに失敗した例外(IndexError, LoadError)を文書名を付けたLoadErrorにする
+        """
+        newinst = LoadError(inst=inst)
+        newinst.document_name = name
+        newinst.set_args()
+        return newinst
     def load_document(self, doc_id, name):
         doc = nlelement.Document()
         doc.name = name
         try:
             doc.sentences = self.load_sencences(doc_id)
-        except IndexError:
-            print(doc.name)
-            raise
+        except (IndexError, LoadError) as inst:
+            raise DatabaseLoader.__load_error__(inst, name) from inst
         self.load_coreference_links(doc, doc_id)
         self.load_semroles(doc, doc_id)
         self.load_annotated(doc_id, doc)
         return doc
+    def load_document_batch(self, doc_rows):
+        """複数の文書をまとめてロードする
+        文、文節、単語、単語のタグをそれぞれ1回のクエリで取得してからメモリ上で組み立てるので、
+        文ごと、単語ごとのクエリが発生しない(load_documentと同じDocumentを生成する)
+        Args:
+            doc_rows (list<(int, str)>): ロードする文書の(ID, NAME)のリスト
+        Returns:
+            list<Document>: doc_rowsと同じ順番で並んだ文書のリスト
+        """
+        doc_ids = [doc_id for doc_id, _ in doc_rows]
+        if not doc_ids:
+            return []
+        placeholder = ','.join('?' * len(doc_ids))
+        cursor = self.connector.cursor()
+        sentence_table = dict()
+        cursor.execute(
+            "SELECT * FROM SENTENCES WHERE DOCUMENT_ID IN ({}) ORDER BY DOCUMENT_ID, SID".format(placeholder), doc_ids
+        )
+        for row in cursor.fetchall():
+            sentence_table.setdefault(row[1], []).append(row)
+        token_table = dict()
+        # Tokens.DOCUMENT_IDにはインデックスがないので文のIDから引く
+        cursor.execute("""
+            SELECT * FROM TOKENS WHERE SENTENCE_ID IN (
+                SELECT ID FROM SENTENCES WHERE DOCUMENT_ID IN ({})
+            ) ORDER BY SENTENCE_ID, TID
+            """.format(placeholder), doc_ids)
+        for row in cursor.fetchall():
+            token_table.setdefault(row[2], []).append(row)
+        chunk_table = dict()
+        cursor.execute(
+            "SELECT * FROM CHUNKS WHERE DOCUMENT_ID IN ({}) ORDER BY SENTENCE_ID, CID".format(placeholder), doc_ids
+        )
+        for row in cursor.fetchall():
+            chunk_table.setdefault(row[2], []).append(row)
+        tag_table = dict()
+        cursor.execute("""
+            SELECT tag.TOKEN, tag.NAME, tag.VALUE FROM Token_Tags as tag, TOKENS as token
+            WHERE tag.TOKEN = token.ID and token.SENTENCE_ID IN (
+                SELECT ID FROM SENTENCES WHERE DOCUMENT_ID IN ({})
+            )
+            """.format(placeholder), doc_ids)
+        for token_id, name, value in cursor.fetchall():
+            tag_table.setdefault(token_id, []).append((name, value))
+        cursor.close()
+
+        documents = []
+        for doc_id, name in doc_rows:
+            doc = nlelement.Document()
+            doc.name = name
+            self.chunkid_localize_table = dict()
+            try:
+                for sentence_id, _, self.seeking_sid in sentence_table.get(doc_id, []):
+                    self.chunkid_contains_list = dict()
+                    sentence = self.sentence_class()
+                    sentence.sid = self.seeking_sid
+                    sentence.tokens = [
+                        self.__make_token__(sentence, row, tag_table.get(row[0], []))
+                        for row in token_table.get(sentence_id, [])
+                    ]
+                    sentence.chunks = self.__make_chunks__(sentence, chunk_table.get(sentence_id, []))
+                    sentence.index_chunks()
+                    doc.sentences.append(sentence)
+                    self.chunkid_contains_list = None
+            except (IndexError, LoadError) as inst:
+                raise DatabaseLoader.__load_error__(inst, name) from inst
+            self.chunkid_localize_table = None
+            self.load_coreference_links(doc, doc_id)
+            self.load_semroles(doc, doc_id)
+            self.load_annotated(doc_id, doc)
+            documents.append(doc)
+        return documents
+    def load_columns(self, batch_size=64, prefetch=64, names=None, id_range=None, where=None, where_params=(), corpus=None):
+        """Documentを経由せずに文書を列指向の表現(columns.CorpusColumns)でロードする
+        Args:
+            batch_size (int): 1回のクエリでまとめて読み込む文書数
+            prefetch, names, id_range, where, where_params: iter_document_rowsを参照
+            corpus (CorpusColumns): 指定した場合はこのコーパスの末尾に追加する
+        """
+        corpus = corpus if corpus is not None else columns.CorpusColumns()
+        batch = []
+        for doc_row in self.iter_document_rows(prefetch, names, id_range, where, where_params):
+            batch.append(doc_row)
+            if len(batch) >= batch_size:
+                self.__load_column_batch__(corpus, batch)
+                batch = []
+        if batch:
+            self.__load_column_batch__(corpus, batch)
+        return corpus
+    def __load_column_batch__(self, corpus, doc_rows):
+        """load_document_batchと同じクエリで必要な列だけ読み込み、corpusに文書を追加する
+        """
+        doc_ids = [doc_id for doc_id, _ in doc_rows]
+        placeholder = ','.join('?' * len(doc_ids))
+        cursor = self.connector.cursor()
+        sentence_table = dict()
+        cursor.execute(
+            "SELECT ID, DOCUMENT_ID, SID FROM SENTENCES WHERE DOCUMENT_ID IN ({}) ORDER BY DOCUMENT_ID, SID".format(placeholder),
+            doc_ids
+        )
+        for sentence_id, doc_id, sid in cursor.fetchall():
+            sentence_table.setdefault(doc_id, []).append((sentence_id, sid))
+        token_table = dict()
+        cursor.execute("""
+            SELECT SENTENCE_ID, CHUNK_ID, TID, SURFACE, BASE, PART, ATTR1, ATTR2 FROM TOKENS WHERE SENTENCE_ID IN (
+                SELECT ID FROM SENTENCES WHERE DOCUMENT_ID IN ({})
+            ) ORDER BY SENTENCE_ID, TID
+            """.format(placeholder), doc_ids)
+        for sentence_id, chunk_id, tid, surface, base, part, attr1, attr2 in cursor.fetchall():
+            token_table.setdefault(chunk_id, []).append((tid, surface, base, '-'.join((part, attr1, attr2)), part))
+        chunk_table = dict()
+        cursor.execute(
+            "SELECT ID, SENTENCE_ID, CID, LINK, HEAD, FUNC FROM CHUNKS WHERE DOCUMENT_ID IN ({}) ORDER BY SENTENCE_ID, CID".format(placeholder),
+            doc_ids
+        )
+        for row in cursor.fetchall():
+            chunk_table.setdefault(row[1], []).append(row)
+        cursor.close()
+        for doc_id, name in doc_rows:
+            document = corpus.new_document(name)
+            for sentence_id, sid in sentence_table.get(doc_id, []):
+                chunk_rows = chunk_table.get(sentence_id, [])
+                cid_localize_table = {chunk_id: cid for chunk_id, _, cid, _, _, _ in chunk_rows}
+                document.add_sentence(sid, (
+                    (cid, cid_localize_table.get(link, -1), head, func, token_table.get(chunk_id, []))
+                    for chunk_id, _, cid, link, head, func in chunk_rows
+                ))
     def load_sencences(self, doc_id):
         cursor = self.connector.cursor()
         cursor.execute("SELECT * FROM SENTENCES WHERE DOCUMENT_ID = ? ORDER BY SID", (doc_id,))
@@ -476,10 +1121,11 @@ class DatabaseLoader:
         self.chunkid_localize_table = dict()
         for sentence_id, doc_id, self.seeking_sid in cursor.fetchall():
             self.chunkid_contains_list = dict()
-            sentence = nlelement.Sentence()
+            sentence = self.sentence_class()
             sentence.sid = self.seeking_sid
             sentence.tokens = self.load_tokens(sentence_id, sentence)
             sentence.chunks = self.load_chunks(sentence_id, sentence)
+            sentence.index_chunks()
             sentences.append(sentence)
             self.chunkid_contains_list = None
         cursor.close()
@@ -488,11 +1134,18 @@ class DatabaseLoader:
     def load_chunks(self, sentence_id, sentence):
         cursor = self.connector.cursor()
         cursor.execute("SELECT * FROM CHUNKS WHERE SENTENCE_ID = ? ORDER BY CID", (sentence_id,))
+        chunks = self.__make_chunks__(sentence, cursor.fetchall())
+        cursor.close()
+        return chunks
+    def __make_chunks__(self, sentence, rows):
+        """Chunksテーブルのレコード(CID順)から文節のリストを組み立てる
+        sentence.tokensとchunkid_contains_listはロード済みであること
+        """
         chunks = []
         links = []
         cid_localize_table = dict()
-        for chunk_id, doc_id, sent_id, cid, link_chunk_id, head_pos, func_pos in cursor.fetchall():
-            chunk = nlelement.Chunk()
+        for chunk_id, doc_id, sent_id, cid, link_chunk_id, head_pos, func_pos in rows:
+            chunk = self.chunk_class()
             chunk.sid = sentence.sid
             chunk.cid = cid
             chunk.head_position = head_pos
@@ -502,16 +1155,18 @@ class DatabaseLoader:
                 for tid in self.chunkid_contains_list[chunk_id]:
                     try:
                         chunk.tokens.append(sentence.tokens[tid])
-                    except IndexError:
-                        print(self.chunkid_contains_list)
-                        print(sentence.get_surface())
-                        raise
+                    except IndexError as inst:
+                        newinst = LoadError(inst=inst)
+                        newinst.sent_i = sentence.sid
+                        newinst.chunk_i = cid
+                        newinst.token_i = tid
+                        newinst.sent_surf = sentence.get_surface()
+                        raise newinst from inst
             self.__token_post_process__(chunk)
             chunk.set_token_info()
             cid_localize_table[chunk_id] = cid
             self.chunkid_localize_table[chunk_id] = (self.seeking_sid, cid)
             links.append(link_chunk_id)
-        cursor.close()
         del_list = []
         for chunk, link_chunk_id in zip(chunks, links):
             if not chunk.tokens:
@@ -550,169 +1205,150 @@ class DatabaseLoader:
             where sent.id = token.sentence_id and token.id = ?
         """, (token_id,))
         return cursor.fetchone()
+    def __antecedent_ref__(self, ant_token_id, ant_stid):
+        """先行詞の参照を作る(単語が見つからない場合は外界照応のIDとして解釈する)
+        """
+        if ant_stid is not None:
+            return nlelement.TokenReference(*ant_stid)
+        elif ant_token_id <= EXOREFERENCE_ID_BEGIN:
+            return nlelement.ExoReference(-ant_token_id+EXOREFERENCE_ID_BEGIN)
+        return None
+    @staticmethod
+    def __antecedent_surface__(document, ant_ref, ant_stid):
+        if ant_stid and all(map(lambda x: x>=0, ant_stid)):
+            return document.refer(ant_ref).surface
+        elif isinstance(ant_ref, nlelement.ExoReference):
+            return "Exophora {}".format(ant_ref.exo_value)
+        return ""
     def load_semroles(self, document: nlelement.Document, doc_id):
+        """意味役割と動詞の意味ラベルを読み込む
+        述語・項の(SID, TID)はアノテーションのクエリの中で結合して取得するので、クエリ数は文書ごとに一定
+        """
         cursor = self.connector.cursor()
         cursor.execute("""
-            SELECT * FROM SemanticRole WHERE PREDICATE IN (
-                SELECT ID FROM TOKENS WHERE DOCUMENT_ID = ?
-            )
-            """, (doc_id,))
-        for pred_token_id, semrole, ant_token_id in cursor.fetchall():
-            pred_stid = self.get_token_ref(pred_token_id)
-            ant_stid = self.get_token_ref(ant_token_id)
-            #pred_stid = self.tokenid_localize_table[pred_token_id] \
-            #    if pred_token_id in self.tokenid_localize_table else None
-            #ant_stid = self.tokenid_localize_table[ant_token_id] \
-            #    if ant_token_id in self.tokenid_localize_table else None
-            if pred_stid is not None:
-                pred_ref = nlelement.TokenReference(*pred_stid)
-                pred = document.refer(pred_ref)
-                if ant_stid is not None:
-                    ant_ref= nlelement.TokenReference(*ant_stid)
-                elif ant_token_id <= EXOREFERENCE_ID_BEGIN:
-                    ant_ref = nlelement.ExoReference(-ant_token_id+EXOREFERENCE_ID_BEGIN)
-                else:
-                    ant_ref = None
-                if not self.load_exophora and isinstance(ant_ref, nlelement.ExoReference):
-                    continue
-                if ant_ref is not None:
-                    if not pred:
-                        print('error pred is none({0}, {1})'.format(pred_ref.sid, pred_ref.tid))
-                    else:
-                        if not hasattr(pred, 'semroles'):
-                            setattr(pred, 'semroles', dict())
-                        pred.semroles[semrole] = ant_ref
-        cursor.execute("""
-            SELECT * FROM VerbSemantic WHERE PREDICATE IN (
-                SELECT ID FROM TOKENS WHERE DOCUMENT_ID = ?
-            )
+            SELECT pred_sent.SID, pred.TID, role.SEMROLE, role.ANTECEDENT, ant_sent.SID, ant.TID
+            FROM SemanticRole AS role
+                JOIN TOKENS AS pred ON pred.ID = role.PREDICATE
+                JOIN SENTENCES AS pred_sent ON pred_sent.ID = pred.SENTENCE_ID
+                LEFT JOIN TOKENS AS ant ON ant.ID = role.ANTECEDENT
+                LEFT JOIN SENTENCES AS ant_sent ON ant_sent.ID = ant.SENTENCE_ID
+            WHERE pred_sent.DOCUMENT_ID = ?
+            ORDER BY role.ROWID
             """, (doc_id,))
-        for pred_token_id, semantic in cursor.fetchall():
-            pred_stid = self.get_token_ref(pred_token_id)
-            #pred_stid = self.tokenid_localize_table[pred_token_id] \
-            #    if pred_token_id in self.tokenid_localize_table else None
-            #ant_stid = self.tokenid_localize_table[ant_token_id] \
-            #    if ant_token_id in self.tokenid_localize_table else None
-            if pred_stid is not None:
-                pred_ref = nlelement.TokenReference(*pred_stid)
-                pred = document.refer(pred_ref)
+        for pred_sid, pred_tid, semrole, ant_token_id, ant_sid, ant_tid in cursor.fetchall():
+            pred_ref = nlelement.TokenReference(pred_sid, pred_tid)
+            pred = document.refer(pred_ref)
+            ant_ref = self.__antecedent_ref__(ant_token_id, (ant_sid, ant_tid) if ant_sid is not None else None)
+            if not self.load_exophora and isinstance(ant_ref, nlelement.ExoReference):
+                continue
+            if ant_ref is not None:
                 if not pred:
                     print('error pred is none({0}, {1})'.format(pred_ref.sid, pred_ref.tid))
                 else:
-                    setattr(pred, 'semantic_label', semantic)
-        
+                    if not hasattr(pred, 'semroles'):
+                        setattr(pred, 'semroles', dict())
+                    pred.semroles[semrole] = ant_ref
+        cursor.execute("""
+            SELECT pred_sent.SID, pred.TID, verb.SEMANTIC
+            FROM VerbSemantic AS verb
+                JOIN TOKENS AS pred ON pred.ID = verb.PREDICATE
+                JOIN SENTENCES AS pred_sent ON pred_sent.ID = pred.SENTENCE_ID
+            WHERE pred_sent.DOCUMENT_ID = ?
+            ORDER BY verb.ROWID
+            """, (doc_id,))
+        for pred_sid, pred_tid, semantic in cursor.fetchall():
+            pred_ref = nlelement.TokenReference(pred_sid, pred_tid)
+            pred = document.refer(pred_ref)
+            if not pred:
+                print('error pred is none({0}, {1})'.format(pred_ref.sid, pred_ref.tid))
+            else:
+                setattr(pred, 'semantic_label', semantic)
+        cursor.close()
+
     def load_coreference_links(self, document: nlelement.Document, doc_id):
+        """共参照と述語項を読み込む
+        照応詞・先行詞の(SID, TID)はアノテーションのクエリの中で結合して取得するので、クエリ数は文書ごとに一定
+        """
         cursor = self.connector.cursor()
         cursor.execute("""
-            SELECT * FROM Coreference WHERE ANAPHORA IN (
-                SELECT ID FROM TOKENS WHERE SENTENCE_ID IN (SELECT ID FROM SENTENCES WHERE DOCUMENT_ID = ?)
-            )
+            SELECT ana_sent.SID, ana.TID, coref.LINKTYPE, coref.ANTECEDENT, ant_sent.SID, ant.TID
+            FROM Coreference AS coref
+                JOIN TOKENS AS ana ON ana.ID = coref.ANAPHORA
+                JOIN SENTENCES AS ana_sent ON ana_sent.ID = ana.SENTENCE_ID
+                LEFT JOIN TOKENS AS ant ON ant.ID = coref.ANTECEDENT
+                LEFT JOIN SENTENCES AS ant_sent ON ant_sent.ID = ant.SENTENCE_ID
+            WHERE ana_sent.DOCUMENT_ID = ?
+            ORDER BY coref.ROWID
             """, (doc_id,))
-        for ana_token_id, link_type, ant_token_id in cursor.fetchall():    
-            ana_stid = self.get_token_ref(ana_token_id)
-            #self.tokenid_localize_table[ana_token_id] \
-            #    if ana_token_id in self.tokenid_localize_table else None
-            ant_stid = self.get_token_ref(ant_token_id)
-            #self.tokenid_localize_table[ant_token_id] \
-            #    if ant_token_id in self.tokenid_localize_table else None
-            if ana_stid is not None:
-                ana_ref = nlelement.TokenReference(*ana_stid)
-                anaphora = document.refer(ana_ref)
-                if ant_stid is not None:
-                    ant_ref= nlelement.TokenReference(*ant_stid)
-                elif ant_token_id <= EXOREFERENCE_ID_BEGIN:
-                    ant_ref = nlelement.ExoReference(-ant_token_id+EXOREFERENCE_ID_BEGIN)
-                else:
-                    ant_ref = None
-                if ant_stid and all(map(lambda x: x>=0, ant_stid)):
-                    ant_surface = document.refer(ant_ref).surface 
-                elif isinstance(ant_ref, nlelement.ExoReference):
-                    ant_surface = "Exophora {}".format(ant_ref.exo_value)
-                else:
-                    ant_surface = ""
-                if not self.load_exophora and isinstance(ant_ref, nlelement.ExoReference):
-                    continue
-                entry = nlelement.CoreferenceEntry(
-                    ana_ref, ant_ref, -1, -1, ant_surface
-                    )
-                entry.link_type = link_type
-                anaphora.coreference_link['coref'] = entry
+        for ana_sid, ana_tid, link_type, ant_token_id, ant_sid, ant_tid in cursor.fetchall():
+            self.__add_coreference_entry__(
+                document, 'coref', (ana_sid, ana_tid), link_type, ant_token_id,
+                (ant_sid, ant_tid) if ant_sid is not None else None
+            )
         cursor.execute("""
-        SELECT * FROM PredicateTerm WHERE Predicate IN (
-            SELECT ID FROM TOKENS WHERE SENTENCE_ID IN (SELECT ID FROM SENTENCES WHERE DOCUMENT_ID = ?)
-        )
-        """, (doc_id,))
-        #case_renormalize_table = {
-        #    "ga": "ガ",
-        #    "wo": "ヲ",
-        #    "ni": "二",
-        #}
-        for ana_token_id, case, link_type, ant_token_id in cursor.fetchall():
-            ana_stid = self.get_token_ref(ana_token_id)
-            #self.tokenid_localize_table[ana_token_id] \
-            #    if ana_token_id in self.tokenid_localize_table else None
-            ant_stid = self.get_token_ref(ant_token_id)
-            #self.tokenid_localize_table[ant_token_id] \
-            #    if ant_token_id in self.tokenid_localize_table else None
-            if ana_stid is not None:
-                ana_ref = nlelement.TokenReference(*ana_stid)
-                anaphora = document.refer(ana_ref)
-                ant_ref = nlelement.TokenReference(*ant_stid) if ant_stid is not None else None
-                case_kana = case#case_renormalize_table[case]
-                if ant_stid is not None:
-                    ant_ref= nlelement.TokenReference(*ant_stid)
-                elif ant_token_id <= EXOREFERENCE_ID_BEGIN:
-                    ant_ref = nlelement.ExoReference(-ant_token_id+EXOREFERENCE_ID_BEGIN)
-                else:
-                    ant_ref = None
-                if ant_stid and all(map(lambda x: x>=0, ant_stid)):
-                    ant_surface = document.refer(ant_ref).surface 
-                elif isinstance(ant_ref, nlelement.ExoReference):
-                    ant_surface = "Exophora {}".format(ant_ref.exo_value)
-                else:
-                    ant_surface = ""
-                if not self.load_exophora and isinstance(ant_ref, nlelement.ExoReference):
-                    continue
-                entry = nlelement.CoreferenceEntry(
-                    ana_ref, ant_ref, -1, -1, ant_surface
-                    )
-                entry.link_type = link_type
-                anaphora.coreference_link[case_kana] = entry
+            SELECT ana_sent.SID, ana.TID, term.CASEPT, term.LINKTYPE, term.ANTECEDENT, ant_sent.SID, ant.TID
+            FROM PredicateTerm AS term
+                JOIN TOKENS AS ana ON ana.ID = term.PREDICATE
+                JOIN SENTENCES AS ana_sent ON ana_sent.ID = ana.SENTENCE_ID
+                LEFT JOIN TOKENS AS ant ON ant.ID = term.ANTECEDENT
+                LEFT JOIN SENTENCES AS ant_sent ON ant_sent.ID = ant.SENTENCE_ID
+            WHERE ana_sent.DOCUMENT_ID = ?
+            ORDER BY term.ROWID
+            """, (doc_id,))
+        for ana_sid, ana_tid, case, link_type, ant_token_id, ant_sid, ant_tid in cursor.fetchall():
+            self.__add_coreference_entry__(
+                document, case, (ana_sid, ana_tid), link_type, ant_token_id,
+                (ant_sid, ant_tid) if ant_sid is not None else None
+            )
         cursor.close()
+    def __add_coreference_entry__(self, document, name, ana_stid, link_type, ant_token_id, ant_stid):
+        ana_ref = nlelement.TokenReference(*ana_stid)
+        anaphora = document.refer(ana_ref)
+        ant_ref = self.__antecedent_ref__(ant_token_id, ant_stid)
+        ant_surface = self.__antecedent_surface__(document, ant_ref, ant_stid)
+        if not self.load_exophora and isinstance(ant_ref, nlelement.ExoReference):
+            return
+        entry = nlelement.CoreferenceEntry(
+            ana_ref, ant_ref, -1, -1, ant_surface
+            )
+        entry.link_type = link_type
+        anaphora.coreference_link[name] = entry
     def load_tokens(self, sentence_id, sentence):
         cursor = self.connector.cursor()
         attr_cursor = self.connector.cursor()
         tokens = []
         cursor.execute("SELECT * FROM TOKENS WHERE SENTENCE_ID = ? ORDER BY TID", (sentence_id,))
-        for token_id, document_id, sentence_id, chunk_id, tid, surface, base, read, part, attr1, attr2, conj_type, conj_form, named_entity, pas_type in cursor.fetchall():
-            token = nlelement.Token()
-            token.sid = sentence.sid
-            token.tid = tid
-            token.surface, token.basic_surface = surface, base
-            token.read = read
-            token.part = part
-            token.part_id = loadercommon.part_id[part] if part in loadercommon.part_id else 10
-            token.attr1 = attr1
-            token.attr2 = attr2
-            token.pos = '-'.join((part, attr1, attr2))
-            token.conj_type, token.conj_form = conj_type, conj_form
-            token.named_entity = named_entity
-            token.pas_type = pas_type
-            if token.part == '名詞':
-                token.sahen = (token.attr1 == 'サ変')
-                token.normalnoun = (token.attr1 == '一般')
-                token.adjectivenoun = (token.attr1 == '副詞可能')
-            attr_cursor.execute("SELECT NAME, VALUE FROM Token_Tags WHERE token = ?", (token_id,))
-            for name, value in attr_cursor.fetchall():
-                setattr(token, name, value)
-            if chunk_id not in self.chunkid_contains_list:
-                self.chunkid_contains_list[chunk_id] = list()
-            self.chunkid_contains_list[chunk_id].append(tid)
-            #self.tokenid_localize_table[token_id] = (self.seeking_sid, tid)
-            tokens.append(token)
+        for row in cursor.fetchall():
+            attr_cursor.execute("SELECT NAME, VALUE FROM Token_Tags WHERE token = ?", (row[0],))
+            tokens.append(self.__make_token__(sentence, row, attr_cursor.fetchall()))
         attr_cursor.close()
         cursor.close()
         return tokens
+    def __make_token__(self, sentence, row, tags):
+        """Tokensテーブルのレコードと(NAME, VALUE)のタグのリストから単語を生成する
+        """
+        token_id, document_id, sentence_id, chunk_id, tid, surface, base, read, part, attr1, attr2, conj_type, conj_form, named_entity, pas_type = row
+        token = self.token_class()
+        token.sid = sentence.sid
+        token.tid = tid
+        # 文字列はloadercommon.symbolsでまとめ、品詞などの組からの変換結果はloadercommon.feature_cacheで共有する
+        intern = loadercommon.symbols.intern
+        token.surface, token.basic_surface = intern(surface), intern(base)
+        token.read = intern(read)
+        (
+            token.part, token.part_id, token.attr1, token.attr2, token.pos, token.conj_type, token.conj_form,
+            token.named_entity, token.sahen, token.normalnoun, token.adjectivenoun
+        ) = loadercommon.feature_cache.get(
+            'database', (part, attr1, attr2, conj_type, conj_form, named_entity), __decode_token_features__
+        )
+        token.pas_type = intern(pas_type)
+        for name, value in tags:
+            setattr(token, name, value)
+        if chunk_id not in self.chunkid_contains_list:
+            self.chunkid_contains_list[chunk_id] = list()
+        self.chunkid_contains_list[chunk_id].append(tid)
+        #self.tokenid_localize_table[token_id] = (self.seeking_sid, tid)
+        return token
     def __token_post_process__(self, chunk):
         """トークンをチャンクに追加した後に追加したトークンに応じて属性値を変更する
         内容語の場合は機能表現の位置を+1するとか
@@ -731,12 +1367,24 @@ class DatabaseLoader:
                 chunk.emphasis = True
 
 class DatabaseWriter:
-    def __init__(self, db_filename, append=False):
-        self.loader = DatabaseLoader(db_filename)
+    def __init__(self, db_filename, append=False, bulk=False, profile=None, materialize=False):
+        """
+        Args:
+            append (bool): Falseの場合は既存のテーブルの内容を消去する
+            bulk (bool): Trueの場合はadd_documents_bulkでまとめて追加する
+            profile (str): 接続の設定(CONNECTION_PROFILESのキー、ex. 'bulk_load')
+            materialize (bool): Trueの場合は閉じるときに文・文節の表層の表を作る(DatabaseLoader.materialize_surfaces)
+                すでに表がある場合は指定しなくても追加した文書の分を更新する
+        """
+        self.loader = DatabaseLoader(db_filename, profile=profile)
+        self.bulk = bulk
+        self.materialize = materialize
+        self.deferred_indices = False
         cursor = self.loader.connector.cursor()
         cursor.execute("SELECT count(*) from SQLITE_MASTER WHERE TYPE='table'")
         if cursor.fetchone()[0] == 0:
-            self.loader.create_tables()
+            self.deferred_indices = CONNECTION_PROFILES.get(profile, {}).get('defer_indices', False)
+            self.loader.create_tables(indices=not self.deferred_indices)
         elif not append:
             self.loader.clear()
         self.loader.update_views()
@@ -745,11 +1393,82 @@ class DatabaseWriter:
     def __enter__(self):
         return self
     def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    def close(self):
+        """書き込みを確定して接続を閉じる(作成を後回しにしたインデックスはここで作る)
+        """
+        if self.loader.connector is None:
+            return
         self.loader.connector.commit()
-        self.loader.__exit__(exc_type, exc_value, traceback)
+        if self.deferred_indices:
+            self.loader.create_indices()
+            self.deferred_indices = False
+        if self.materialize or self.loader.has_surface_tables():
+            self.loader.materialize_surfaces()
+        self.loader.close()
 
-    def add_documents(self, documents):
-        self.loader.save_in_additional(documents)
+    def add_documents(self, documents, batch_size=100):
+        """文書を追加保存する
+        Args:
+            documents: 文書のリスト、あるいは文書を1つずつ返すイテラブル(CabochaLoader.iter_loadなど)
+                リスト以外はbatch_size文書ずつまとめて保存するので、全体をメモリに載せる必要はない
+        """
+        if isinstance(documents, list):
+            self.loader.save_in_additional(documents, bulk=self.bulk, refresh_surfaces=False)
+            return
+        batch = []
+        for document in documents:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                self.loader.save_in_additional(batch, bulk=self.bulk, refresh_surfaces=False)
+                batch = []
+        if batch:
+            self.loader.save_in_additional(batch, bulk=self.bulk, refresh_surfaces=False)
+
+    def build(self, documents, batch_size=100, analyze=True):
+        """インデックスなしで文書を追加してから、インデックスの作成とANALYZEを行う
+        batch_size文書ごとに1つのトランザクションで保存するので、途中で異常終了しても保存済みの文書は残る
+        同じデータベースに対してもう一度呼び出すと、保存済みの名前の文書を飛ばして続きから追加する
+        (名前で区別するので、同じ名前の文書は最初の1つだけを保存する)
+        Args:
+            documents: 文書を1つずつ返すイテラブル
+            batch_size (int): 1つのトランザクションで保存する文書数
+            analyze (bool): 最後にANALYZEでクエリプランナーの統計を更新する
+        Returns:
+            int: 今回保存した文書数
+        """
+        connector = self.loader.connector
+        connector.commit()
+        self.loader.drop_indices()
+        # 作成はこの関数の最後で行う
+        self.deferred_indices = False
+        committed = set(self.loader.get_names())
+        count = 0
+        batch = []
+        try:
+            for document in documents:
+                if document.name in committed:
+                    continue
+                committed.add(document.name)
+                batch.append(document)
+                if len(batch) >= batch_size:
+                    self.loader.save_in_additional(batch, bulk=self.bulk, refresh_surfaces=False)
+                    connector.commit()
+                    count += len(batch)
+                    batch = []
+            if batch:
+                self.loader.save_in_additional(batch, bulk=self.bulk, refresh_surfaces=False)
+                connector.commit()
+                count += len(batch)
+        except BaseException:
+            # 書きかけのバッチを残さない
+            connector.rollback()
+            raise
+        self.loader.create_indices()
+        if analyze:
+            connector.execute("ANALYZE")
+            connector.commit()
+        return count
 
 
 def load(dbname):
@@ -774,3 +1493,11 @@ def save(dbname, documents):
         loader.update_views()
     cursor.close()
     loader.save(documents)
+
+def build(dbname, documents, batch_size=100, bulk=True, profile='bulk_load', materialize=False):
+    """DatabaseWriter.buildで文書を保存する、既存のデータベースには保存済みの文書の続きから追加する
+    Returns:
+        int: 今回保存した文書数
+    """
+    with DatabaseWriter(dbname, append=True, bulk=bulk, profile=profile, materialize=materialize) as writer:
+        return writer.build(documents, batch_size=batch_size)
@@ -1,3 +1,5 @@
+import collections
+import sys
 from . import nlelement
 
 
@@ -27,4 +29,95 @@ part_id = {
     '連体詞':7,
     '記号':8,
     'フィラー':9,
-}
\ No newline at end of file
+}
+
+class SymbolTable:
+    """同じ値の文字列を1つのオブジェクトにまとめる記号表
+    ローダーは単語の属性の文字列をsymbolsでまとめてから設定するので、
+    コーパス中の同じ品詞や表層の文字列は1つのオブジェクトを共有する
+    NOTE: 文字列はsys.internでまとめる(どこからも参照されなくなった文字列は解放されるので、
+    表層のように種類の多い文字列を長時間まとめ続けても表は大きくならない)
+    """
+    @staticmethod
+    def intern(value):
+        """valueと同じ値の文字列を返す(文字列以外はそのまま返す)
+        """
+        if type(value) is not str:
+            return value
+        return sys.intern(value)
+
+# すべてのローダーで共有する記号表
+symbols = SymbolTable()
+
+class FeatureCache:
+    """素性文字列の変換結果を保持する容量つきのLRUキャッシュ
+    (ローダーごとの名前空間, 素性文字列)をキーにして、すべてのローダーでfeature_cacheを共有する
+    変換結果の文字列はsymbolsでまとめるので、同じ素性を持つ単語は属性の文字列を共有する
+    USAGE:
+        >>>record = feature_cache.get('cabocha.ipadic', feature, decode)
+        >>>feature_cache.stats()
+        {'hits': 10, 'misses': 2, 'size': 2, 'maxsize': 100000, 'hit_rate': 0.833...}
+    """
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.records = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace, feature, decode):
+        """素性文字列の変換結果を取得する(なければdecode(feature)で変換して追加する)
+        Args:
+            namespace: 変換方法ごとに異なる名前空間(同じ素性文字列でも変換方法が違えば別に保持する)
+            feature (str): 素性文字列
+            decode: 素性文字列から変換結果のタプルを返す関数
+        """
+        key = (namespace, feature)
+        records = self.records
+        record = records.get(key)
+        if record is not None:
+            self.hits += 1
+            # 複数のスレッドから使われる場合、取得してから移動するまでに追い出されていることがある
+            try:
+                records.move_to_end(key)
+            except KeyError:
+                pass
+            return record
+        self.misses += 1
+        intern = symbols.intern
+        record = tuple(map(intern, decode(feature)))
+        records[key] = record
+        while len(records) > self.maxsize:
+            try:
+                records.popitem(last=False)
+            except KeyError:
+                break
+        return record
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        """ヒット数, ミス数, 保持している件数, 容量, ヒット率
+        """
+        return {
+            'hits': self.hits, 'misses': self.misses, 'size': len(self.records),
+            'maxsize': self.maxsize, 'hit_rate': self.hit_rate()
+        }
+
+    def resize(self, maxsize):
+        """容量を変更する(超えた分は古いものから捨てる)
+        """
+        self.maxsize = maxsize
+        while len(self.records) > maxsize:
+            self.records.popitem(last=False)
+
+    def clear(self):
+        """保持している変換結果と統計を消去する
+        """
+        self.records.clear()
+        self.hits = 0
+        self.misses = 0
+
+# すべてのローダーで共有する素性文字列の変換結果のキャッシュ
+feature_cache = FeatureCache()
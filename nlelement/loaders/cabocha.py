@@ -1,8 +1,12 @@
+import io
 import os
 import re
 import subprocess
+import queue
+import threading
 from nlelement import nlelement
 from nlelement import loadercommon
+from . import common
 from .common import LoadError
 
 class CabochaLoader:
@@ -94,6 +98,7 @@ class CabochaLoader:
                     if ch.link_id >= 0:
                         ch.link = sentence.chunks[ch.link_id]
                         sentence.chunks[ch.link_id].reverse_links.append(ch)
+                sentence.index_chunks()
                 doc.sentences.append(sentence)
                 sentence = nlelement.Sentence()
                 sentence.sid = self.ids.sent.get()
@@ -151,23 +156,23 @@ class CabochaLoader:
     def __load_token__(self, line):
         token = nlelement.Token()
         surf_feat = line.split('\t')
-        header = surf_feat[1].split(',')
+        feature = surf_feat[1]
         try:
             # 出力は固定長なので必ず13分割
-            token.surface = surf_feat[0]
-            token = self.pos_load_func(token, header)
+            token.surface = loadercommon.symbols.intern(surf_feat[0])
+            token = self.pos_load_func(token, feature)
             # 固有表現の取得（汎用を想定しているが、depparaには不要）
             if len(surf_feat) > 2 and re.match('NE:', surf_feat[2]):
                 if surf_feat[2][-1] == '\n':
                     surf_feat[2] = surf_feat[2][:-1]
                 ne_features = surf_feat[2].split(':')
-                token.named_entity = ne_features[1]
-                token.named_entity_part = ne_features[2] if len(ne_features) > 2 else ''
+                token.named_entity = loadercommon.symbols.intern(ne_features[1])
+                token.named_entity_part = loadercommon.symbols.intern(ne_features[2]) if len(ne_features) > 2 else ''
             elif len(surf_feat) > 2:
                 self.__handle_annotation__(self, surf_feat)
         except Exception as inst:
             newinst = LoadError(inst=inst)
-            newinst.problemed = str(header)
+            newinst.problemed = str(feature.split(','))
             newinst.input_line = line
             newinst.token_i = -1
             newinst.line_num = self.line_num
@@ -190,115 +195,260 @@ class CabochaLoader:
             chunk.emphasis = True
         return token
 
-    def __load_token_pos_unidic__(self, token, header):
+    @staticmethod
+    def __decode_pos_unidic__(feature):
+        """unidic式の素性文字列を__load_token_pos_unidic__で設定する属性の組に変換する
+        """
+        header = feature.split(',')
+        part = header[0]
+        attr2 = header[2]
+        is_noun = part == '名詞'
+        return (
+            header[9], header[7], part,
+            loadercommon.part_id[part] if part in loadercommon.part_id else 10,
+            header[1], attr2, header[3],
+            header[4] if header[4] != "*" else "",
+            header[5] if header[5] != "*" else "",
+            # attrの設定方法から修正, 0-4には必ず品詞-属性の順番で前から並ぶ
+            '-'.join(filter(lambda s: s and s != '*',header[0:4])),
+            is_noun and attr2 == 'サ変可能', is_noun and attr2 == '一般', is_noun and attr2 == '副詞可能',
+        )
+
+    def __load_token_pos_unidic__(self, token, feature):
         """unidic式のフォーマットに対する形態素のロードを行う
         ARGS:
             token(): このトークンに属性を書き込む
-            header(list<str>): csv形式の素性リスト
+            feature(str): csv形式の素性文字列(変換結果はloadercommon.feature_cacheで共有する)
         """
-        token.read = header[9]
-        token.basic_surface = header[7]
-        token.part = header[0]
-        token.part_id = loadercommon.part_id[header[0]] if header[0] in loadercommon.part_id else 10
-        token.attr1 = header[1]
-        token.attr2 = header[2]
-        token.attr3 = header[3]
-        token.conj_type = header[4] if header[4] != "*" else ""
-        token.conj_form = header[5] if header[5] != "*" else ""
-        # attrの設定方法から修正, 0-4には必ず品詞-属性の順番で前から並ぶ
-        token.pos = '-'.join(filter(lambda s: s and s != '*',header[0:4]))
         # TODO: それぞれのチャンクにはキャッシュ属性的な属性がかなり付いているが,やっぱり除去したいので使用しているセクションを整理する
-        if token.part == '名詞':
-            token.sahen = (token.attr2 == 'サ変可能')
-            token.normalnoun = (token.attr2 == '一般')
-            token.adjectivenoun = (token.attr2 == '副詞可能')
+        (
+            token.read, token.basic_surface, token.part, token.part_id, token.attr1, token.attr2, token.attr3,
+            token.conj_type, token.conj_form, token.pos, token.sahen, token.normalnoun, token.adjectivenoun
+        ) = loadercommon.feature_cache.get('cabocha.unidic', feature, CabochaLoader.__decode_pos_unidic__)
         return token
 
-    def __load_token_pos_ipadic__(self, token, header):
+    @staticmethod
+    def __decode_pos_ipadic__(feature):
+        """ipa式の素性文字列を__load_token_pos_ipadic__で設定する属性の組に変換する(原形がない場合はNone)
+        """
+        header = feature.split(',')
+        part = header[0]
+        attr1 = header[1]
+        is_noun = part == '名詞'
+        return (
+            header[7] if len(header) > 7 else '',
+            header[6] if len(header) > 7 else None,
+            part, loadercommon.part_id[part] if part in loadercommon.part_id else 10,
+            attr1, header[2],
+            header[4] if header[4] != "*" else "",
+            header[5] if header[5] != "*" else "",
+            # attrの設定方法から修正, 0-4には必ず品詞-属性の順番で前から並ぶ
+            '-'.join(filter(lambda s: s and s != '*',header[0:3])),
+            is_noun and attr1 == 'サ変', is_noun and attr1 == '一般', is_noun and attr1 == '副詞可能',
+        )
+
+    def __load_token_pos_ipadic__(self, token, feature):
         """ipa式のフォーマットに対する形態素ロードを行う
         TODO: IPA用の辞書は容易だけしてあるが、使用していないのでバグがあるかも、テスト書いてね
         """
-        token.read = header[7] if len(header) > 7 else ''
-        token.basic_surface = header[6] if len(header) > 7 else token.surface
-        token.part = header[0]
-        token.part_id = loadercommon.part_id[header[0]] if header[0] in loadercommon.part_id else 10
-        token.attr1 = header[1]
-        token.attr2 = header[2]
-        token.conj_type = header[4] if header[4] != "*" else ""
-        token.conj_form = header[5] if header[5] != "*" else ""
-        # attrの設定方法から修正, 0-4には必ず品詞-属性の順番で前から並ぶ
-        token.pos = '-'.join(filter(lambda s: s and s != '*',header[0:3]))
-        # TODO: それぞれのチャンクにはキャッシュ属性的な属性がかなり付いているが,やっぱり除去したいので使用しているセクションを整理する
-        if token.part == '名詞':
-            token.sahen = (token.attr1 == 'サ変')
-            token.normalnoun = (token.attr1 == '一般')
-            token.adjectivenoun = (token.attr1 == '副詞可能')
+        (
+            token.read, basic_surface, token.part, token.part_id, token.attr1, token.attr2,
+            token.conj_type, token.conj_form, token.pos, token.sahen, token.normalnoun, token.adjectivenoun
+        ) = loadercommon.feature_cache.get('cabocha.ipadic', feature, CabochaLoader.__decode_pos_ipadic__)
+        token.basic_surface = token.surface if basic_surface is None else basic_surface
         return token
 
 
 class CabochaDumper:
     @staticmethod
+    def dump_to(stream, documents, encoding='utf-8'):
+        """文書を1文ずつCaboChaフォーマットに変換してストリームに書き込む
+        文書全体の文字列を作らないので、DatabaseLoader.load_as_iterなどの文書の列も一定のメモリで書き出せる
+        Args:
+            stream: 書き込み先(テキストでもバイナリでもよい、バイナリの場合はencodingでエンコードする)
+            documents: Documentのイテラブル
+        """
+        stream, release = common.open_text_stream(stream, encoding)
+        try:
+            for document in documents:
+                CabochaDumper.__write_document__(stream.write, document)
+        finally:
+            release()
+    @staticmethod
+    def __write_document__(write, document):
+        for sentence in document.sentences:
+            write(CabochaDumper.sent_to_format(sentence))
+        write('EOT\n')
+    @staticmethod
     def doc_to_format(document: nlelement.Document):
         """DocumentオブジェクトからCaboChaフォーマットを生成する
         """
-        fmt_text = ''
-        for sentence in document.sentences:
-            fmt_text += CabochaDumper.sent_to_format(sentence)
-        fmt_text += 'EOT\n'
-        return fmt_text
+        buffer = io.StringIO()
+        CabochaDumper.__write_document__(buffer.write, document)
+        return buffer.getvalue()
     @staticmethod
     def sent_to_format(sentence: nlelement.Sentence):
         """SentenceオブジェクトからCaboChaフォーマットを生成する
         """
-        fmt_text = ''
+        lines = []
         for chunk in sentence.chunks:
-            fmt_text += CabochaDumper.chunk_to_format(chunk)
-            for token in chunk.tokens:
-                fmt_text += CabochaDumper.token_to_format(token)
-        fmt_text += 'EOS\n'
-        return fmt_text
+            lines.append(CabochaDumper.chunk_to_format(chunk))
+            lines.extend(map(CabochaDumper.token_to_format, chunk.tokens))
+        lines.append('EOS\n')
+        return ''.join(lines)
     @staticmethod
     def chunk_to_format(chunk: nlelement.Chunk):
         """ChunkオブジェクトからCaboChaフォーマットを生成する
         """
-        fmt_text = ''
-        fmt_text += '* ' + '{0} {1}D '.format(chunk.cid, chunk.link_id)
-        if chunk.func_position == chunk.token_num:
-            fmt_text += '{0}/{1}'.format(chunk.head_position, chunk.head_position)
-        else:
-            fmt_text += '{0}/{1}'.format(chunk.head_position, chunk.func_position)
-        fmt_text += ' 0.00000\n'
-        return fmt_text
+        func_position = chunk.head_position if chunk.func_position == chunk.token_num else chunk.func_position
+        return '* {0} {1}D {2}/{3} 0.00000\n'.format(chunk.cid, chunk.link_id, chunk.head_position, func_position)
     @staticmethod
     def token_to_format(token: nlelement.Token):
         """TokenオブジェクトからCaboCha(ほぼMeCab)フォーマットを生成する
+        NOTE: 活用型・活用形が空でない場合は後ろに','が付かない(以前からの出力形式)
+        """
+        return '{0}\t{1},{2},{3},*,{4}{5}{6},{7},{7}\t{8}\n'.format(
+            token.surface, token.part, token.attr1, token.attr2,
+            token.conj_type if token.conj_type else "*,",
+            token.conj_form if token.conj_form else "*,",
+            token.basic_surface, token.read,
+            'B-'+token.named_entity if token.named_entity != '' else 'O'
+        )
+
+class CabochaProcess:
+    """標準入力から1行ずつ文を受け取り続ける常駐のcabochaプロセス
+    文を1行ずつ書き込み、出力はEOSごとに区切って読み取り用のスレッドがキューに積む
+    (出力を読み取らないまま書き込み続けると、両方のパイプが一杯になった時点でお互いに待ち合って止まるため)
+    NOTE: cabochaは入力の1行を1文として解析し、EOSを出力するごとに出力をフラッシュすることを前提にしている
+    """
+    def __init__(self, command, encoding="utf8"):
+        self.command = command
+        self.process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, encoding=encoding, bufsize=1
+        )
+        self.lattices = queue.Queue()
+        self.reader = threading.Thread(target=self.__read_lattices__, daemon=True)
+        self.reader.start()
+
+    @staticmethod
+    def __to_line__(text):
+        """文を改行を含まない1行にする(parseは以前から最初の行の解析結果しか使っていない)
+        """
+        lines = text.splitlines()
+        return lines[0] if lines else ''
+
+    def __exited__(self):
+        return RuntimeError('cabocha process exited with {} before EOS: {}'.format(
+            self.process.poll(), ' '.join(self.command)
+        ))
+
+    def __read_lattices__(self):
+        """読み取り用のスレッド: 出力をEOSごとに区切ってキューに積む(出力が終わったらNoneを積む)
+        """
+        lines = []
+        try:
+            for line in self.process.stdout:
+                lines.append(line)
+                if line.rstrip('\r\n') == 'EOS':
+                    self.lattices.put(''.join(lines))
+                    lines = []
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.lattices.put(None)
+
+    def send(self, text):
+        try:
+            self.process.stdin.write(CabochaProcess.__to_line__(text) + '\n')
+            self.process.stdin.flush()
+        except BrokenPipeError as inst:
+            raise self.__exited__() from inst
+
+    def receive(self):
+        """1文分(EOSまで)の解析結果を読み取る
         """
-        result = ''
-        result += token.surface
-        result += '\t'
-        result += token.part + ','
-        result += token.attr1 + ','
-        result += token.attr2 + ','
-        result += '*' + ','
-        result += token.conj_type if token.conj_type else "*" + ','
-        result += token.conj_form if token.conj_form else "*" + ','
-        result += token.basic_surface + ','
-        result += token.read + ','
-        result += token.read + '\t'
-        result += 'B-'+token.named_entity if token.named_entity != '' else 'O'
-        result += '\n'
-        return result
+        lattice = self.lattices.get()
+        if lattice is None:
+            # 後続のreceiveも失敗させる
+            self.lattices.put(None)
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+            raise self.__exited__()
+        return lattice
+
+    def parse_many(self, texts, max_inflight=32):
+        """文を順に解析し、解析結果を入力順に返すジェネレータ
+        出力を待たずにmax_inflight文まで先に書き込む
+        """
+        pending = 0
+        for text in texts:
+            self.send(text)
+            pending += 1
+            if pending >= max_inflight:
+                yield self.receive()
+                pending -= 1
+        while pending:
+            yield self.receive()
+            pending -= 1
+
+    def close(self):
+        """入力を閉じてプロセスの終了を待つ(終了しない場合はkillする)
+        """
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.reader.join()
+        self.process.stdout.close()
 
 class CabochaParser:
-    def __init__(self, encoding="utf8", dic_name="ipadic"):
-        self.cabocha_path = "cabocha"
+    """cabochaで文を解析してSentenceを生成する
+    cabochaのプロセスは最初に使うときに起動し、closeするまで使い回す
+    USAGE:
+        >>>with CabochaParser(workers=4) as parser:
+        ...    sentences = parser.parse_many(texts)
+    """
+    def __init__(self, encoding="utf8", dic_name="ipadic", cabocha_path="cabocha", workers=1, max_inflight=32):
+        """
+        Args:
+            cabocha_path (str): cabochaの実行ファイル
+            workers (int): parse_manyで使うcabochaのプロセス数の既定値
+            max_inflight (int): 1つのプロセスに解析結果を待たずに送る文の数の上限
+        """
+        self.cabocha_path = cabocha_path
         self.cabocha_args = ["-f", "1", "-n", "1"]
         self.loader = CabochaLoader(morph_dic_name=dic_name)
         self.encoding = encoding
+        self.workers = workers
+        self.max_inflight = max_inflight
+        self.processes = []
 
-    def parse(self, text, sid=0):
-        result = subprocess.run([self.cabocha_path] + self.cabocha_args, input=text.encode(self.encoding), stdout=subprocess.PIPE)
-        docs = self.loader.load(result.stdout.decode(self.encoding))
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """起動したcabochaのプロセスを終了する
+        """
+        for process in self.processes:
+            process.close()
+        self.processes = []
+
+    def __get_processes__(self, num):
+        while len(self.processes) < num:
+            self.processes.append(CabochaProcess([self.cabocha_path] + self.cabocha_args, self.encoding))
+        return self.processes[:num]
+
+    def __make_sentence__(self, lattice, sid):
+        docs = self.loader.load(lattice)
         sent = docs[0].sentences[0]
         sent.sid = sid
         for tok in nlelement.tokens(sent):
@@ -307,27 +457,71 @@ class CabochaParser:
             chk.sid = sid
         return sent
 
+    def parse(self, text, sid=0):
+        return self.__make_sentence__(self.__parse_lattices__(self.__get_processes__(1), [text])[0], sid)
+
+    def parse_many(self, texts, workers=None):
+        """複数の文をworkers個のcabochaプロセスで解析し、入力順のSentenceのリストを返す(sidは0からの通し番号)
+        文はmax_inflight文ずつ空いているプロセスに割り当てる
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        lattices = self.__parse_lattices__(self.__get_processes__(min(workers or self.workers, len(texts))), texts)
+        return [self.__make_sentence__(lattice, sid) for sid, lattice in enumerate(lattices)]
+
+    def __parse_lattices__(self, processes, texts):
+        """文の解析結果(EOSまでの出力)を入力順に返す
+        """
+        try:
+            return self.__dispatch__(processes, texts)
+        except Exception:
+            # 解析結果を読み残したプロセスは使い回せないので終了させる
+            self.close()
+            raise
+
+    def __dispatch__(self, processes, texts):
+        if len(processes) == 1:
+            lattices = list(processes[0].parse_many(texts, self.max_inflight))
+        else:
+            lattices = [None] * len(texts)
+            batches = queue.Queue()
+            for begin in range(0, len(texts), self.max_inflight):
+                batches.put(begin)
+            errors = []
+            def work(process):
+                try:
+                    while True:
+                        try:
+                            begin = batches.get_nowait()
+                        except queue.Empty:
+                            return
+                        end = begin + self.max_inflight
+                        lattices[begin:end] = process.parse_many(texts[begin:end], self.max_inflight)
+                except Exception as inst:
+                    errors.append(inst)
+            threads = [threading.Thread(target=work, args=(process,)) for process in processes]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            if errors:
+                raise errors[0]
+        return lattices
+
     def parse_document(self, raw_sentences, delimiter=None, name='cabocha_parsed'):
-        if isinstance(raw_sentences, list):
-            doc = nlelement.Document()
-            doc.name = name
-            for i, raw_sent in enumerate(raw_sentences):
-                sent = self.parse(raw_sent, sid=i)
-                doc.sentences.append(sent)
-            return doc
-        elif isinstance(raw_sentences, str):
-            doc = nlelement.Document()
-            doc.name = name
+        if isinstance(raw_sentences, str):
             if delimiter is None:
-                for i, raw_sent in enumerate(raw_sentences.splitlines()):
-                    sent = self.parse(raw_sent, sid=i)
-                    doc.sentences.append(sent)
+                raw_sentences = raw_sentences.splitlines()
             else:
-                for i, raw_sent in enumerate(raw_sentences.split(delimiter)):
-                    sent = self.parse(raw_sent, sid=i)
-                    doc.sentences.append(sent)
-            return doc
-        raise ValueError("Cannot parse {} object".format(type(raw_sent)))
+                raw_sentences = raw_sentences.split(delimiter)
+        elif not isinstance(raw_sentences, list):
+            raise ValueError("Cannot parse {} object".format(type(raw_sentences)))
+        doc = nlelement.Document()
+        doc.name = name
+        for sent in self.parse_many(raw_sentences):
+            doc.sentences.append(sent)
+        return doc
 
 def load(text, basename="cabocha_autoload"):
     return load(text, basename=basename)
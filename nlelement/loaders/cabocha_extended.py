@@ -1,10 +1,17 @@
 import os
 import re
 import io
+import gzip
+import lzma
+import collections
+import multiprocessing
+import shelve
+import tempfile
 from nlelement import myprogress
 from nlelement import nlelement
 from nlelement import argument
 from nlelement import loadercommon
+from . import common
 
 
 class ChunkMarger:
@@ -27,12 +34,7 @@ class ChunkMarger:
         count = 0
         for annotation in annotations:
             if annotation.name in self.doc_table:
-                self.error_count = 0
-                self.__merge_doc__(self.doc_table[annotation.name], annotation)
-                if self.error_count > 0:
-                    print('error detected:', annotation.name)
-                    self.error_set.add(annotation.name)
-                    self.total_error += self.error_count
+                self.__merge_one__(self.doc_table[annotation.name], annotation)
             count += 1
             progress.update(count)
         progress.finish()
@@ -43,15 +45,88 @@ class ChunkMarger:
         count = 0
         for annotation in annotation_iter:
             if annotation.name in self.doc_table:
-                self.error_count = 0
-                self.__merge_doc__(self.doc_table[annotation.name], annotation)
-                if self.error_count > 0:
-                    print('error detected:', annotation.name)
-                    self.error_set.add(annotation.name)
-                    self.total_error += self.error_count
+                self.__merge_one__(self.doc_table[annotation.name], annotation)
             count += 1
             progress.update(count)
         progress.finish()
+    def merge_join(self, origs, annotations):
+        """文書名の昇順に並んだ2つの文書列を突き合わせ、マージした文書を1つずつ返すジェネレータ
+        どちらの文書列も先頭から1度ずつ読むだけなので、原文をすべてメモリに載せる必要はない
+        (ex. DatabaseLoader.load_as_iter(order_by='NAME')同士のマージ)
+        対応する注釈がない文書もそのまま返す
+        Args:
+            origs (iterable<Document>): 文節を付与する文書の列(名前の昇順)
+            annotations (iterable<Document>): 文節の区切りと係り受けを持つ文書の列(名前の昇順)
+        Raises:
+            ValueError: 文書名が昇順に並んでいない場合
+        """
+        anno_iter = iter(annotations)
+        annotation = next(anno_iter, None)
+        last_orig, last_anno = None, None
+        for orig in origs:
+            if last_orig is not None and orig.name < last_orig:
+                raise ValueError('origs are not sorted by name: {} < {}'.format(orig.name, last_orig))
+            last_orig = orig.name
+            while annotation is not None and annotation.name <= orig.name:
+                if last_anno is not None and annotation.name < last_anno:
+                    raise ValueError(
+                        'annotations are not sorted by name: {} < {}'.format(annotation.name, last_anno)
+                    )
+                last_anno = annotation.name
+                if annotation.name == orig.name:
+                    self.__merge_one__(orig, annotation)
+                annotation = next(anno_iter, None)
+            yield orig
+    def merge_hash(self, origs, annotations, max_in_memory=1000, spill_dir=None):
+        """文書名で並んでいない文書列をマージするジェネレータ
+        注釈の文書を名前で引ける表にしてから、原文を1つずつ読んでマージして返す
+        注釈がmax_in_memory文書を超えた分は一時ディレクトリのshelveに書き出す
+        Args:
+            origs (iterable<Document>): 文節を付与する文書の列
+            annotations (iterable<Document>): 文節の区切りと係り受けを持つ文書の列
+            max_in_memory (int): メモリ上に保持する注釈の文書数の上限
+            spill_dir (str): 書き出し先の一時ディレクトリを作る場所(Noneの場合はシステムの既定)
+        """
+        with tempfile.TemporaryDirectory(dir=spill_dir) as tmpdir:
+            table = {}
+            spill = None
+            try:
+                for annotation in annotations:
+                    if annotation.name in table:
+                        table[annotation.name].append(annotation)
+                    elif len(table) < max_in_memory:
+                        table[annotation.name] = [annotation]
+                    else:
+                        if spill is None:
+                            spill = shelve.open(os.path.join(tmpdir, 'annotations'))
+                        spill[annotation.name] = spill.get(annotation.name, []) + [annotation]
+                for orig in origs:
+                    found = table.get(orig.name)
+                    if found is None and spill is not None:
+                        found = spill.get(orig.name)
+                    for annotation in found or []:
+                        self.__merge_one__(orig, annotation)
+                    yield orig
+            finally:
+                if spill is not None:
+                    spill.close()
+    def iter_merge(self, origs, annotations, sorted_by_name=False, **kwargs):
+        """文書列をマージした文書を1つずつ返すジェネレータ
+        sorted_by_nameがTrueの場合はmerge_join, そうでない場合はmerge_hashを使う
+        結果はDatabaseWriter.add_documentsにそのまま渡して書き出せる
+        Args:
+            kwargs: merge_hashに渡す引数(max_in_memory, spill_dir)
+        """
+        if sorted_by_name:
+            return self.merge_join(origs, annotations)
+        return self.merge_hash(origs, annotations, **kwargs)
+    def __merge_one__(self, orig, annotation):
+        self.error_count = 0
+        self.__merge_doc__(orig, annotation)
+        if self.error_count > 0:
+            print('error detected:', annotation.name)
+            self.error_set.add(annotation.name)
+            self.total_error += self.error_count
     def __merge_doc__(self, orig, annotation):
         self.__merge_chunkofdoc__(orig, annotation)
         map_table = self.__map_chunk__(orig, annotation)
@@ -166,6 +241,22 @@ def test_merger():
     print('retrieved : ', '/'.join(map(lambda x:x.get_surface(), nlelement.chunks(orig))))
     print(anno.name, '/error_count: ', merger.total_error)
 
+def merge_database(orig_filename, anno_filename, out_filename, batch_size=100):
+    """2つのデータベースの文書を文書名で突き合わせてマージし、別のデータベースに書き出す
+    どちらも名前順に読み出してmerge_joinするので、メモリに載るのはbatch_size文書程度で済む
+    Returns:
+        ChunkMarger: マージに使ったオブジェクト(error_set, total_errorの確認用)
+    """
+    from nlelement import database
+    merger = ChunkMarger()
+    with database.DatabaseLoader(orig_filename) as orig_loader, \
+            database.DatabaseLoader(anno_filename) as anno_loader, \
+            database.DatabaseWriter(out_filename, bulk=True) as writer:
+        writer.add_documents(merger.merge_join(
+            orig_loader.load_as_iter(order_by='NAME'), anno_loader.load_as_iter(order_by='NAME')
+        ), batch_size=batch_size)
+    return merger
+
 def pathexpr(expr):
     """パス表現を環境に応じて正規化
     """
@@ -270,7 +361,7 @@ def validate_reference(document: nlelement.Document, reference):
     """
     if document.refer(reference) is None:
         sent = document.refer_sentence(reference.sid)
-        if not document.refer_sentence(reference.sid):
+        if not sent:
             content_expr = '{}'.format(tuple(map(lambda s: s.sid, document.sentences))) if document.sentences else "[no-contents]"
             raise RuntimeError('[{}]Invalid sentence reference {} not in {}'.format(document.name, reference.sid, content_expr))
         else:
@@ -281,6 +372,65 @@ def validate_reference(document: nlelement.Document, reference):
                 content_expr = '[{}, {}]'.format(sent.chunks[0].tid, sent.chunks[-1].tid) if sent.chunks else "[no-contents]"
                 raise RuntimeError('[{}]Invalid reference {} not in {}{}'.format(document.name, reference, sent.get_surface(), content_expr))
 
+# アノテーション列の解析に使う正規表現
+# NTC形式: key=value[,key=value...] (valueは「参照先;スコア;スコア」など)
+NTC_COLUMN_PATTERN = re.compile(r'[^=]+=[-\w.;]')
+NTC_ITEM_PATTERN = re.compile(r'([^=]+)=([-\w.;]+)')
+# 標準形式: key="value"[ key="value"...]
+STANDARD_ITEM_PATTERN = re.compile(r'([^=]+)="([\w.]+)"')
+# 外界照応の参照先(exo1, exo2, exogなど)
+EXO_REFERENCE_PATTERN = re.compile(r'exo[\dg]')
+# 参照先が(参照先, スコア, スコア)の3つ組の場合のみ読み込むキー
+CASE_LINK_KEYS = frozenset(('ga', 'o', 'ni', 'eq'))
+
+def __make_entity_link__(tup):
+    """(参照先, スコア, スコア)の文字列の組を(参照先ID, float, float)に変換する(外界照応の参照先は文字列のまま)
+    """
+    ref_id = tup[0] if EXO_REFERENCE_PATTERN.match(tup[0]) else int(tup[0])
+    return (ref_id, float(tup[1]), float(tup[2]))
+
+def __decode_feature__(feature):
+    """素性文字列をCabochaLoader.__load_token__で設定する属性の組に変換する
+    (read, basic_surface, part, part_id, attr1, attr2, pos, sahen, normalnoun, adjectivenoun, conj_type, conj_form)
+    """
+    header = feature.split(',')
+    part, attr1, attr2 = header[0], header[1], header[2]
+    is_noun = part == '名詞'
+    return (
+        header[7], header[6], part, loadercommon.part_id[part] if part in loadercommon.part_id else 10,
+        attr1, attr2, part + '-' + attr1 + '-' + attr2,
+        is_noun and attr1 == 'サ変', is_noun and attr1 == '一般', is_noun and attr1 == '副詞可能',
+        header[4], header[5],
+    )
+
+# load_parallelのワーカープロセスごとのCabochaLoader
+__worker_loader__ = None
+
+def __init_worker__(as_label, use_standard):
+    global __worker_loader__
+    __worker_loader__ = CabochaLoader('', as_label=as_label, use_standard=use_standard)
+
+def __load_files__(filenames):
+    """ワーカープロセスでファイルを順に読み込み、ファイル順に文書のリストを返す
+    LoadError以外の例外もファイル名と行番号を付けたLoadErrorにして呼び出し元に伝える
+    """
+    loader = __worker_loader__
+    documents = []
+    for filename in filenames:
+        loader.line_num = -1
+        try:
+            documents.extend(loader.iter_file(filename))
+        except LoadError:
+            raise
+        except Exception as inst:
+            newinst = LoadError(inst=inst)
+            newinst.input_line = loader.line or ''
+            newinst.line_num = loader.line_num
+            newinst.file_name = filename
+            newinst.set_args()
+            raise newinst from inst
+    return documents
+
 class CabochaLoader:
     def __init__(self, directory, as_label=False, use_standard=False):
         self.directory = directory
@@ -296,35 +446,128 @@ class CabochaLoader:
         self.entity_ids = dict()
         self.as_label = as_label
         self.use_standard = use_standard
+    # 圧縮されたファイルの拡張子とそれを開く関数
+    compressed_openers = {'.gz': gzip.open, '.xz': lzma.open}
+    @staticmethod
+    def __strip_compression__(filename):
+        """圧縮ファイルの拡張子(.gz, .xz)を除いたファイル名
+        """
+        root, ext = os.path.splitext(filename)
+        return root if ext in CabochaLoader.compressed_openers else filename
     def __get_docname__(self, filename):
-        basename = self.filenamegetter.match(filename).group(1)
+        basename = self.filenamegetter.match(CabochaLoader.__strip_compression__(filename)).group(1)
         docname = '_'.join(basename.split('_')[-2:])
         return docname
-    def load(self):
+    def __open__(self, filename):
+        """CaboChaファイルをテキストとして開く(.gz, .xzの場合は展開しながら読む)
+        """
+        opener = CabochaLoader.compressed_openers.get(os.path.splitext(filename)[1])
+        if opener is not None:
+            return opener(filename, 'rt', encoding='utf-8')
+        return open(filename, encoding='utf-8')
+    def __is_target__(self, filename):
+        return self.filter_func(CabochaLoader.__strip_compression__(filename))
+    def iter_files(self, recursive=False):
+        """ディレクトリ中のCaboChaファイル(.cab, .cabocha およびその.gz, .xz圧縮)のパスを名前順に列挙する
+        Args:
+            recursive (bool): Trueの場合はサブディレクトリも(名前順に)たどる
+        """
+        if not recursive:
+            for name in sorted(os.listdir(self.directory)):
+                if self.__is_target__(name) and os.path.isfile(os.path.join(self.directory, name)):
+                    yield os.path.join(self.directory, name)
+            return
+        for root, dirs, files in os.walk(self.directory):
+            dirs.sort()
+            for name in sorted(files):
+                if self.__is_target__(name):
+                    yield os.path.join(root, name)
+    def iter_file(self, filename):
+        """1つのファイルに含まれる文書をEOTまで読み込むたびに返すジェネレータ
+        文書名はloadと同じ(ファイルに文書が1つならファイル名から、複数なら末尾に通し番号をつける)
+        通し番号をつけるか決めるために、次の文書を読み込むまでは直前の文書を保持する
+        """
+        self.doc_file = filename
+        basename = self.__get_docname__(filename)
         ids = loadercommon.IdGenerator()
+        pending = None
+        count = 0
+        with self.__open__(filename) as file:
+            try:
+                for doc in self.__iter_document__(file):
+                    if pending is not None:
+                        pending.name = basename+'_'+str(ids.get())
+                        yield pending
+                    pending = doc
+                    count += 1
+            except LoadError as inst:
+                inst.message = '{0} {1}'.format('Load Failed{0}'.format(basename), getattr(inst, 'message', ''))
+                raise
+        if pending is not None:
+            pending.name = basename if count == 1 else basename+'_'+str(ids.get())
+            yield pending
+    def iter_load(self, recursive=True):
+        """ディレクトリ中のCaboChaファイルから文書を1つずつ読み込むジェネレータ
+        保持するのは読み込み中の文書(と名前を決めるための直前の文書)だけなので、コーパス全体をメモリに載せずに処理できる
+        NOTE: 読み込み中の状態をインスタンスに保持するので、同じインスタンスで複数のiter_loadを同時に進めないこと
+        Args:
+            recursive (bool): Trueの場合はサブディレクトリのファイルも読み込む
+        """
+        for filename in self.iter_files(recursive):
+            yield from self.iter_file(filename)
+    def load(self):
         documents = []
-        self.item_list = list(map(lambda x: os.path.join(self.directory, x), filter(self.filter_func, os.listdir(self.directory))))
+        self.item_list = list(self.iter_files())
         progress = myprogress.make_progress(max_value=len(self.item_list))
         count = 0
-        for self.doc_file in self.item_list:
-            with open(self.doc_file, encoding='utf-8') as file:
-                basename = self.__get_docname__(self.doc_file)
-                try:
-                    docs = self. __load_document__(file)
-                except LoadError as inst:
-                    inst.message = '{0} {1}'.format('Load Failed{0}'.format(basename), inst.message)
-                    raise
-                if len(docs) == 1:
-                    docs[0].name = basename
-                else:
-                    ids.reset()
-                    for doc in docs:
-                        doc.name = basename+'_'+str(ids.get())
-                documents.extend(docs)
+        for filename in self.item_list:
+            documents.extend(self.iter_file(filename))
             count += 1
             progress.update(count)
         progress.finish()
         return documents
+    def __iter_shards_parallel__(self, filenames, workers, shard_size):
+        """ファイルのリストをshard_sizeずつワーカープロセスに渡し、(ファイル数, 文書のリスト)をファイル順に返す
+        """
+        workers = workers or os.cpu_count() or 1
+        max_pending = workers * 2
+        with multiprocessing.Pool(workers, __init_worker__, (self.as_label, self.use_standard)) as pool:
+            pending = collections.deque()
+            for begin in range(0, len(filenames), shard_size):
+                shard = filenames[begin:begin+shard_size]
+                pending.append((len(shard), pool.apply_async(__load_files__, (shard,))))
+                if len(pending) >= max_pending:
+                    file_num, result = pending.popleft()
+                    yield file_num, result.get()
+            while pending:
+                file_num, result = pending.popleft()
+                yield file_num, result.get()
+    def iter_load_parallel(self, workers=None, recursive=True, shard_size=4):
+        """複数のプロセスでファイルを読み込み、iter_loadと同じ順序・文書名で文書を1つずつ返すジェネレータ
+        Args:
+            workers (int): ワーカープロセス数(Noneの場合はCPU数)
+            recursive (bool): Trueの場合はサブディレクトリのファイルも読み込む
+            shard_size (int): 1つのワーカーにまとめて渡すファイル数
+        Raises:
+            LoadError: 読み込みに失敗したファイル名と行番号を含む
+        """
+        for _, documents in self.__iter_shards_parallel__(list(self.iter_files(recursive)), workers, shard_size):
+            yield from documents
+    def load_parallel(self, workers=None, recursive=False, shard_size=4):
+        """複数のプロセスでloadと同じ文書のリストを読み込む
+        Args:
+            workers, recursive, shard_size: iter_load_parallelを参照
+        """
+        documents = []
+        self.item_list = list(self.iter_files(recursive))
+        progress = myprogress.make_progress(max_value=len(self.item_list))
+        count = 0
+        for file_num, docs in self.__iter_shards_parallel__(self.item_list, workers, shard_size):
+            documents.extend(docs)
+            count += file_num
+            progress.update(count)
+        progress.finish()
+        return documents
     def __handle_comment__(self, comment):
         pass
     def __validate_sentence__(self, sentence):
@@ -340,10 +583,13 @@ class CabochaLoader:
                 #raise RuntimeError('{2}: {0} not in {1}'.format(chunk.link_id, range(-1, chunk_num), self.doc_file)+sentence.get_surface())
 
     def __load_document__(self, lines):
-        docs = []
+        return list(self.__iter_document__(lines))
+
+    def __iter_document__(self, lines):
+        """行の列から文書を読み込み、EOTあるいは入力の終わりに達するたびに文書を返すジェネレータ
+        """
         self.ids.sent.reset()
         doc = nlelement.Document()
-        docs.append(doc)
         sentence = nlelement.Sentence()
         sentence.sid = self.ids.sent.get()
         self.ids.chunk.reset()
@@ -356,13 +602,14 @@ class CabochaLoader:
                 self.__resolve_entity_id__(doc)
                 self.ids.sent.reset()
                 self.entity_ids = dict()
+                yield doc
                 doc = nlelement.Document()
-                docs.append(doc)
             elif self.line == 'EOS':
                 # NOTE: もとになってるcabochaモジュールでsidが永遠に付与されないという深すぎる闇があった
                 for tok in sentence.tokens:
                     tok.sid = sentence.sid
                 self.__validate_sentence__(sentence)
+                sentence.index_chunks()
                 doc.sentences.append(sentence)
                 sentence = nlelement.Sentence()
                 sentence.sid = self.ids.sent.get()
@@ -393,7 +640,7 @@ class CabochaLoader:
             self.__resolve_entity_id__(doc)
             self.ids.sent.reset()
             self.entity_ids = dict()
-        return docs
+        yield doc
 
     def __add_exophora__(self):
         for key, reference in [("exo1", nlelement.ExoReference(1)), 
@@ -528,29 +775,20 @@ class CabochaLoader:
         if len(surf_feat) == 1:
             surf_feat = list(filter(None, line.split()))
             #print(surf_feat, len(surf_feat))
-        header = surf_feat[1].split(',')
+        feature = surf_feat[1]
         try:
             # 出力は固定長なので必ず13分割
-            token.surface = surf_feat[0]
-            token.read = header[7]
-            token.basic_surface = header[6]
-            token.part = header[0]
-            token.part_id = loadercommon.part_id[header[0]] if header[0] in loadercommon.part_id else 10
-            token.attr1 = header[1]
-            token.attr2 = header[2]
-            token.pos = token.part + '-' + token.attr1 + '-' + token.attr2
-            if token.part == '名詞':
-                token.sahen = (token.attr1 == 'サ変')
-                token.normalnoun = (token.attr1 == '一般')
-                token.adjectivenoun = (token.attr1 == '副詞可能')
-            token.conj_type = header[4]
-            token.conj_form = header[5]
+            token.surface = loadercommon.symbols.intern(surf_feat[0])
+            (
+                token.read, token.basic_surface, token.part, token.part_id, token.attr1, token.attr2, token.pos,
+                token.sahen, token.normalnoun, token.adjectivenoun, token.conj_type, token.conj_form
+            ) = loadercommon.feature_cache.get('cabocha_extended', feature, __decode_feature__)
             # 固有表現の取得
             if len(surf_feat) > 2:
                 self.__handle_annotation__(token, surf_feat)
         except Exception as inst:
             newinst = LoadError(inst=inst)
-            newinst.problemed = str(header)
+            newinst.problemed = str(feature.split(','))
             newinst.input_line = line
             newinst.token_i = -1
             newinst.line_num = self.line_num
@@ -561,74 +799,55 @@ class CabochaLoader:
 
     def __handle_annotation__(self, tok, annotations):
         """固有表現, 述語項, 意味役割の各アノテーションがトークンについている場合に解析する
+        各列はコンパイル済みの正規表現で1回ずつ走査する
         """
         for anno in annotations[2:]:
             anno = anno.rstrip('\n')
-            if re.match(r'(B|I)-.+', anno):
-                #print(anno)
+            head = anno[:2]
+            if len(anno) > 2 and (head == 'B-' or head == 'I-'):
                 ne_features = anno
                 tok.named_entity = ne_features[0]
                 tok.named_entity_part = ne_features[1] if len(ne_features) > 2 else ''
-            elif re.match(r'(I|O)', anno):
+            elif anno.startswith(('I', 'O')):
                 pass
-            elif not self.use_standard and re.match(r'([^=]+=[-\w\d\.;]+,?)+', anno):
-                for id_resolver in anno.split(','):
-                    #print(id_resolver)
-                    match = re.match(r'([^=]+)=([-\w\d\.;]+)', id_resolver)
-                    if not match:
-                        pass
-                    else:
-                        self.__handle_ntc_annotation__(tok, match.group(1), match.group(2))
-            elif self.use_standard and re.match(r'[^=]+=\"[\w\d\.]+\"', anno):
-                match = re.match(r'([^=]+)=\"([\w\d\.]+)\"', anno)
-                if not match:
-                    pass
-                else:
+            elif not self.use_standard:
+                if NTC_COLUMN_PATTERN.match(anno):
+                    match_item = NTC_ITEM_PATTERN.match
+                    for id_resolver in anno.split(','):
+                        match = match_item(id_resolver)
+                        if match:
+                            self.__handle_ntc_annotation__(tok, match.group(1), match.group(2))
+            else:
+                match = STANDARD_ITEM_PATTERN.match(anno)
+                if match:
                     self.__handle_ntc_annotation__(tok, match.group(1), match.group(2))
-            elif self.use_standard:
-                for id_resolver in anno.split(' '):
-                    match = re.match(r'([^=]+)=\"([\w\d\.]+)\"', id_resolver)
-                    if not match:
-                        pass
-                    else:
-                        self.__handle_ntc_annotation__(tok, match.group(1), match.group(2))
-            
+                else:
+                    match_item = STANDARD_ITEM_PATTERN.match
+                    for id_resolver in anno.split(' '):
+                        match = match_item(id_resolver)
+                        if match:
+                            self.__handle_ntc_annotation__(tok, match.group(1), match.group(2))
+
     def __handle_ntc_annotation__(self, tok, left, right):
         if left == 'id':
-            tup = tuple(right.split())
-            self.entity_ids[int(tup[0])] = tok
+            self.entity_ids[int(right.split()[0])] = tok
         elif left == 'type':
             tok.pas_type = right
         else:
-            if not hasattr(tok, "entity_links"):
-                setattr(tok, "entity_links", dict())
-            tup = tuple(right.split(";"))
+            entity_links = getattr(tok, 'entity_links', None)
+            if entity_links is None:
+                entity_links = dict()
+                tok.entity_links = entity_links
+            tup = tuple(right.split(';'))
             if len(tup) == 1:
                 tup = (tup[0], 1.0, 0.0)
-            key = left
-            
-            if key in ['ga', 'o', 'ni']:
-                if len(tup) == 3:                   
-                    if key not in tok.entity_links:
-                        tok.entity_links[key] = []
-                    mt = re.match(r"exo([\dg])", tup[0])
-                    ref_id = int(tup[0]) if not mt else tup[0]
-                    tok.entity_links[key].append((ref_id, float(tup[1]), float(tup[2])))
-            elif key == 'eq':
-                #print('eq_load {}')                            
+            if left in CASE_LINK_KEYS:
                 if len(tup) == 3:
-                    if key not in tok.entity_links:
-                        tok.entity_links[key] = []
-                    mt = re.match(r"exo([\dg])", tup[0])
-                    ref_id = int(tup[0]) if not mt else tup[0]
-                    tok.entity_links[key].append((ref_id, float(tup[1]), float(tup[2])))
+                    entity_links.setdefault(left, []).append(__make_entity_link__(tup))
             else:
-                if key not in tok.entity_links:
-                    tok.entity_links[key] = []
+                links = entity_links.setdefault(left, [])
                 try:
-                    mt = re.match(r"exo([\dg])", tup[0])
-                    ref_id = int(tup[0]) if not mt else tup[0]
-                    tok.entity_links[key].append((ref_id, float(tup[1]), float(tup[2])))
+                    links.append(__make_entity_link__(tup))
                 except ValueError as e:
                     raise ValueError(str(e)+"{}".format(tup))
     def __token_post_process__(self, chunk, token):
@@ -843,46 +1062,56 @@ class CabochaDumper:
             if hasattr(tok, "entity_links"):
                 delattr(tok, "entity_links")
     @staticmethod
-    def doc_to_format(document: nlelement.Document, dump_type='scored_output', with_header=False):
-        """DocumentオブジェクトからCaboChaフォーマットを生成する
+    def dump_to(stream, documents, dump_type='scored_output', with_header=False, encoding='utf-8'):
+        """文書を1文ずつCaboChaフォーマットに変換してストリームに書き込む
+        文書全体の文字列を作らないので、DatabaseLoader.load_as_iterなどの文書の列も一定のメモリで書き出せる
+        Args:
+            stream: 書き込み先(テキストでもバイナリでもよい、バイナリの場合はencodingでエンコードする)
+            documents: Documentのイテラブル
+            dump_type, with_header: doc_to_formatを参照
         """
+        stream, release = common.open_text_stream(stream, encoding)
+        try:
+            for document in documents:
+                CabochaDumper.__write_document__(stream.write, document, dump_type, with_header)
+        finally:
+            release()
+    @staticmethod
+    def __write_document__(write, document, dump_type, with_header):
         CabochaDumper.preprocess_doc(document, dump_type)
-        fmt_text = ''
         if with_header:
-            fmt_text += '# DOCNAME:{}'.format(document.name)
+            write('# DOCNAME:{}'.format(document.name))
+        to_standard = dump_type == 'standard' or dump_type == 'result'
         for sentence in document.sentences:
-            if dump_type == 'standard' or dump_type == 'result':
-                fmt_text += CabochaDumper.sent_to_format(sentence, to_standard=True)            
-            else:
-                fmt_text += CabochaDumper.sent_to_format(sentence)
-        fmt_text += 'EOT\n'
+            write(CabochaDumper.sent_to_format(sentence, to_standard=to_standard))
+        write('EOT\n')
         CabochaDumper.postproccess_doc(document)
-        return fmt_text
+    @staticmethod
+    def doc_to_format(document: nlelement.Document, dump_type='scored_output', with_header=False):
+        """DocumentオブジェクトからCaboChaフォーマットを生成する
+        """
+        buffer = io.StringIO()
+        CabochaDumper.__write_document__(buffer.write, document, dump_type, with_header)
+        return buffer.getvalue()
     @staticmethod
     def sent_to_format(sentence: nlelement.Sentence, to_standard=False):
         """SentenceオブジェクトからCaboChaフォーマットを生成する
         """
-        fmt_text = ''
+        lines = []
         for chunk in sentence.chunks:
-            fmt_text += CabochaDumper.chunk_to_format(chunk)
+            lines.append(CabochaDumper.chunk_to_format(chunk))
             for token in chunk.tokens:
-                fmt_text += CabochaDumper.token_to_format(token, to_standard=to_standard)
-        fmt_text += 'EOS\n'
-        return fmt_text
+                lines.append(CabochaDumper.token_to_format(token, to_standard=to_standard))
+        lines.append('EOS\n')
+        return ''.join(lines)
     @staticmethod
     def chunk_to_format(chunk: nlelement.Chunk):
         """ChunkオブジェクトからCaboChaフォーマットを生成する
         """
         if chunk.chunk_type:
             setattr(chunk.head_token(), "chunk_type", chunk.chunk_type)
-        fmt_text = ''
-        fmt_text += '* ' + '{0} {1}D '.format(chunk.cid, chunk.link_id)
-        if chunk.func_position == chunk.token_num:
-            fmt_text += '{0}/{1}'.format(chunk.head_position, chunk.head_position)
-        else:
-            fmt_text += '{0}/{1}'.format(chunk.head_position, chunk.func_position)
-        fmt_text += ' 0.00000\n'
-        return fmt_text
+        func_position = chunk.head_position if chunk.func_position == chunk.token_num else chunk.func_position
+        return '* {0} {1}D {2}/{3} 0.00000\n'.format(chunk.cid, chunk.link_id, chunk.head_position, func_position)
     @staticmethod
     def default_aster(expr):
         return expr if expr else '*'
@@ -890,30 +1119,16 @@ class CabochaDumper:
     def token_to_format(token: nlelement.Token, to_standard=False):
         """TokenオブジェクトからCaboCha(ほぼMeCab)フォーマットを生成する
         """
-        result = ''
-        result += token.surface
-        result += '\t'
-        result += token.part + ','
-        result += CabochaDumper.default_aster(token.attr1) + ','
-        result += CabochaDumper.default_aster(token.attr2) + ','
-        result += '*' + ','
-        result += CabochaDumper.default_aster(token.conj_type) + ','
-        result += CabochaDumper.default_aster(token.conj_form) + ','
-        result += token.basic_surface + ','
-        result += token.read + ','
-
-        result += token.read + '\t'
-        result += 'B-'+token.named_entity if token.named_entity != '' else 'O'
         if to_standard:
             entity_anno = CabochaDumper.__annotation_to_standard_format__(token)
         else:
             entity_anno = CabochaDumper.__annotation_to_format__(token)
-        if entity_anno:
-            result += '\t'
-            result += entity_anno
-
-        result += '\n'
-        return result
+        return '{0}\t{1},{2},{3},*,{4},{5},{6},{7},{7}\t{8}{9}\n'.format(
+            token.surface, token.part, token.attr1 or '*', token.attr2 or '*',
+            token.conj_type or '*', token.conj_form or '*', token.basic_surface, token.read,
+            'B-'+token.named_entity if token.named_entity != '' else 'O',
+            '\t'+entity_anno if entity_anno else ''
+        )
 
     @staticmethod
     def __annotation_to_format__(token: nlelement.Token):
@@ -1011,6 +1226,14 @@ def dump_doc(elem, from_label=False, with_header=False):
             elem, dump_type='label' if from_label else 'scored_output', with_header=with_header)
     raise TypeError('The function could dump not {0} but Document'.format(type(elem)))
 
+def dump_to(stream, documents, from_label=False, with_header=False, encoding='utf-8'):
+    """dump_docと同じ形式で文書の列をストリームに書き込む
+    """
+    CabochaDumper.dump_to(
+        stream, documents, dump_type='label' if from_label else 'scored_output',
+        with_header=with_header, encoding=encoding
+    )
+
 def dump(elem):
     if isinstance(elem, nlelement.Document):
         return CabochaDumper.doc_to_format(elem)
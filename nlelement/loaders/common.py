@@ -1,3 +1,4 @@
+import io
 
 class LoadError(Exception):
     """解析時に発生したエラーを上に伝える
@@ -75,4 +76,19 @@ class LoadError(Exception):
             result_list.append(str(type(self.exception))+':'+str(self.exception))
         result = ''
         result += '\n'.join(result_list)
-        return result
\ No newline at end of file
+        return result
+
+def open_text_stream(stream, encoding='utf-8'):
+    """dump_toの出力先をテキストのストリームとして扱う
+    バイナリのストリームの場合はTextIOWrapperで包み、まとめてエンコードしながら書き込む
+    Returns:
+        (テキストのストリーム, 書き込み後に呼び出す関数)
+    """
+    if isinstance(stream, (io.RawIOBase, io.BufferedIOBase)):
+        wrapper = io.TextIOWrapper(stream, encoding=encoding, newline='\n')
+        def release():
+            # 包んだストリームは閉じずに残す
+            wrapper.flush()
+            wrapper.detach()
+        return wrapper, release
+    return stream, lambda: None
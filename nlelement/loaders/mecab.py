@@ -1,11 +1,20 @@
+import threading
+from concurrent import futures
 import MeCab
 from nlelement import nlelement
+from nlelement import loadercommon
 
 class MorphUnpacker:
     """素性タプルから形態素としての属性を取得するための変換器
     辞書ごとに異なる
+    同じ素性を持つ形態素は多いので、unpack_stringでは素性文字列ごとの変換結果をloadercommon.feature_cacheで共有する
     """
-    def __init__(self):
+    def __init__(self, cache_namespace=None):
+        """
+        Args:
+            cache_namespace: feature_cacheの名前空間(Noneの場合はこのインスタンス専用の名前空間を使う)
+                同じ名前空間を使うインスタンスは変換の設定が同じでなければならない
+        """
         self.pos = ()
         self.conj_type = ()
         self.conj_form = ()
@@ -14,35 +23,55 @@ class MorphUnpacker:
         self.unk_node_length = 6
         self.read = ()
         self.pron = ()
+        self.cache_namespace = cache_namespace if cache_namespace is not None else object()
 
-    def unpack(self, surface, feature):
-        token = nlelement.Token()
+    def __unpack_attributes__(self, feature):
+        """素性のリストから(pos, part, attr1, attr2, conj_type, conj_form, basic_surface, read)を求める
+        basic_surfaceがNoneの場合は表層と同じ、readがNoneの場合は設定しない
+        """
         pos_tup = tuple(map(lambda i: feature[i], self.pos))
-        token.surface = surface
-        token.pos = "-".join(filter(lambda e: e and e != "*", pos_tup))
-        token.part = pos_tup[0]
-        token.attr1 = pos_tup[1] if len(pos_tup) > 1 else "*"
-        token.attr2 = pos_tup[2] if len(pos_tup) > 2 else "*"
+        pos = "-".join(filter(lambda e: e and e != "*", pos_tup))
+        part = pos_tup[0]
+        attr1 = pos_tup[1] if len(pos_tup) > 1 else "*"
+        attr2 = pos_tup[2] if len(pos_tup) > 2 else "*"
         if len(feature) == self.unk_node_length:
-            token.conj_type = ""
-            token.conj_form = ""
-            token.basic_surface = token.surface
-            token.read = ""
-        else:
-            token.conj_type = "-".join(map(lambda i: feature[i], self.conj_type))
-            token.conj_form = "-".join(map(lambda i: feature[i], self.conj_form))
-            token.basic_surface = "-".join(map(lambda i: feature[i], self.basic_surface))
-            # Unidicの場合英語由来のカタカナ語に対してスペルを割り当てる機能がbasic_surfaceについてたりする
-            # 辞書の検索時に邪魔になりそうなので消す
-            if self.basic_surface_normalizer:
-                token.basic_surface = self.basic_surface_normalizer(token.basic_surface)
-            if len(feature) > max(self.read):
-                token.read = "-".join(map(lambda i: feature[i], self.read))
+            return (pos, part, attr1, attr2, "", "", None, "")
+        conj_type = "-".join(map(lambda i: feature[i], self.conj_type))
+        conj_form = "-".join(map(lambda i: feature[i], self.conj_form))
+        basic_surface = "-".join(map(lambda i: feature[i], self.basic_surface))
+        # Unidicの場合英語由来のカタカナ語に対してスペルを割り当てる機能がbasic_surfaceについてたりする
+        # 辞書の検索時に邪魔になりそうなので消す
+        if self.basic_surface_normalizer:
+            basic_surface = self.basic_surface_normalizer(basic_surface)
+        read = "-".join(map(lambda i: feature[i], self.read)) if len(feature) > max(self.read) else None
+        return (pos, part, attr1, attr2, conj_type, conj_form, basic_surface, read)
+
+    @staticmethod
+    def __make_token__(surface, attributes):
+        token = nlelement.Token()
+        token.surface = loadercommon.symbols.intern(surface)
+        token.pos, token.part, token.attr1, token.attr2, token.conj_type, token.conj_form, basic_surface, read = attributes
+        token.basic_surface = token.surface if basic_surface is None else basic_surface
+        if read is not None:
+            token.read = read
         return token
 
+    def unpack(self, surface, feature):
+        attributes = tuple(map(loadercommon.symbols.intern, self.__unpack_attributes__(feature)))
+        return MorphUnpacker.__make_token__(surface, attributes)
+
+    def unpack_string(self, surface, feature_string):
+        """カンマ区切りの素性文字列から形態素を生成する(変換結果は素性文字列ごとにキャッシュする)
+        """
+        attributes = loadercommon.feature_cache.get(self.cache_namespace, feature_string, self.__decode__)
+        return MorphUnpacker.__make_token__(surface, attributes)
+
+    def __decode__(self, feature_string):
+        return self.__unpack_attributes__(feature_string.split(','))
+
     @staticmethod
     def unidic():
-        unpacker = MorphUnpacker()
+        unpacker = MorphUnpacker(cache_namespace='mecab.unidic')
         unpacker.pos = (0, 1, 2, 3)
         unpacker.conj_type = (4,)
         unpacker.conj_form = (5,)
@@ -53,7 +82,7 @@ class MorphUnpacker:
 
     @staticmethod
     def ipadic():
-        unpacker = MorphUnpacker()
+        unpacker = MorphUnpacker(cache_namespace='mecab.ipadic')
         unpacker.pos = (0, 1, 2, 3)
         unpacker.conj_type = (4,)
         unpacker.conj_form = (5,)
@@ -90,6 +119,9 @@ class ConfigSets:
         return config
 
 class MeCabParser:
+    """MeCabで文を解析してSentenceを生成する
+    Modelは共有し、TaggerとLatticeはスレッドごとに作成して使い回す
+    """
     def __init__(self, config=None):
         option = ""
         if config is None:
@@ -100,6 +132,7 @@ class MeCabParser:
         self.manalyzer = MeCab.Model(option)
         self.parser = self.manalyzer.createTagger()
         self.unpacker = config.pos_unpacker if hasattr(config, "pos_unpacker") else MorphUnpacker.ipadic()
+        self.local = threading.local()
     stat_dic = {
         MeCab.MECAB_BOS_NODE :'MECAB_BOS_NODE',
         MeCab.MECAB_EON_NODE: 'MECAB_EON_NODE',
@@ -117,20 +150,54 @@ class MeCabParser:
                 yield node
             node = node.next
 
+    def __get_tagger__(self):
+        """呼び出したスレッドのTaggerとLatticeを取得する(メインスレッドのTaggerはself.parser)
+        """
+        local = self.local
+        if not hasattr(local, 'lattice'):
+            local.tagger = self.parser if threading.current_thread() is threading.main_thread() else self.manalyzer.createTagger()
+            local.lattice = self.manalyzer.createLattice()
+        return local.tagger, local.lattice
+
     def parse(self, raw_sentence, sid=0):
-        lattice = self.manalyzer.createLattice()
+        tagger, lattice = self.__get_tagger__()
         lattice.set_sentence(raw_sentence)
         sentence = nlelement.Sentence()
         sentence.sid = sid
-        self.parser.parse(lattice)
+        tagger.parse(lattice)
+        unpack = self.unpacker.unpack_string
         for node in MeCabParser.iter_nor_node(lattice.bos_node):
-            token = self.unpacker.unpack(node.surface, node.feature.split(','))
+            token = unpack(node.surface, node.feature)
             token.tid = len(sentence.tokens)
             token.sid = sentence.sid
             sentence.tokens.append(token)
         return sentence
 
-    def parse_document(self, raw_sentences, delimiter=None, name='mecab_parsed'):
+    def __parse_batch__(self, batch):
+        begin, raw_sentences = batch
+        return [self.parse(raw_sentence, begin + i) for i, raw_sentence in enumerate(raw_sentences)]
+
+    def parse_many(self, raw_sentences, workers=1, batch_size=64):
+        """複数の文を解析し、入力順のSentenceのリストを返す(sidは0からの通し番号)
+        Args:
+            workers (int): 解析するスレッド数(MeCabは解析中にGILを解放するので、2以上の場合はスレッドで並列に解析する)
+            batch_size (int): 1つのスレッドにまとめて渡す文の数
+        """
+        raw_sentences = list(raw_sentences)
+        batches = [
+            (begin, raw_sentences[begin:begin+batch_size]) for begin in range(0, len(raw_sentences), batch_size)
+        ]
+        sentences = []
+        if workers <= 1:
+            for batch in batches:
+                sentences.extend(self.__parse_batch__(batch))
+            return sentences
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for parsed in executor.map(self.__parse_batch__, batches):
+                sentences.extend(parsed)
+        return sentences
+
+    def parse_document(self, raw_sentences, delimiter=None, name='mecab_parsed', workers=1):
         rawsent_iter = None
         if delimiter is None:
             rawsent_iter = raw_sentences.splitlines()
@@ -138,6 +205,6 @@ class MeCabParser:
             rawsent_iter = raw_sentences.split(delimiter)
         document = nlelement.Document()
         document.name = name
-        for i, raw_sent in enumerate(rawsent_iter):
-            document.sentences.append(self.parse(raw_sent, i))
+        for sentence in self.parse_many(rawsent_iter, workers=workers):
+            document.sentences.append(sentence)
         return document
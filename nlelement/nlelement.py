@@ -16,6 +16,8 @@
 """
 import re
 import weakref
+from array import array
+from bisect import bisect_left, bisect_right
 from . import relation
 from .reference import TokenReference, ChunkReference, ExoReference
 
@@ -31,12 +33,115 @@ def make_reference(element):
         return element.sid    
     return None
 
+class SentenceList(list):
+    """Document.sentencesのリスト
+    文ID→文の索引と文字位置の索引(ReferenceConverter用の累積和を含む)を保持し、
+    リストが変更されるたびに索引を破棄してversionを進める
+    NOTE: 追加済みの文の文IDを書き換えた場合はinvalidate()(Document.invalidate_index())を呼ぶこと
+    """
+    def __init__(self, iterable=()):
+        list.__init__(self, iterable)
+        self.version = 0
+        self.sid_index = None
+        self.offset_index = None
+        self.aligned_offsets = None
+
+    def invalidate(self):
+        """索引を破棄する(次に参照された時点で作り直す)
+        """
+        self.version += 1
+        self.sid_index = None
+        self.offset_index = None
+        self.aligned_offsets = None
+
+    def find(self, sid):
+        """文IDから文を取得する(同じ文IDの文が複数ある場合は先頭のもの、なければNone)
+        見つからない場合は索引を作り直さずにNoneを返すので、無効な参照を何度引いても索引は1度しか作らない
+        見つかった文の文IDが書き換えられていた場合だけ索引を作り直して引き直す
+        """
+        index = self.sid_index
+        if index is None:
+            index = self.__build_sid_index__()
+        sentence = index.get(sid)
+        if sentence is not None and sentence.sid != sid:
+            sentence = self.__build_sid_index__().get(sid)
+        return sentence
+
+    def __build_sid_index__(self):
+        """文IDの索引を作り直す(文字位置の索引は文の並びにしか依存しないので破棄しない)
+        """
+        index = self.sid_index = dict()
+        for sentence in self:
+            index.setdefault(sentence.sid, sentence)
+        return index
+
+    def __reduce__(self):
+        return (SentenceList, (list(self),))
+
+    def append(self, sentence):
+        list.append(self, sentence)
+        self.invalidate()
+
+    def extend(self, sentences):
+        list.extend(self, sentences)
+        self.invalidate()
+
+    def insert(self, i, sentence):
+        list.insert(self, i, sentence)
+        self.invalidate()
+
+    def pop(self, *args):
+        result = list.pop(self, *args)
+        self.invalidate()
+        return result
+
+    def remove(self, sentence):
+        list.remove(self, sentence)
+        self.invalidate()
+
+    def clear(self):
+        list.clear(self)
+        self.invalidate()
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self.invalidate()
+
+    def reverse(self):
+        list.reverse(self)
+        self.invalidate()
+
+    def __setitem__(self, i, sentence):
+        list.__setitem__(self, i, sentence)
+        self.invalidate()
+
+    def __delitem__(self, i):
+        list.__delitem__(self, i)
+        self.invalidate()
+
+    def __iadd__(self, sentences):
+        self.extend(sentences)
+        return self
+
+    def __imul__(self, n):
+        list.__imul__(self, n)
+        self.invalidate()
+        return self
+
 class Document:
     """文章のインスタンスを保持
     """
     def __init__(self):
         self.sentences = []
         self.name = ''
+
+    # 代入されたリストはSentenceListに変換して保持する(文IDの索引を持たせるため)
+    def _get_sentences(self):
+        return self._sentences
+    def _set_sentences(self, sentences):
+        self._sentences = sentences if isinstance(sentences, SentenceList) else SentenceList(sentences)
+
+    sentences = property(_get_sentences, _set_sentences)
     def print_members(self):
         """メンバを標準出力に表示[デバッグ用]
         """
@@ -100,17 +205,28 @@ class Document:
         """単語の参照からその単語を含む文節の参照を取得する
         """
         sent = self.refer_sentence(token_ref.sid)
-        for chunk in sent.chunks:
-            if chunk.tokens:
-                if chunk.tokens[0].tid <= token_ref.tid and token_ref.tid <= chunk.tokens[-1].tid:
-                    return make_reference(chunk)
+        chunk = sent.chunk_from_tid(token_ref.tid)
+        if chunk is not None and chunk.tokens[0].tid <= token_ref.tid:
+            return make_reference(chunk)
         return None
     def refer_sentence(self, sid):
-        try:
-            sentence = next(filter(lambda x: x.sid == sid, self.sentences))
-        except StopIteration:
-            return None
-        return sentence
+        """文IDから文を取得する(文IDの索引を使う)
+        """
+        return self.sentences.find(sid)
+    def get_offset_index(self):
+        """文字位置の索引(OffsetIndex)を取得する(文のリストが変更されていなければ前回作ったものを返す)
+        単語の表層や文の中の単語・文節のリストの書き換えは検知しないので、その場合はinvalidate_index()を呼ぶこと
+        """
+        index = self.sentences.offset_index
+        if index is None:
+            index = self.sentences.offset_index = OffsetIndex(self.sentences)
+        return index
+    def invalidate_index(self):
+        """文IDと文字位置の索引を破棄する
+        文のリスト自体の変更は自動で検知するが、文の中の単語や文節、文IDを書き換えた場合はこれを呼ぶこと
+        (文IDを書き換えた後に呼ばないと、新しい文IDでrefer_sentenceしても見つからない)
+        """
+        self.sentences.invalidate()
     def refer_chunk(self, sid, cid):
         """文節番号から文節インスタンスへの参照を取得
         """
@@ -177,6 +293,13 @@ class Sentence:
         self.sid = 0
         self.name = ''
         self.__in_q__ = 0       # クラスでもっているが生成時の一時的にしか使わない値なので注意
+        self.tid_to_cid = None  # 単語ID→文節の位置の配列(index_chunksで作成する)
+        self._chunk_index_key = None
+    def __setstate__(self, state):
+        """pickle用: 単語の文節への参照(Token.chunk)は直列化しないのでここで設定し直す
+        """
+        self.__dict__.update(state)
+        self.index_chunks()
     def __link_chunk__(self, cid, chunk):
         """文中の文節の追加が終わった時点でリンク先、逆リンク先を追加
         Args:
@@ -198,6 +321,7 @@ class Sentence:
             #self.__link_chunk__(cid, chunk)             # 係り受け元、係り受け先のオブジェクト参照を設定する NOTE:循環参照が起こる
             chunk.set_token_info()                      # お呼び出し(databaseモジュールでも呼び出されるので問題なし)
         self.add_first_mentioned()                      # first_mentionedの対か
+        self.index_chunks()                             # 単語→文節の索引
     def add_first_mentioned(self):
         """first_mentionedの追加
         """
@@ -229,14 +353,39 @@ class Sentence:
         for chunk in self.chunks:
             chunk.print_surfaces()
         print('')
-    def chunk_from_token(self, token):
-        """参照環境
+    def index_chunks(self):
+        """単語ID→文節の位置の配列(tid_to_cid)を作り、文節に含まれる単語に文節への参照(Token.chunk)を設定する
+        tid_to_cid[tid]は末尾の単語の単語IDがtid以上になる最初の文節の位置
         """
-        for chunk in self.chunks:
+        table = array('i')
+        for position, chunk in enumerate(self.chunks):
             if chunk.tokens:
-                if token.tid <= chunk.tokens[-1].tid:
-                    return chunk
-        return None
+                last_tid = chunk.tokens[-1].tid
+                while len(table) <= last_tid:
+                    table.append(position)
+                for token in chunk.tokens:
+                    token.chunk = chunk
+        self.tid_to_cid = table
+        self._chunk_index_key = (len(self.chunks), len(self.tokens))
+    def chunk_from_tid(self, tid):
+        """末尾の単語の単語IDがtid以上になる最初の文節を取得する(なければNone)
+        文節や単語の数が変わっていれば索引を作り直す(文節の中身を書き換えた場合はindex_chunksを呼ぶこと)
+        """
+        if self._chunk_index_key != (len(self.chunks), len(self.tokens)):
+            self.index_chunks()
+        table = self.tid_to_cid
+        if not table or tid >= len(table):
+            return None
+        chunk = self.chunks[table[max(tid, 0)]]
+        if not (chunk.tokens and tid <= chunk.tokens[-1].tid):
+            # 索引を作った後に文節が書き換えられている
+            self.index_chunks()
+            return self.chunk_from_tid(tid)
+        return chunk
+    def chunk_from_token(self, token):
+        """単語を含む文節を取得する(単語が文節に含まれない場合はその後ろの最初の文節)
+        """
+        return self.chunk_from_tid(token.tid)
     def reverse_link(self, chunk):
         """逆参照を取得するジェネレータ
         """
@@ -345,6 +494,14 @@ class _ReverseLinkElem:
     def append(self, link):
         self.links.append(weakref.ref(link))
 
+    def __getstate__(self):
+        """pickle用: weakrefは直列化できないので通常の参照のリストに置き換える
+        """
+        return {'links': list(self)}
+
+    def __setstate__(self, state):
+        self.links = [weakref.ref(link) for link in state['links']]
+
     def index(self, link, start=None, stop=None):
         if start is not None:
             if stop is not None:
@@ -362,6 +519,111 @@ class _ReverseLinkElem:
         raise ValueError("{} is not in list".format(link))
 
 
+class _LazyReverseLinkElem(_ReverseLinkElem):
+    """CompactChunkの空の係り元文節リスト
+    要素が追加された時点で持ち主のスロットに自身を設定する(それまでは参照されるたびに生成される一時オブジェクト)
+    """
+    def __init__(self, owner, slot):
+        self.links = ()
+        self.owner, self.slot = owner, slot
+
+    def __install__(self):
+        if self.owner is not None:
+            self.links = []
+            setattr(self.owner, self.slot, self)
+            self.owner = None
+
+    def __setitem__(self, i, link):
+        self.__install__()
+        _ReverseLinkElem.__setitem__(self, i, link)
+
+    def append(self, link):
+        self.__install__()
+        _ReverseLinkElem.append(self, link)
+
+    def __reduce__(self):
+        return (_ReverseLinkElem, (), {'links': list(self)})
+
+class _LazyList(list):
+    """Compact系クラスの空のリスト属性の代わりに返すリスト
+    要素が追加された時点で持ち主のスロットに自身を設定する(それまでは参照されるたびに生成される一時オブジェクト)
+    """
+    __slots__ = ('owner', 'slot')
+    def __init__(self, owner, slot):
+        list.__init__(self)
+        self.owner, self.slot = owner, slot
+
+    def __install__(self):
+        if self.owner is not None:
+            setattr(self.owner, self.slot, self)
+            self.owner = None
+
+    def append(self, value):
+        self.__install__()
+        list.append(self, value)
+
+    def extend(self, values):
+        self.__install__()
+        list.extend(self, values)
+
+    def insert(self, i, value):
+        self.__install__()
+        list.insert(self, i, value)
+
+    def __setitem__(self, i, value):
+        self.__install__()
+        list.__setitem__(self, i, value)
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+class _LazyDict(dict):
+    """Compact系クラスの空の辞書属性の代わりに返す辞書
+    要素が追加された時点で持ち主のスロットに自身を設定する(それまでは参照されるたびに生成される一時オブジェクト)
+    """
+    __slots__ = ('owner', 'slot')
+    def __init__(self, owner, slot):
+        dict.__init__(self)
+        self.owner, self.slot = owner, slot
+
+    def __install__(self):
+        if self.owner is not None:
+            setattr(self.owner, self.slot, self)
+            self.owner = None
+
+    def __setitem__(self, key, value):
+        self.__install__()
+        dict.__setitem__(self, key, value)
+
+    def setdefault(self, key, default=None):
+        self.__install__()
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        self.__install__()
+        dict.update(self, *args, **kwargs)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+def _lazy_container(slot, factory):
+    """スロットがNoneの間はfactory(self, slot)で生成した空のコンテナを返すプロパティ
+    """
+    def getter(self):
+        value = getattr(self, slot)
+        return factory(self, slot) if value is None else value
+    def setter(self, value):
+        setattr(self, slot, value)
+    return property(getter, setter)
+
 class Chunk:
     """文節チャンクのクラス
     MEMBER:
@@ -408,6 +670,17 @@ class Chunk:
 
     link = property(_get_link, _set_link)
 
+    def __getstate__(self):
+        """pickle用: weakrefで保持している係り先を通常の参照に置き換える
+        """
+        state = self.__dict__.copy()
+        state['_link'] = self.link
+        return state
+    def __setstate__(self, state):
+        link = state.pop('_link')
+        self.__dict__.update(state)
+        self.link = link
+
     def set_token_info(self):
         """追加された形態素の一覧から格などの属性を設定する
         """
@@ -474,6 +747,7 @@ class Chunk:
         """単語を追加する
         """
         self.tokens.append(token)
+        token.chunk = self
         self.token_num += 1
         self.on_add_token(token)
     def is_conj(self):
@@ -580,6 +854,26 @@ class Token:
         self.is_content = False
         self.coreference_link = {}
         self.pas_type = None
+        self._chunk = None
+
+    # 単語を含む文節への参照(Sentence.index_chunks, Chunk.add_tokenで設定される) 循環参照を避けるためweakrefで保持する
+    def _get_chunk(self):
+        return self._chunk() if self._chunk is not None else None
+    def _set_chunk(self, chunk):
+        self._chunk = weakref.ref(chunk) if chunk is not None else None
+
+    chunk = property(_get_chunk, _set_chunk)
+
+    def __getstate__(self):
+        """pickle用: 文節への参照は含めない(Sentenceの復元時にindex_chunksで設定し直す)
+        """
+        state = self.__dict__.copy()
+        state.pop('_chunk', None)
+        return state
+    def __setstate__(self, state):
+        state.pop('_chunk', None)
+        self.__dict__.update(state)
+        self._chunk = None
     def print_members(self):
         """オブジェクトのメンバ変数を標準出力に表示
         """
@@ -608,6 +902,128 @@ class Token:
     def __repr__(self):
         return "<{}: {}({}, {})>".format("Token", self.surface, self.sid, self.tid)
 
+class CompactSentence(Sentence):
+    """__slots__で属性を保持するSentence(大規模コーパス用)
+    既定の属性以外(pt_annotatedなど)は必要になった時点で生成される__dict__に保持される
+    """
+    __slots__ = ('chunk_positions', 'chunks', 'tokens', 'sid', 'name', '__in_q__', 'tid_to_cid', '_chunk_index_key')
+
+    def __getstate__(self):
+        slots = {name: getattr(self, name) for name in CompactSentence.__slots__}
+        return (getattr(self, '__dict__', None) or None, slots)
+    def __setstate__(self, state):
+        extra, slots = state
+        for name, value in slots.items():
+            setattr(self, name, value)
+        if extra:
+            self.__dict__.update(extra)
+        self.index_chunks()
+
+class CompactChunk(Chunk):
+    """__slots__で属性を保持するChunk(大規模コーパス用)
+    coreference_link, tags, reverse_link_ids, reverse_linksは要素が追加されるまで生成しない
+    既定の属性以外は必要になった時点で生成される__dict__に保持される
+    """
+    __slots__ = (
+        'sid', 'cid', 'tokens', 'func_position', 'head_position', 'token_num', 'link_id', '_link',
+        '_reverse_links', 'first_mentioned', 'chain_num', 'in_q', 'begin_paren', 'end_paren', 'emphasis',
+        '_coreference_link', '_tags', '_reverse_link_ids', 'case', 'particle', 'chunk_type'
+    )
+    reverse_links = _lazy_container('_reverse_links', _LazyReverseLinkElem)
+    coreference_link = _lazy_container('_coreference_link', _LazyDict)
+    tags = _lazy_container('_tags', _LazyList)
+    reverse_link_ids = _lazy_container('_reverse_link_ids', _LazyList)
+
+    def __init__(self):
+        self.sid = 0
+        self.cid = 0
+        self.tokens = []
+        (self.func_position, self.head_position, self.token_num) = (0, 0, 0)
+        self.link_id = -1
+        self._link = None
+        self._reverse_links = None
+        self.first_mentioned = False
+        self.chain_num = 0
+        (self.in_q, self.begin_paren, self.end_paren, self.emphasis) = (0, False, False, False)
+        self._coreference_link = None
+        self._tags = None
+        self._reverse_link_ids = None
+        self.case = ''
+        self.particle = None
+        self.chunk_type = ''
+
+    def __getstate__(self):
+        slots = {name: getattr(self, name) for name in CompactChunk.__slots__}
+        slots['_link'] = self.link
+        return (getattr(self, '__dict__', None) or None, slots)
+    def __setstate__(self, state):
+        extra, slots = state
+        link = slots.pop('_link')
+        for name, value in slots.items():
+            setattr(self, name, value)
+        if extra:
+            self.__dict__.update(extra)
+        self.link = link
+
+class CompactToken(Token):
+    """__slots__で属性を保持するToken(大規模コーパス用)
+    other_features, coreference_linkは要素が追加されるまで生成しない
+    既定の属性以外(predicate_term, semroles, coreferenceなど)は必要になった時点で生成される__dict__に保持される
+    """
+    __slots__ = (
+        'tid', 'sid', 'surface', 'read', 'basic_surface', 'part', 'part_id', 'attr1', 'attr2',
+        'is_indep', 'sahen', 'normalnoun', 'adjectivenoun', 'pos', 'named_entity', 'named_entity_part',
+        'conj_type', 'conj_form', '_other_features', 'is_content', '_coreference_link', 'pas_type', '_chunk'
+    )
+    other_features = _lazy_container('_other_features', _LazyList)
+    coreference_link = _lazy_container('_coreference_link', _LazyDict)
+
+    def __init__(self):
+        self.tid = 0
+        self.sid = 0
+        self.surface = ''
+        self.read = ''
+        self.basic_surface = ''
+        self.part = ''
+        self.part_id = 0
+        self.attr1 = ''
+        self.attr2 = ''
+        self.is_indep = False
+        self.sahen = False
+        self.normalnoun = False
+        self.adjectivenoun = False
+        self.pos = ''
+        self.named_entity = ''
+        self.named_entity_part = ''
+        self.conj_type = ''
+        self.conj_form = ''
+        self._other_features = None
+        self.is_content = False
+        self._coreference_link = None
+        self.pas_type = None
+        self._chunk = None
+
+    def __getstate__(self):
+        slots = {name: getattr(self, name) for name in CompactToken.__slots__ if name != '_chunk'}
+        return (getattr(self, '__dict__', None) or None, slots)
+    def __setstate__(self, state):
+        extra, slots = state
+        slots.pop('_chunk', None)
+        for name, value in slots.items():
+            setattr(self, name, value)
+        if extra:
+            self.__dict__.update(extra)
+        self._chunk = None
+
+def element_classes(compact=False):
+    """ローダーが生成する(Sentence, Chunk, Token)のクラスを取得する
+    Args:
+        compact (bool): Trueの場合は__slots__を使うCompact系のクラスを返す
+    """
+    if compact:
+        return CompactSentence, CompactChunk, CompactToken
+    return Sentence, Chunk, Token
+
 def get_verbchunk_verb(chunk: Chunk):
     """フレームとのマッチング用に統一された動詞の表現を取得する
     辞書としてはIPA, UNIDICを想定
@@ -698,186 +1114,236 @@ def get_verbchunk_verb(chunk: Chunk):
     
     return ""
 
+class _AlignedOffsets:
+    """ReferenceConverter用: 文書の文・文節・単語の長さ(count_funcで数える)の累積和
+    MEMBERS:
+        * sentences - 文のリスト
+        * sentence_offsets - i番目の文の始点(文数+1の長さ)
+        * sentence_positions - 文ID→文のリスト上の位置(同じ文IDがある場合は先頭)
+        * chunk_offsets, token_offsets - 文ごとの、文の始点から見たi番目の文節、単語の始点(要素数+1の長さ)
+        * chunk_positions, token_positions - 文ごとの文節ID、単語ID→文中の位置
+    """
+    def __init__(self, document, count_func=None):
+        length = (lambda elem: elem.get_length()) if count_func is None else count_func
+        self.sentences = list(document.sentences)
+        self.sentence_offsets = [0]
+        self.sentence_positions = dict()
+        self.chunk_offsets, self.chunk_positions = [], []
+        self.token_offsets, self.token_positions = [], []
+        for i, sent in enumerate(self.sentences):
+            self.sentence_positions.setdefault(sent.sid, i)
+            self.sentence_offsets.append(self.sentence_offsets[-1] + length(sent))
+            for elements, id_name, offset_list, position_list in (
+                    (sent.chunks, 'cid', self.chunk_offsets, self.chunk_positions),
+                    (sent.tokens, 'tid', self.token_offsets, self.token_positions)
+                ):
+                offsets, positions = [0], dict()
+                for j, elem in enumerate(elements):
+                    positions.setdefault(getattr(elem, id_name), j)
+                    offsets.append(offsets[-1] + length(elem))
+                offset_list.append(offsets)
+                position_list.append(positions)
+
+    def count_in_sentence(self, sent_pos, elem_id, offset_list, position_list, tail=False):
+        """文の始点から要素の始点(tailの場合は終点)までの長さ(要素がなければ文中のすべての要素の長さ)
+        """
+        offsets = offset_list[sent_pos]
+        elem_pos = position_list[sent_pos].get(elem_id)
+        if elem_pos is None:
+            return offsets[-1]
+        return offsets[elem_pos + 1] if tail else offsets[elem_pos]
+
+    def count(self, sid, elem_id, offset_list, position_list, tail=False):
+        """文書の始点から要素の始点(tailの場合は終点)までの長さ(文がなければ文書の長さ)
+        """
+        sent_pos = self.sentence_positions.get(sid)
+        if sent_pos is None:
+            return self.sentence_offsets[-1]
+        return self.sentence_offsets[sent_pos] + self.count_in_sentence(sent_pos, elem_id, offset_list, position_list, tail)
+
+    @staticmethod
+    def find_in(offsets, count, tail=False):
+        """終点がcountを超える(tailの場合はcount以上になる)最初の要素の位置(なければ要素数)
+        """
+        if tail:
+            return bisect_left(offsets, count, 1) - 1
+        return bisect_right(offsets, count, 1) - 1
+
+    def find(self, count, elements_name, offset_list, id_name, tail=False):
+        """文書の始点から長さcountの位置にある(文ID, 要素のID)
+        文の終点がcountを超える最初の文の中から要素を探す(要素がなければ要素のIDは-1、文がなければ(-1, -1))
+        """
+        sent_pos = _AlignedOffsets.find_in(self.sentence_offsets, count)
+        if sent_pos >= len(self.sentences):
+            return -1, -1
+        sent = self.sentences[sent_pos]
+        elements = getattr(sent, elements_name)
+        elem_pos = _AlignedOffsets.find_in(offset_list[sent_pos], count - self.sentence_offsets[sent_pos], tail)
+        return sent.sid, (getattr(elements[elem_pos], id_name) if elem_pos < len(elements) else -1)
+
 class ReferenceConverter:
     """トークン、チャンクの参照をなるべく文字単位で正確に変換するためのクラス
+    両方の文書の文・文節・単語の長さの累積和を最初の変換時に一度だけ計算し、変換は二分探索で行う
+    累積和は文書の文のリスト(SentenceList.aligned_offsets)に保持するので、文のリストを変更・差し替えた場合や
+    count_funcを変更した場合は計算し直す(単語や文節をその場で書き換えた場合はDocument.invalidate_index()を呼ぶこと)
+    MEMBERS:
+        * count_func - 文・文節・単語の長さを数える関数(Noneの場合はget_length())
+        * no_sid_convert - Trueの場合は文IDを変換せずに同じ文IDの文の中で変換する
     """
     def __init__(self, dest_doc, src_doc, count_func=None):
         self.dest_doc = dest_doc
         self.src_doc = src_doc
         self.count_func = count_func
         self.no_sid_convert = False
-    def __convert_cid_only__(self, cid, dest_sent, src_sent):
-        count = 0
-        for chunk in src_sent.chunks:
-            if chunk.cid == cid:
-                break
-            count += chunk.get_length() if self.count_func is None else self.count_func(chunk)
-        dest_cid = -1
-        dest_count = 0
-        for chunk in dest_sent.chunks:
-            if dest_count >= count:
-                dest_cid = chunk.cid
-                break
-            dest_count += chunk.get_length() if self.count_func is None else self.count_func(chunk)
-        return dest_cid
-    def __convert_tid_only__(self, tid, dest_sent, src_sent, conv_type):
-        count = 0
-        for token in src_sent.tokens:
-            if token.tid == tid:
-                #print('□', token.surface)
-                if conv_type == 'tail':
-                    count += token.get_length() if self.count_func is None else self.count_func(token)
-                break
-            count += token.get_length() if self.count_func is None else self.count_func(token)
-            #print(token.surface, '({0})'.format(count))
-        dest_tid = -1
-        dest_count = 0
-        for token in dest_sent.tokens:
-            length = token.get_length() if self.count_func is None else self.count_func(token)
-            if (dest_count + length > count and conv_type == 'head') or (dest_count + length >= count and conv_type == 'tail'):               
-                #print('■', token.surface)
-                dest_tid = token.tid
-                break
-            dest_count += length
-            #print(token.surface, '({0} > {1})'.format(count, dest_count))
-        return dest_tid
-
+    def __offsets__(self, document):
+        sentences = document.sentences
+        cached = sentences.aligned_offsets
+        if cached is None or cached[0] is not self.count_func:
+            cached = sentences.aligned_offsets = (self.count_func, _AlignedOffsets(document, self.count_func))
+        return cached[1]
+    def __convert_cid_only__(self, cid, dest_sid, src_sid):
+        src, dest = self.__offsets__(self.src_doc), self.__offsets__(self.dest_doc)
+        src_pos, dest_pos = src.sentence_positions.get(src_sid), dest.sentence_positions.get(dest_sid)
+        if src_pos is None or dest_pos is None:
+            return -1
+        count = src.count_in_sentence(src_pos, cid, src.chunk_offsets, src.chunk_positions)
+        # 始点がcount以上になる最初の文節
+        chunks = dest.sentences[dest_pos].chunks
+        chunk_pos = bisect_left(dest.chunk_offsets[dest_pos], count)
+        return chunks[chunk_pos].cid if chunk_pos < len(chunks) else -1
+    def __convert_tid_only__(self, tid, dest_sid, src_sid, conv_type):
+        src, dest = self.__offsets__(self.src_doc), self.__offsets__(self.dest_doc)
+        src_pos, dest_pos = src.sentence_positions.get(src_sid), dest.sentence_positions.get(dest_sid)
+        if src_pos is None or dest_pos is None:
+            return -1
+        tail = conv_type == 'tail'
+        count = src.count_in_sentence(src_pos, tid, src.token_offsets, src.token_positions, tail)
+        tokens = dest.sentences[dest_pos].tokens
+        token_pos = _AlignedOffsets.find_in(dest.token_offsets[dest_pos], count, tail)
+        return tokens[token_pos].tid if token_pos < len(tokens) else -1
     def __convert_cid__(self, sid, cid):
-        count = 0
-        for sent in self.src_doc.sentences:
-            if sent.sid == sid:
-                for chunk in sent.chunks:
-                    if chunk.cid == cid:
-                        break
-                    count += chunk.get_length() if self.count_func is None else self.count_func(chunk)
-                break
-            count += sent.get_length() if self.count_func is None else self.count_func(sent)
-        dest_sid = -1
-        dest_cid = -1
-        dest_count = 0
-        for sent in self.dest_doc.sentences:
-            length = sent.get_length() if self.count_func is None else self.count_func(sent)
-            if dest_count + length > count:
-                for chunk in sent.chunks:
-                    length = chunk.get_length() if self.count_func is None else self.count_func(chunk)
-                    if dest_count + length > count:
-                        dest_cid = chunk.cid
-                        break
-                    dest_count += length
-                dest_sid = sent.sid
-                break
-            dest_count += length
-        return dest_sid, dest_cid
+        src, dest = self.__offsets__(self.src_doc), self.__offsets__(self.dest_doc)
+        count = src.count(sid, cid, src.chunk_offsets, src.chunk_positions)
+        return dest.find(count, 'chunks', dest.chunk_offsets, 'cid')
     def __convert_tid__(self, sid, tid, conv_type):
-        count = 0
-        for sent in self.src_doc.sentences:
-            if sent.sid == sid:
-                for token in sent.tokens:
-                    if token.tid == tid:
-                        if conv_type == 'tail':
-                            count += token.get_length() if self.count_func is None else self.count_func(token)                    
-                        break
-                    count += token.get_length() if self.count_func is None else self.count_func(token)
-                    #print(token.surface, '({0})'.format(count))
-                break
-            count += sent.get_length() if self.count_func is None else self.count_func(sent)
-            #print(sent.get_surface(), '({0})'.format(count))
-        dest_sid = -1
-        dest_tid = -1
-        dest_count = 0
-        for sent in self.dest_doc.sentences:
-            length = sent.get_length() if self.count_func is None else self.count_func(sent)
-            if dest_count + length > count:
-                for token in sent.tokens:
-                    length = token.get_length() if self.count_func is None else self.count_func(token)
-                    if (dest_count + length > count and conv_type == 'head') or (dest_count + length >= count and conv_type == 'tail'):
-                        dest_tid = token.tid
-                        break
-                    #print('@', token.surface, '({0},{1})'.format(dest_count+length, count))
-                    dest_count += length
-                dest_sid = sent.sid
-                break
-            #print('@', sent.get_surface(), '({0},{1})'.format(dest_count+length, count))
-            dest_count += length
-        return dest_sid, dest_tid
+        src, dest = self.__offsets__(self.src_doc), self.__offsets__(self.dest_doc)
+        tail = conv_type == 'tail'
+        count = src.count(sid, tid, src.token_offsets, src.token_positions, tail)
+        return dest.find(count, 'tokens', dest.token_offsets, 'tid', tail)
     def convert(self, ref, conv_type='head'):
+        """src_docの参照refをdest_docの参照に変換する
+        Args:
+            ref (TokenReference|ChunkReference): 変換元の参照
+            conv_type (str): 'head'の場合は単語の始点、'tail'の場合は単語の終点を含む単語に変換する
+        """
         if isinstance(ref, ChunkReference):
             if self.no_sid_convert:
-                dest_sid  = ref.sid
-                src_sent = self.src_doc.refer_sentence(ref.sid)
-                dest_sent = self.dest_doc.refer_sentence(dest_sid)
-                dest_cid = self.__convert_cid_only__(ref.cid, dest_sent, src_sent)
-                return ChunkReference(dest_sid, dest_cid)
+                dest_cid = self.__convert_cid_only__(ref.cid, ref.sid, ref.sid)
+                return ChunkReference(ref.sid, dest_cid)
             else:
                 dest_sid, dest_cid = self.__convert_cid__(ref.sid, ref.cid)
                 return ChunkReference(dest_sid, dest_cid)
         elif isinstance(ref, TokenReference):
             if self.no_sid_convert:
-                dest_sid = ref.sid
-                src_sent = self.src_doc.refer_sentence(ref.sid)
-                dest_sent = self.dest_doc.refer_sentence(dest_sid)
-                dest_tid = self.__convert_tid_only__(ref.tid, dest_sent, src_sent, conv_type)
-                return TokenReference(dest_sid, dest_tid)
+                dest_tid = self.__convert_tid_only__(ref.tid, ref.sid, ref.sid, conv_type)
+                return TokenReference(ref.sid, dest_tid)
             else:
                 dest_sid, dest_tid = self.__convert_tid__(ref.sid, ref.tid, conv_type)
                 return TokenReference(dest_sid, dest_tid)
         return None
+    def convert_many(self, refs, conv_type='head'):
+        """複数の参照をまとめて変換する(convertの結果をrefsと同じ順番で並べたリストを返す)
+        """
+        return [self.convert(ref, conv_type) for ref in refs]
+
+class OffsetIndex:
+    """文書中の文・文節・単語の始点の文字位置(表層表現の長さの累積和)の索引
+    文IDは文のリスト上の位置、文節ID、単語IDは文の中での位置と一致していることを前提とする
+    MEMBERS:
+        * sentences, chunks, tokens - 文書中の文・文節・単語を先頭から並べたリスト
+        * sentence_offsets, chunk_offsets, token_offsets - i番目の要素の始点の文字位置(要素数+1の長さで、末尾は文書の文字数)
+        * chunk_bases, token_bases - 文ごとの最初の文節・単語のchunks, tokens上の位置
+    """
+    def __init__(self, sentences):
+        self.sentences = list(sentences)
+        self.sentence_offsets = [0]
+        self.chunks, self.chunk_bases, self.chunk_offsets = [], [], [0]
+        self.tokens, self.token_bases, self.token_offsets = [], [], [0]
+        for sentence in self.sentences:
+            self.sentence_offsets.append(self.sentence_offsets[-1] + len(sentence.get_surface()))
+            self.chunk_bases.append(len(self.chunks))
+            for chunk in sentence.chunks:
+                self.chunks.append(chunk)
+                self.chunk_offsets.append(self.chunk_offsets[-1] + len(chunk.get_surface()))
+            self.token_bases.append(len(self.tokens))
+            for token in sentence.tokens:
+                self.tokens.append(token)
+                self.token_offsets.append(self.token_offsets[-1] + len(token.surface))
+
+    def sentence_offset(self, sid):
+        return self.sentence_offsets[sid]
+
+    def chunk_offset(self, sid, cid):
+        return self.chunk_offsets[self.chunk_bases[sid] + cid]
+
+    def token_offset(self, sid, tid):
+        return self.token_offsets[self.token_bases[sid] + tid]
+
+    @staticmethod
+    def __find__(elements, offsets, position):
+        """文字位置positionを含む(始点 <= position < 終点となる)最初の要素を二分探索で取得
+        """
+        if position < 0:
+            return None
+        i = bisect_right(offsets, position) - 1
+        return elements[i] if i < len(elements) else None
+
+    def sentence_at(self, position):
+        return OffsetIndex.__find__(self.sentences, self.sentence_offsets, position)
+
+    def chunk_at(self, position):
+        return OffsetIndex.__find__(self.chunks, self.chunk_offsets, position)
+
+    def token_at(self, position):
+        return OffsetIndex.__find__(self.tokens, self.token_offsets, position)
 
 def get_position(doc, obj):
     """docに所属する指定したオブジェクト(Token, Chunk, Sentence)あるいはオブジェクト参照(TokenReference, ChunkReference)
     の始点position(文字位置)を取得
+    NOTE: 文字位置はDocument.get_offset_index()の索引から求める。文のリストの変更は自動で反映されるが、
+    単語の表層や文の中の単語・文節のリストをその場で書き換えた場合はdoc.invalidate_index()を呼ぶまで古い位置を返す
     """
     if isinstance(obj, (Token, TokenReference)):
         if obj.sid < 0 or obj.tid < 0 or obj.sid >= len(doc.sentences) or obj.tid >= len(doc.sentences[obj.sid].tokens):
             return -1
-        return sum(map(lambda t: len(t.surface),filter(lambda t:t.sid < obj.sid or t.sid == obj.sid and t.tid < obj.tid, tokens(doc))))
+        return doc.get_offset_index().token_offset(obj.sid, obj.tid)
     elif isinstance(obj, (Chunk, ChunkReference)):
         if obj.sid < 0 or obj.cid < 0 or obj.sid >= len(doc.sentences)  or obj.cid >= len(doc.sentences[obj.sid].chunks):
             return -1
-        return sum(map(lambda c: len(c.get_surface()), filter(lambda c:c.sid < obj.sid or c.sid == obj.sid and c.cid < obj.cid, chunks(doc))))
+        return doc.get_offset_index().chunk_offset(obj.sid, obj.cid)
     elif isinstance(obj, Sentence):
         if obj.sid < 0 or obj.sid >= len(doc.sentences):
             return -1
-        return sum(map(lambda s: len(s.get_surface()), filter(lambda s:s.sid < obj.sid, doc.sentences)))
+        return doc.get_offset_index().sentence_offset(obj.sid)
     raise TypeError("cannot convert from {} object/reference".format(type(obj)))
 
 def position_to_sentence(doc, position):
     """文字位置から対応する文を取得
+    NOTE: 単語や文節をその場で書き換えた後はdoc.invalidate_index()を呼ぶこと(get_positionを参照)
     """
-    lensum = 0
-    if position < 0:
-        return None
-    for sent in doc.sentences:
-        length = len(sent.get_surface())
-        if lensum + length > position:
-            return sent
-        lensum += length
-    return None
+    return doc.get_offset_index().sentence_at(position)
 
 def position_to_chunk(doc, position):
     """文字位置から対応する文節を取得
+    NOTE: 単語や文節をその場で書き換えた後はdoc.invalidate_index()を呼ぶこと(get_positionを参照)
     """
-    lensum = 0
-    if position < 0:
-        return None
-    for chk in chunks(doc):
-        length = len(chk.get_surface())
-        if lensum + length > position:
-            return chk
-        lensum += length
-    return None
+    return doc.get_offset_index().chunk_at(position)
 
 def position_to_token(doc, position):
     """文字位置から対応する形態素を取得
+    NOTE: 単語や文節をその場で書き換えた後はdoc.invalidate_index()を呼ぶこと(get_positionを参照)
     """
-    if position < 0:
-        return None
-    lensum = 0
-    for tok in tokens(doc):
-        if lensum + len(tok.surface) > position:
-            return tok
-        lensum += len(tok.surface)
-    return None
+    return doc.get_offset_index().token_at(position)
 
 class FlatNLElementIterator:
     """文書データ上の文節や単語をすべて列挙するイテレータ
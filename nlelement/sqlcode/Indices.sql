@@ -1,13 +1,12 @@
-CREATE INDEX Sentence_Idx ON Sentences(DOCUMENT_ID);
-CREATE INDEX Chunk_Idx ON Chunks(SENTENCE_ID);
-CREATE INDEX Chunk_Doc_Idx ON Chunks(DOCUMENT_ID);
-CREATE INDEX Token_Idx ON Tokens(CHUNK_ID);
-CREATE INDEX Token_Sent_Idx ON Tokens(SENTENCE_ID);
-CREATE INDEX Token_Doc_Idx ON Tokens(SENTENCE_ID);
-CREATE INDEX Chunk_Tag_Idx ON Chunk_Tags(CHUNK);
-CREATE INDEX Token_Tag_Idx ON Token_Tags(TOKEN);
-CREATE INDEX Coreference_Idx ON Coreference(ANAPHORA);
-CREATE INDEX Predicate_Idx ON PredicateTerm(Predicate);
-CREATE INDEX Semrole_Idx ON Semanticrole(Predicate);
-CREATE INDEX Semantic_Idx ON VerbSemantic(Predicate);
-CREATE INDEX DOCNAME_IDX ON Documents(Name);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS Sentence_Doc_Sid_Idx ON Sentences(DOCUMENT_ID, SID);
+CREATE INDEX IF NOT EXISTS Chunk_Sent_Cid_Idx ON Chunks(SENTENCE_ID, CID);
+CREATE INDEX IF NOT EXISTS Chunk_Doc_Idx ON Chunks(DOCUMENT_ID);
+CREATE INDEX IF NOT EXISTS Token_Idx ON Tokens(CHUNK_ID);
+CREATE INDEX IF NOT EXISTS Token_Sent_Tid_Idx ON Tokens(SENTENCE_ID, TID);
+CREATE INDEX IF NOT EXISTS Token_Doc_Idx ON Tokens(DOCUMENT_ID);
+CREATE INDEX IF NOT EXISTS Chunk_Tag_Idx ON Chunk_Tags(CHUNK);
+CREATE INDEX IF NOT EXISTS Token_Tag_Cover_Idx ON Token_Tags(TOKEN, NAME, VALUE);
+CREATE INDEX IF NOT EXISTS Coreference_Idx ON Coreference(ANAPHORA);
+CREATE INDEX IF NOT EXISTS Predicate_Idx ON PredicateTerm(Predicate);
+CREATE INDEX IF NOT EXISTS Semrole_Idx ON Semanticrole(Predicate);
+CREATE INDEX IF NOT EXISTS Semantic_Idx ON VerbSemantic(Predicate);
@@ -0,0 +1,15 @@
+CREATE TABLE IF NOT EXISTS Sentence_Surface(ID INTEGER PRIMARY KEY, SURFACE TEXT);
+CREATE TABLE IF NOT EXISTS Chunk_Surface(ID INTEGER PRIMARY KEY, SURFACE TEXT);
+
+INSERT INTO Sentence_Surface(ID, SURFACE)
+    SELECT SENTENCE_ID, group_concat(SURFACE, '') FROM (
+        SELECT SENTENCE_ID, SURFACE FROM Tokens
+        WHERE SENTENCE_ID > (SELECT IFNULL(MAX(ID), 0) FROM Sentence_Surface)
+        ORDER BY SENTENCE_ID, TID
+    ) GROUP BY SENTENCE_ID;
+INSERT INTO Chunk_Surface(ID, SURFACE)
+    SELECT CHUNK_ID, group_concat(SURFACE, '') FROM (
+        SELECT CHUNK_ID, SURFACE FROM Tokens
+        WHERE CHUNK_ID > (SELECT IFNULL(MAX(ID), 0) FROM Chunk_Surface)
+        ORDER BY CHUNK_ID, SENTENCE_ID, TID
+    ) GROUP BY CHUNK_ID;
@@ -0,0 +1,21 @@
+DROP INDEX IF EXISTS Sentence_Idx;
+DROP INDEX IF EXISTS Chunk_Idx;
+DROP INDEX IF EXISTS Token_Sent_Idx;
+DROP INDEX IF EXISTS Token_Doc_Idx;
+DROP INDEX IF EXISTS Token_Tag_Idx;
+DROP INDEX IF EXISTS DOCNAME_IDX;
+
+CREATE TABLE Pas_Annotated_v2(ID INTEGER PRIMARY KEY, NAME TEXT UNIQUE);
+INSERT OR IGNORE INTO Pas_Annotated_v2 SELECT ID, NAME FROM Pas_Annotated;
+DROP TABLE Pas_Annotated;
+ALTER TABLE Pas_Annotated_v2 RENAME TO Pas_Annotated;
+CREATE TABLE Pth_Annotated_v2(ID INTEGER PRIMARY KEY, NAME TEXT UNIQUE);
+INSERT OR IGNORE INTO Pth_Annotated_v2 SELECT ID, NAME FROM Pth_Annotated;
+DROP TABLE Pth_Annotated;
+ALTER TABLE Pth_Annotated_v2 RENAME TO Pth_Annotated;
+CREATE TABLE Pth_Annotated_Sent_v2(ID INTEGER PRIMARY KEY);
+INSERT OR IGNORE INTO Pth_Annotated_Sent_v2 SELECT ID FROM Pth_Annotated_Sent;
+DROP TABLE Pth_Annotated_Sent;
+ALTER TABLE Pth_Annotated_Sent_v2 RENAME TO Pth_Annotated_Sent;
+
+CREATE TABLE IF NOT EXISTS Schema_Version(VERSION INTEGER NOT NULL);
@@ -12,12 +12,13 @@ CREATE TABLE Tokens(
     TID INTEGER, SURFACE TEXT, BASE TEXT, READ TEXT, PART TEXT, ATTR1 TEXT, ATTR2 TEXT,
     CONJ_TYPE TEXT, CONJ_FORM TEXT, NAMED_ENTITY TEXT, PAS_TYPE TEXT
 );
-CREATE TABLE Pas_Annotated(ID INTEGER PRIMARY_KEY, NAME TEXT UNIQUE);
-CREATE TABLE Pth_Annotated(ID INTEGER PRIMARY_KEY, NAME TEXT UNIQUE);
-CREATE TABLE Pth_Annotated_Sent(ID INTEGER PRIMARY_KEY);
+CREATE TABLE Pas_Annotated(ID INTEGER PRIMARY KEY, NAME TEXT UNIQUE);
+CREATE TABLE Pth_Annotated(ID INTEGER PRIMARY KEY, NAME TEXT UNIQUE);
+CREATE TABLE Pth_Annotated_Sent(ID INTEGER PRIMARY KEY);
 
 CREATE TABLE Token_Tags(Token INTEGER, NAME TEXT, VALUE TEXT);
 CREATE TABLE Coreference(ANAPHORA INTEGER UNIQUE, LINKTYPE TEXT, ANTECEDENT INTEGER);
 CREATE TABLE PredicateTerm(PREDICATE INTEGER, CASEPT TEXT, LINKTYPE TEXT, ANTECEDENT INTEGER);
 CREATE TABLE SemanticRole(PREDICATE INTEGER, SEMROLE TEXT, ANTECEDENT INTEGER);
 CREATE TABLE VerbSemantic(PREDICATE INTEGER, SEMANTIC TEXT);
+CREATE TABLE Schema_Version(VERSION INTEGER NOT NULL);
@@ -1,5 +1,6 @@
 """nlelementを使ったテスト用サンプルを作るための場所
 """
+import random
 from nlelement import nlelement
 
 class NlElementMaker:
@@ -439,4 +440,71 @@ class NlElementSampleMaker:
         # length:=13
 
         self.maker.set_id_to_sentences(doc)
-        return doc
\ No newline at end of file
+        return doc
+
+    synthetic_vocabulary = {
+        'noun': [('太郎', '名詞-固有名詞'), ('花子', '名詞-固有名詞'), ('本', '名詞-一般'), ('学校', '名詞-一般'),
+                 ('駅', '名詞-一般'), ('研究', '名詞-サ変'), ('それ', '名詞-代名詞'), ('今日', '名詞-副詞可能')],
+        'particle': [('は', '助詞-係助詞'), ('が', '助詞-格助詞'), ('を', '助詞-格助詞'),
+                     ('に', '助詞-格助詞'), ('で', '助詞-格助詞'), ('の', '助詞-連体化')],
+        'verb': [('読ん', '動詞-自立'), ('行っ', '動詞-自立'), ('見', '動詞-自立'), ('し', '動詞-自立')],
+        'aux': [('だ', '助動詞'), ('た', '助動詞'), ('ます', '助動詞')],
+    }
+
+    def synthetic_document(self, name, sent_num=10, chunk_num=5, rand=None):
+        """ベンチマーク用の合成文書を生成する
+        文節は名詞+助詞の形で作り、文末の文節だけ動詞+助動詞にして述語(pas_type='pred')にする
+        述語には文書内の先行する名詞への述語項(ga, o, ni)を、名詞には共参照(coref)をランダムに張る
+        Args:
+            name (str): 文書名
+            sent_num (int): 文の数
+            chunk_num (int): 1文あたりの文節の数(2以上)
+            rand (random.Random): 乱数生成器、省略時はnameから作る
+        """
+        rand = rand if rand is not None else random.Random(name)
+        vocab = NlElementSampleMaker.synthetic_vocabulary
+        doc = nlelement.Document()
+        doc.name = name
+        for _ in range(sent_num):
+            sentence = nlelement.Sentence()
+            for cid in range(chunk_num):
+                if cid < chunk_num - 1:
+                    head, func = rand.choice(vocab['noun']), rand.choice(vocab['particle'])
+                else:
+                    head, func = rand.choice(vocab['verb']), rand.choice(vocab['aux'])
+                chunk = self.maker.chunk(0, 1)
+                chunk.tokens.append(self.maker.token(*head))
+                chunk.tokens.append(self.maker.token(*func))
+                self.maker.append_chunk_to_sentence(sentence, chunk)
+            for cid in range(chunk_num - 1):
+                self.maker.set_link(sentence, cid, chunk_num - 1)
+            doc.sentences.append(sentence)
+        self.maker.set_id_to_sentences(doc)
+        nouns = []
+        for sent in doc.sentences:
+            for tok in sent.tokens:
+                tok.basic_surface = tok.surface
+                tok.read = tok.surface
+                tok.pos = '-'.join(filter(None, (tok.part, tok.attr1, tok.attr2)))
+                if tok.part == '名詞':
+                    tok.attr3 = '*'
+                    if nouns and rand.random() < 0.2:
+                        self.maker.add_coreference_link(doc, tok.sid, tok.tid, 'coref', *rand.choice(nouns))
+                    nouns.append((tok.sid, tok.tid))
+                elif tok.part == '動詞':
+                    tok.pas_type = 'pred'
+                    for case in ('ga', 'o', 'ni'):
+                        if rand.random() < 0.5:
+                            self.maker.add_coreference_link(doc, tok.sid, tok.tid, case, *rand.choice(nouns))
+                    if rand.random() < 0.3:
+                        self.maker.add_semantic_role(doc, tok.sid, tok.tid, '動作主', *rand.choice(nouns))
+        return doc
+
+    def synthetic_documents(self, doc_num, sent_num=10, chunk_num=5, seed=0):
+        """synthetic_documentで生成した文書をdoc_num個並べたリストを生成する
+        """
+        rand = random.Random(seed)
+        return [
+            self.synthetic_document('SYNTH_{:06d}'.format(i), sent_num=sent_num, chunk_num=chunk_num, rand=rand)
+            for i in range(doc_num)
+        ]
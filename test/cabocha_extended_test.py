@@ -1,6 +1,14 @@
+import gzip
+import io
+import lzma
+import os
+import pickle
 import sys
+import tempfile
 import unittest
-from nlelement import nlelement, cabocha_extended
+from nlelement import nlelement, cabocha_extended, database
+from nlelement.loaders import cabocha
+from nlelement.testutil import testsamplemaker
 
 class CabochaExtendeTest(unittest.TestCase):
     """cabocha_extendedの検証コード
@@ -26,3 +34,182 @@ EOS
 
         for i, sent in enumerate(doc.sentences):
             print(sent.get_surface)
+
+class CabochaAnnotationTest(unittest.TestCase):
+    """アノテーション列の解析の検証
+    """
+    def __parse__(self, columns, use_standard=False):
+        loader = cabocha_extended.CabochaLoader('', use_standard=use_standard)
+        token = nlelement.Token()
+        loader.__handle_annotation__(token, ['太郎', '名詞'] + columns)
+        return loader, token
+
+    def test_ntc_annotation(self):
+        loader, token = self.__parse__(['B-PERSON', 'id=3,type=pred,ga=1;0.9;0.1,o=exog,ni=2;1,eq=4;1.0;0.0\n'])
+        self.assertEqual(token.named_entity, 'B')
+        self.assertIs(loader.entity_ids[3], token)
+        self.assertEqual(token.pas_type, 'pred')
+        self.assertDictEqual(token.entity_links, {
+            'ga': [(1, 0.9, 0.1)], 'o': [('exog', 1.0, 0.0)], 'eq': [(4, 1.0, 0.0)]
+        })
+
+    def test_standard_annotation(self):
+        loader, token = self.__parse__(['O', 'id="3"', 'ga="exo1"'], use_standard=True)
+        self.assertIs(loader.entity_ids[3], token)
+        self.assertDictEqual(token.entity_links, {'ga': [('exo1', 1.0, 0.0)]})
+        _, token = self.__parse__(['type="pred" ga="1"'], use_standard=True)
+        self.assertFalse(hasattr(token, 'entity_links'))
+
+class CabochaDumpTest(unittest.TestCase):
+    """ストリームへの書き込みの検証
+    """
+    def setUp(self):
+        samples = testsamplemaker.NlElementSampleMaker()
+        self.documents = samples.synthetic_documents(3, sent_num=2, chunk_num=3) + [samples.sample_pas_annotation()]
+
+    def test_dump_to(self):
+        expected = ''.join(cabocha_extended.dump_doc(doc, from_label=True) for doc in self.documents)
+        text = io.StringIO()
+        cabocha_extended.dump_to(text, iter(self.documents), from_label=True)
+        self.assertEqual(text.getvalue(), expected)
+        binary = io.BytesIO()
+        cabocha_extended.dump_to(binary, iter(self.documents), from_label=True)
+        self.assertFalse(binary.closed)
+        self.assertEqual(binary.getvalue().decode('utf-8'), expected)
+
+    def test_cabocha_dump_to(self):
+        binary = io.BytesIO()
+        cabocha.CabochaDumper.dump_to(binary, self.documents, encoding='euc-jp')
+        self.assertEqual(
+            binary.getvalue().decode('euc-jp'),
+            ''.join(cabocha.CabochaDumper.doc_to_format(doc) for doc in self.documents)
+        )
+
+class CabochaExtendedStreamTest(unittest.TestCase):
+    """iter_loadによる逐次読み込みの検証
+    """
+    sample_doc = """* 0 1D 0/1 0.000000
+太郎\t名詞,固有名詞,人名,名,*,*,太郎,タロウ,タロー
+は\t助詞,係助詞,*,*,*,*,は,ハ,ワ
+* 1 -1D 0/0 0.000000
+走る\t動詞,自立,*,*,五段・ラ行,基本形,走る,ハシル,ハシル
+EOS
+"""
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = self.tmpdir.name
+        os.makedirs(os.path.join(root, 'sub'))
+        self.__write__(open, os.path.join(root, 'a_single.cab'), self.sample_doc)
+        self.__write__(gzip.open, os.path.join(root, 'sub', 'b_multi.cab.gz'), self.sample_doc+'EOT\n'+self.sample_doc)
+        self.__write__(lzma.open, os.path.join(root, 'sub', 'c_xz.cabocha.xz'), self.sample_doc)
+        self.__write__(open, os.path.join(root, 'sub', 'ignored.txt'), self.sample_doc)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def __write__(opener, filename, text):
+        with opener(filename, 'wt', encoding='utf-8') as file:
+            file.write(text)
+
+    def test_iter_load(self):
+        loader = cabocha_extended.CabochaLoader(self.tmpdir.name)
+        documents = loader.iter_load()
+        self.assertNotIsInstance(documents, list)
+        documents = list(documents)
+        self.assertEqual(
+            [doc.name for doc in documents], ['a_single', 'b_multi_0', 'b_multi_1', 'c_xz']
+        )
+        for doc in documents:
+            self.assertEqual(doc.sentences[0].get_surface(), '太郎は走る')
+
+    def test_iter_load_not_recursive(self):
+        loader = cabocha_extended.CabochaLoader(self.tmpdir.name)
+        self.assertEqual(
+            [doc.name for doc in loader.iter_load(recursive=False)],
+            [doc.name for doc in loader.load()]
+        )
+
+    def test_load_parallel(self):
+        loader = cabocha_extended.CabochaLoader(self.tmpdir.name)
+        documents = list(loader.iter_load())
+        parallel_documents = list(loader.iter_load_parallel(workers=2, shard_size=1))
+        self.assertEqual([doc.name for doc in parallel_documents], [doc.name for doc in documents])
+        for doc, parallel_doc in zip(documents, parallel_documents):
+            self.assertEqual(parallel_doc.get_surface(), doc.get_surface())
+        self.assertEqual(
+            [doc.name for doc in loader.load_parallel(workers=2)], [doc.name for doc in loader.load()]
+        )
+
+    def test_load_parallel_error(self):
+        filename = os.path.join(self.tmpdir.name, 'sub', 'd_broken.cab')
+        self.__write__(open, filename, self.sample_doc.replace('* 1 -1D', '* 1 XD'))
+        loader = cabocha_extended.CabochaLoader(self.tmpdir.name)
+        with self.assertRaises(cabocha_extended.LoadError) as context:
+            list(loader.iter_load_parallel(workers=2, shard_size=1))
+        self.assertEqual(context.exception.file_name, filename)
+        self.assertEqual(context.exception.line_num, 3)
+
+class ChunkMargerTest(unittest.TestCase):
+    """文書列の突き合わせによる文節情報のマージの検証
+    """
+    def setUp(self):
+        samples = testsamplemaker.NlElementSampleMaker()
+        self.annotations = samples.synthetic_documents(6, sent_num=3, chunk_num=3)
+
+    def __make_origs__(self):
+        """注釈の文書から文節を取り除いた原文
+        """
+        origs = []
+        for doc in self.annotations:
+            orig = pickle.loads(pickle.dumps(doc))
+            for sent in orig.sentences:
+                sent.chunks = []
+            origs.append(orig)
+        return origs
+
+    def assertMerged(self, doc, annotation):
+        self.assertEqual(doc.name, annotation.name)
+        self.assertListEqual(
+            [(chunk.get_surface(), chunk.link_id) for chunk in nlelement.chunks(doc)],
+            [(chunk.get_surface(), chunk.link_id) for chunk in nlelement.chunks(annotation)]
+        )
+
+    def test_merge_join(self):
+        origs = self.__make_origs__()
+        merger = cabocha_extended.ChunkMarger()
+        # 注釈が欠けている文書もそのまま返す
+        merged = list(merger.merge_join(iter(origs), iter(self.annotations[1:])))
+        self.assertListEqual([doc.name for doc in merged], [doc.name for doc in origs])
+        self.assertListEqual(list(nlelement.chunks(merged[0])), [])
+        for doc, annotation in zip(merged[1:], self.annotations[1:]):
+            self.assertMerged(doc, annotation)
+        self.assertEqual(merger.total_error, 0)
+        with self.assertRaises(ValueError):
+            list(merger.merge_join(reversed(self.__make_origs__()), self.annotations))
+
+    def test_merge_hash(self):
+        for max_in_memory in (1000, 2):
+            origs = self.__make_origs__()[::-1]
+            merger = cabocha_extended.ChunkMarger()
+            merged = merger.iter_merge(iter(origs), iter(self.annotations), max_in_memory=max_in_memory)
+            self.assertNotIsInstance(merged, list)
+            merged = list(merged)
+            self.assertListEqual([doc.name for doc in merged], [doc.name for doc in origs])
+            for doc, annotation in zip(merged, self.annotations[::-1]):
+                self.assertMerged(doc, annotation)
+
+    def test_merge_database(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filenames = [os.path.join(tmpdir, name) for name in ('orig.db', 'anno.db', 'out.db')]
+            with database.DatabaseWriter(filenames[0]) as writer:
+                writer.add_documents(self.__make_origs__()[::-1])
+            with database.DatabaseWriter(filenames[1]) as writer:
+                writer.add_documents(self.annotations)
+            merger = cabocha_extended.merge_database(*filenames, batch_size=2)
+            self.assertEqual(merger.total_error, 0)
+            with database.DatabaseLoader(filenames[2]) as loader:
+                merged = list(loader.load_as_iter(order_by='NAME'))
+            self.assertEqual(len(merged), len(self.annotations))
+            for doc, annotation in zip(merged, self.annotations):
+                self.assertMerged(doc, annotation)
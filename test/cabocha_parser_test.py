@@ -0,0 +1,83 @@
+import os
+import stat
+import sys
+import tempfile
+import threading
+import unittest
+from nlelement.loaders import cabocha
+
+# 1行を1文として、空白区切りの単語ごとに1文節の解析結果を返す偽のcabocha
+# 読みにはプロセスIDを入れる("CRASH"を受け取ると異常終了する)
+FAKE_CABOCHA = '''#!{executable}
+import os
+import sys
+for line in sys.stdin:
+    words = line.split()
+    if words == ['CRASH']:
+        sys.exit(1)
+    for i, word in enumerate(words):
+        link = i + 1 if i + 1 < len(words) else -1
+        sys.stdout.write('* {{}} {{}}D 0/0 0.000000\\n'.format(i, link))
+        sys.stdout.write('{{0}}\\t名詞,一般,*,*,*,*,{{0}},{{1}},{{1}}\\n'.format(word, os.getpid()))
+    sys.stdout.write('EOS\\n')
+    sys.stdout.flush()
+'''
+
+class CabochaParserTest(unittest.TestCase):
+    """常駐させたcabochaプロセスによる解析の検証(偽のcabochaを使う)
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cabocha_path = os.path.join(self.tmpdir.name, 'cabocha')
+        with open(self.cabocha_path, 'w', encoding='utf-8') as file:
+            file.write(FAKE_CABOCHA.format(executable=sys.executable))
+        os.chmod(self.cabocha_path, os.stat(self.cabocha_path).st_mode | stat.S_IEXEC)
+        self.parser = cabocha.CabochaParser(cabocha_path=self.cabocha_path, max_inflight=3)
+
+    def tearDown(self):
+        self.parser.close()
+        self.tmpdir.cleanup()
+
+    def test_parse(self):
+        sent = self.parser.parse('太郎 は 走る', sid=2)
+        self.assertEqual(sent.get_surface(), '太郎は走る')
+        self.assertEqual([chunk.link_id for chunk in sent.chunks], [1, 2, -1])
+        self.assertTrue(all(tok.sid == 2 for tok in sent.tokens))
+        # 2回目以降も同じプロセスで解析する
+        sent2 = self.parser.parse('花子 が 歩く')
+        self.assertEqual(sent2.get_surface(), '花子が歩く')
+        self.assertEqual(sent2.tokens[0].read, sent.tokens[0].read)
+
+    def test_parse_many(self):
+        texts = ['文{} の 単語'.format(i) for i in range(20)]
+        sentences = self.parser.parse_many(texts, workers=2)
+        self.assertEqual([sent.get_surface() for sent in sentences], [text.replace(' ', '') for text in texts])
+        self.assertEqual([sent.sid for sent in sentences], list(range(20)))
+        self.assertEqual(len(self.parser.processes), 2)
+        self.assertLessEqual(len({sent.tokens[0].read for sent in sentences}), 2)
+        doc = self.parser.parse_document('\n'.join(texts))
+        self.assertEqual([sent.get_surface() for sent in doc.sentences], [sent.get_surface() for sent in sentences])
+
+    def test_large_output(self):
+        """パイプのバッファより大きい入出力でも、書き込みと読み取りが待ち合わずに解析できることを確認する
+        """
+        texts = [' '.join('w{}'.format(i) + 'x' * 2000 for i in range(40)) for _ in range(6)]
+        result = []
+        worker = threading.Thread(target=lambda: result.extend(self.parser.parse_many(texts)), daemon=True)
+        worker.start()
+        worker.join(timeout=60)
+        if worker.is_alive():
+            for process in self.parser.processes:
+                process.process.kill()
+            self.fail('parse_many did not finish')
+        self.assertEqual([sent.get_surface() for sent in result], [text.replace(' ', '') for text in texts])
+
+    def test_process_exit(self):
+        with self.assertRaises(RuntimeError):
+            self.parser.parse_many(['太郎 は 走る', 'CRASH', '花子 が 歩く'])
+        self.assertListEqual(self.parser.processes, [])
+        self.assertEqual(self.parser.parse('太郎 は 走る').get_surface(), '太郎は走る')
+
+
+if __name__ == "__main__":
+    unittest.main()
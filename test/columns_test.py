@@ -0,0 +1,52 @@
+import unittest
+from nlelement import columns, database, nlelement
+from nlelement.testutil import testsamplemaker
+
+class ColumnsTest(unittest.TestCase):
+    def setUp(self):
+        self.samples = testsamplemaker.NlElementSampleMaker()
+        self.loader = database.DatabaseLoader(":memory:")
+        self.loader.create_tables()
+        self.loader.save(self.samples.synthetic_documents(4, sent_num=3, chunk_num=3), bulk=True)
+        self.documents = self.loader.load_documents()
+
+    def tearDown(self):
+        self.loader.__exit__(None, None, None)
+
+    def assertColumnsEqual(self, corpus, documents):
+        self.assertEqual(len(corpus), len(documents))
+        for doc_columns, doc in zip(corpus, documents):
+            self.assertEqual(doc_columns.name, doc.name)
+            tokens = list(nlelement.tokens(doc))
+            self.assertEqual(len(doc_columns), len(tokens))
+            for field in columns.TOKEN_STRING_FIELDS + ('sid', 'tid'):
+                self.assertListEqual(list(doc_columns.values(field)), [getattr(tok, field) for tok in tokens], field)
+            self.assertListEqual(
+                [(chunk.sid, chunk.cid, chunk.link_id, chunk.get_surface()) for chunk in doc_columns.chunks],
+                [(chunk.sid, chunk.cid, chunk.link_id, chunk.get_surface()) for chunk in nlelement.chunks(doc)]
+            )
+            restored = doc_columns.to_document()
+            self.assertEqual(restored.get_surface(), doc.get_surface())
+            for chunk, restored_chunk in zip(nlelement.chunks(doc), nlelement.chunks(restored)):
+                self.assertEqual(chunk.reverse_link_ids, restored_chunk.reverse_link_ids)
+                self.assertEqual(chunk.link.cid if chunk.link else None, restored_chunk.link.cid if restored_chunk.link else None)
+
+    def test_from_documents(self):
+        corpus = columns.CorpusColumns.from_documents(self.documents)
+        self.assertColumnsEqual(corpus, self.documents)
+        self.assertEqual(corpus.token_count(), sum(len(doc_columns) for doc_columns in corpus))
+        self.assertLess(len(corpus.strings), corpus.token_count())
+        token = corpus[1].tokens[-1]
+        self.assertEqual(token.surface, self.documents[1].sentences[-1].tokens[-1].surface)
+        with self.assertRaises(IndexError):
+            corpus[1].tokens[len(corpus[1])]
+
+    def test_from_database(self):
+        corpus = self.loader.load_columns(batch_size=3)
+        self.assertColumnsEqual(corpus, self.documents)
+        names = [doc.name for doc in self.documents]
+        self.assertListEqual([doc_columns.name for doc_columns in self.loader.load_columns(names=names[2:])], names[2:])
+
+
+if __name__ == "__main__":
+    unittest.main()
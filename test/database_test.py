@@ -1,7 +1,13 @@
+import contextlib
+import io
 import pathlib
 import sys
 import unittest
 import sqlite3
+import tempfile
+import os
+import pickle
+import tracemalloc
 # ライブラリがルートにある構成の問題で、相対インポートが機能しなくなるのを防ぐための処理
 """
 mod_path = pathlib.Path(__file__).parent
@@ -16,7 +22,8 @@ else:
 sys.path.append(str(root_path.parent))
 """
 # ここから、テストするモジュールを取り込む
-from nlelement import database
+from nlelement import database, nlelement
+from nlelement.loaders import LoadError
 from nlelement.testutil import testsamplemaker
 
 class DatabaseTest(unittest.TestCase):
@@ -47,5 +54,466 @@ class DatabaseWriterTest(unittest.TestCase):
         saver = database.DatabaseWriter(":memory:")
         saver.add_documents([samples.sample1()])
 
+    def test_bulk_document(self):
+        samples = testsamplemaker.NlElementSampleMaker()
+        documents = samples.synthetic_documents(5, sent_num=3, chunk_num=4)
+        documents.append(samples.sample_pas_annotation())
+        documents[-1].name = 'pas_annotation'
+        documents.append(samples.sample_pth_annotation())
+        documents[-1].name = 'pth_annotation'
+        saver = database.DatabaseWriter(":memory:")
+        saver.add_documents(documents)
+        bulk_saver = database.DatabaseWriter(":memory:", bulk=True)
+        bulk_saver.add_documents(documents)
+        for table in database.BULK_INSERT_SQL:
+            query = "SELECT * FROM {}".format(table)
+            self.assertListEqual(
+                sorted(saver.loader.connector.execute(query).fetchall(), key=repr),
+                sorted(bulk_saver.loader.connector.execute(query).fetchall(), key=repr),
+                table
+            )
+
+    def test_stream_documents(self):
+        samples = testsamplemaker.NlElementSampleMaker()
+        documents = samples.synthetic_documents(5, sent_num=2, chunk_num=3)
+        saver = database.DatabaseWriter(":memory:")
+        saver.add_documents(iter(documents), batch_size=2)
+        self.assertListEqual(
+            [row[0] for row in saver.loader.connector.execute("SELECT NAME FROM DOCUMENTS ORDER BY ID")],
+            [doc.name for doc in documents]
+        )
+
+class DatabaseLoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.samples = testsamplemaker.NlElementSampleMaker()
+        self.documents = self.samples.synthetic_documents(5, sent_num=4, chunk_num=4)
+        self.loader = database.DatabaseLoader(":memory:")
+        self.loader.create_tables()
+        self.loader.update_views()
+        self.loader.save(self.documents)
+
+    def tearDown(self):
+        self.loader.__exit__(None, None, None)
+
+    def assertDocumentEqual(self, doc1, doc2):
+        self.assertEqual(doc1.name, doc2.name)
+        self.assertEqual(len(doc1.sentences), len(doc2.sentences))
+        for tok1, tok2 in zip(nlelement.tokens(doc1), nlelement.tokens(doc2)):
+            self.assertEqual(vars(tok1).keys(), vars(tok2).keys())
+            for name, value in vars(tok1).items():
+                if name == 'coreference_link':
+                    self.assertEqual(
+                        {key: (entry.anaphora_ref, entry.antecedent_ref, entry.link_type) for key, entry in value.items()},
+                        {key: (entry.anaphora_ref, entry.antecedent_ref, entry.link_type) for key, entry in tok2.coreference_link.items()}
+                    )
+                elif name == '_chunk':
+                    # 文節への参照は直列化せずに復元時に設定し直すので、元の文書で設定されている場合だけ比較する
+                    if tok1.chunk is not None:
+                        self.assertEqual(tok1.chunk.cid, tok2.chunk.cid)
+                else:
+                    self.assertEqual(value, getattr(tok2, name), name)
+        for chk1, chk2 in zip(nlelement.chunks(doc1), nlelement.chunks(doc2)):
+            self.assertEqual(chk1.cid, chk2.cid)
+            self.assertEqual(chk1.link_id, chk2.link_id)
+            self.assertEqual(chk1.reverse_link_ids, chk2.reverse_link_ids)
+            self.assertEqual(chk1.get_surface(), chk2.get_surface())
+            self.assertEqual(chk1.case, chk2.case)
+
+    def test_load_document_batch(self):
+        docs = self.loader.load_documents()
+        batch_docs = self.loader.load_documents(batch_size=2)
+        self.assertEqual(len(docs), len(self.documents))
+        self.assertEqual(len(batch_docs), len(self.documents))
+        for doc, batch_doc in zip(docs, batch_docs):
+            self.assertDocumentEqual(doc, batch_doc)
+        for doc, batch_doc in zip(self.loader.load_as_iter(), self.loader.load_as_iter(batch_size=3)):
+            self.assertDocumentEqual(doc, batch_doc)
+
+    def test_load_error(self):
+        """壊れた文書は標準出力に書かずに文書名を付けたLoadErrorになることを確認する
+        """
+        doc_id, name = next(self.loader.iter_document_rows())
+        self.loader.connector.execute(
+            "UPDATE TOKENS SET TID = 999 WHERE ID = (SELECT MIN(ID) FROM TOKENS WHERE DOCUMENT_ID = ?)", (doc_id,)
+        )
+        for load in (lambda: self.loader.load_document(doc_id, name), lambda: self.loader.load_document_batch([(doc_id, name)])):
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout), self.assertRaises(LoadError) as context:
+                load()
+            self.assertEqual(stdout.getvalue(), '')
+            self.assertEqual(context.exception.document_name, name)
+            self.assertIn(name, context.exception.args[0])
+            self.assertEqual(context.exception.token_i, 999)
+
+    def test_load_annotations(self):
+        # 共参照・述語項・意味役割の数によらず、文書ごとのクエリ数は一定
+        queries = []
+        for doc_id, name in self.loader.iter_document_rows():
+            self.loader.connector.set_trace_callback(queries.append)
+            document = self.loader.load_document(doc_id, name)
+            self.loader.connector.set_trace_callback(None)
+            original = self.documents[doc_id - 1]
+            for tok, orig_tok in zip(nlelement.tokens(document), nlelement.tokens(original)):
+                self.assertEqual(
+                    {key: entry.antecedent_ref for key, entry in tok.coreference_link.items()},
+                    {key: entry.antecedent_ref for key, entry in orig_tok.coreference_link.items()}
+                )
+                self.assertEqual(getattr(tok, 'semroles', None), getattr(orig_tok, 'semroles', None))
+        self.assertEqual(
+            len([sql for sql in queries if 'Coreference' in sql or 'SemanticRole' in sql]), 2 * len(self.documents)
+        )
+        self.assertFalse([sql for sql in queries if 'token.id = ?' in sql])
+
+    def test_load_exophora(self):
+        document = self.samples.synthetic_document('EXO', sent_num=2, chunk_num=2)
+        predicate = document.sentences[0].tokens[2]
+        predicate.coreference_link['ga'] = nlelement.CoreferenceEntry(
+            nlelement.make_reference(predicate), nlelement.ExoReference(1), 0, 0, ''
+        )
+        self.loader.save_in_additional([document])
+        doc_id, name = next(self.loader.iter_document_rows(names=['EXO']))
+        for load_exophora in (False, True):
+            self.loader.load_exophora = load_exophora
+            entry = self.loader.load_document(doc_id, name).sentences[0].tokens[2].coreference_link.get('ga')
+            if load_exophora:
+                self.assertEqual(entry.antecedent_ref.exo_value, 1)
+            else:
+                self.assertTrue(entry is None or not isinstance(entry.antecedent_ref, nlelement.ExoReference))
+
+    def test_load_as_iter_filter(self):
+        names = [doc.name for doc in self.documents]
+        self.assertListEqual([doc.name for doc in self.loader.load_as_iter(prefetch=2)], names)
+        self.assertListEqual(
+            [doc.name for doc in self.loader.load_as_iter(names=[names[3], names[1]])], [names[1], names[3]]
+        )
+        self.assertListEqual(
+            [doc.name for doc in self.loader.load_as_iter(prefetch=1, batch_size=2, id_range=(2, 5))], names[1:4]
+        )
+        self.assertListEqual(
+            [doc.name for doc in self.loader.load_as_iter(where="NAME > ?", where_params=(names[2],))], names[3:]
+        )
+
+    def test_load_as_iter_order(self):
+        saver = database.DatabaseWriter(":memory:")
+        saver.add_documents(reversed(self.documents))
+        names = sorted(doc.name for doc in self.documents)
+        self.assertListEqual([doc.name for doc in saver.loader.load_as_iter()], names[::-1])
+        self.assertListEqual([doc.name for doc in saver.loader.load_as_iter(prefetch=2, order_by='NAME')], names)
+        self.assertListEqual(
+            [doc.name for doc in saver.loader.load_as_iter(order_by='NAME', id_range=(2, None))], names[:-1]
+        )
+        with self.assertRaises(ValueError):
+            next(saver.loader.load_as_iter(order_by='SENTENCE_ID'))
+
+    def test_load_as_iter_memory(self):
+        """文書数を10倍にしてもload_as_iterのピークメモリがほぼ変わらないことを確認する
+        """
+        def peak_memory(doc_num):
+            loader = database.DatabaseLoader(":memory:")
+            loader.create_tables()
+            loader.save(self.samples.synthetic_documents(doc_num, sent_num=2, chunk_num=3), bulk=True)
+            tracemalloc.start()
+            for _ in loader.load_as_iter(batch_size=4, prefetch=8):
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            loader.__exit__(None, None, None)
+            return peak
+        small_peak = peak_memory(30)
+        large_peak = peak_memory(300)
+        self.assertLess(large_peak, small_peak * 1.5)
+
+    def test_load_compact(self):
+        with database.DatabaseLoader(":memory:", compact=True) as compact_loader:
+            compact_loader.create_tables()
+            compact_loader.save(self.documents, bulk=True)
+            compact_docs = compact_loader.load_documents(batch_size=2)
+        for doc, compact_doc in zip(self.loader.load_documents(), compact_docs):
+            for tok, compact_tok in zip(nlelement.tokens(doc), nlelement.tokens(compact_doc)):
+                self.assertIsInstance(compact_tok, nlelement.CompactToken)
+                for name, value in vars(tok).items():
+                    if name == 'coreference_link':
+                        self.assertEqual(value.keys(), compact_tok.coreference_link.keys())
+                    elif name == '_chunk':
+                        self.assertEqual(tok.chunk.cid, compact_tok.chunk.cid)
+                    else:
+                        self.assertEqual(value, getattr(compact_tok, name), name)
+            for chk, compact_chk in zip(nlelement.chunks(doc), nlelement.chunks(compact_doc)):
+                self.assertIsInstance(compact_chk, nlelement.CompactChunk)
+                self.assertEqual(chk.link_id, compact_chk.link_id)
+                self.assertEqual(chk.case, compact_chk.case)
+                self.assertEqual(chk.get_surface(), compact_chk.get_surface())
+            self.assertDocumentEqual(compact_doc, database.decode_document(database.encode_document(compact_doc)))
+
+    def test_shared_strings(self):
+        documents = self.loader.load_documents(batch_size=4)
+        tokens = [token for doc in documents for sentence in doc.sentences for token in sentence.tokens]
+        for attr in ('surface', 'part', 'pos'):
+            values = dict()
+            for token in tokens:
+                value = values.setdefault(getattr(token, attr), getattr(token, attr))
+                self.assertIs(getattr(token, attr), value, attr)
+
+    def test_pickle_document(self):
+        for doc in self.documents:
+            self.assertDocumentEqual(doc, pickle.loads(pickle.dumps(doc)))
+            self.assertDocumentEqual(doc, database.decode_document(database.encode_document(doc)))
+
+    def test_load_documents_parallel(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'parallel.db')
+            database.save(filename, self.documents)
+            with database.DatabaseLoader(filename) as loader:
+                docs = loader.load_documents()
+                parallel_docs = loader.load_documents_parallel(workers=2, shard_size=2)
+                self.assertEqual(len(parallel_docs), len(docs))
+                for doc, parallel_doc in zip(docs, parallel_docs):
+                    self.assertDocumentEqual(doc, parallel_doc)
+                unordered = loader.load_as_iter_parallel(workers=2, ordered=False, shard_size=1, transport='bytes')
+                self.assertListEqual(
+                    sorted(database.decode_document(data).name for data in unordered),
+                    [doc.name for doc in docs]
+                )
+                self.assertListEqual(
+                    [doc.name for doc in loader.load_as_iter_parallel(workers=2, shard_size=1, id_range=(2, 4))],
+                    [doc.name for doc in docs[1:3]]
+                )
+        with self.assertRaises(ValueError):
+            next(self.loader.load_as_iter_parallel(workers=1))
+
+
+class SchemaMigrationTest(unittest.TestCase):
+    """スキーマv1のデータベースの移行とクエリプランの検証
+    """
+    # Schema_Versionテーブルを導入する前のTables.sql, Indices.sqlとの差分
+    V1_PATCH = """
+        DROP TABLE Schema_Version;
+        DROP TABLE Pas_Annotated;
+        DROP TABLE Pth_Annotated;
+        DROP TABLE Pth_Annotated_Sent;
+        CREATE TABLE Pas_Annotated(ID INTEGER PRIMARY_KEY, NAME TEXT UNIQUE);
+        CREATE TABLE Pth_Annotated(ID INTEGER PRIMARY_KEY, NAME TEXT UNIQUE);
+        CREATE TABLE Pth_Annotated_Sent(ID INTEGER PRIMARY_KEY);
+        DROP INDEX Sentence_Doc_Sid_Idx;
+        DROP INDEX Chunk_Sent_Cid_Idx;
+        DROP INDEX Token_Sent_Tid_Idx;
+        DROP INDEX Token_Doc_Idx;
+        DROP INDEX Token_Tag_Cover_Idx;
+        CREATE INDEX Sentence_Idx ON Sentences(DOCUMENT_ID);
+        CREATE INDEX Chunk_Idx ON Chunks(SENTENCE_ID);
+        CREATE INDEX Token_Sent_Idx ON Tokens(SENTENCE_ID);
+        CREATE INDEX Token_Doc_Idx ON Tokens(SENTENCE_ID);
+        CREATE INDEX Token_Tag_Idx ON Token_Tags(TOKEN);
+        CREATE INDEX DOCNAME_IDX ON Documents(Name);
+    """
+    QUERIES = (
+        "SELECT * FROM SENTENCES WHERE DOCUMENT_ID = 1 ORDER BY SID",
+        "SELECT * FROM CHUNKS WHERE SENTENCE_ID = 1 ORDER BY CID",
+        "SELECT * FROM TOKENS WHERE SENTENCE_ID = 1 ORDER BY TID",
+    )
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, 'v1.db')
+        self.documents = testsamplemaker.NlElementSampleMaker().synthetic_documents(3, sent_num=2, chunk_num=3)
+        self.documents[0].pas_annotated = True
+        with database.DatabaseWriter(self.filename) as writer:
+            writer.add_documents(self.documents)
+            writer.loader.connector.executescript(self.V1_PATCH)
+            writer.loader.connector.execute("INSERT INTO Pas_Annotated VALUES (1, ?)", (self.documents[0].name,))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def __plan__(loader, sql):
+        return ' / '.join(row[-1] for row in loader.connector.execute("EXPLAIN QUERY PLAN " + sql))
+
+    def test_new_database(self):
+        loader = database.DatabaseLoader(":memory:")
+        self.assertEqual(loader.schema_version(), 0)
+        loader.create_tables()
+        self.assertEqual(loader.schema_version(), database.SCHEMA_VERSION)
+        self.assertEqual(loader.migrate(), database.SCHEMA_VERSION)
+        for sql in self.QUERIES:
+            self.assertNotIn('TEMP B-TREE', self.__plan__(loader, sql))
+
+    def test_migrate(self):
+        with database.DatabaseLoader(self.filename) as loader:
+            self.assertEqual(loader.schema_version(), 1)
+            before = [self.__plan__(loader, sql) for sql in self.QUERIES]
+            expected = [repr(doc.sentences[0].tokens) for doc in loader.load()]
+            self.assertEqual(loader.migrate(), 2)
+            self.assertEqual(loader.schema_version(), 2)
+            after = [self.__plan__(loader, sql) for sql in self.QUERIES]
+            self.assertEqual([repr(doc.sentences[0].tokens) for doc in loader.load()], expected)
+            indices = {name for name, in loader.connector.execute("SELECT NAME FROM SQLITE_MASTER WHERE TYPE='index'")}
+            self.assertNotIn('Token_Sent_Idx', indices)
+            self.assertIn('Token_Doc_Idx', indices)
+            self.assertIn('DOCUMENT_ID', loader.connector.execute(
+                "SELECT SQL FROM SQLITE_MASTER WHERE NAME = 'Token_Doc_Idx'").fetchone()[0])
+            # PRIMARY_KEYの誤記を直したテーブルに内容が移っている
+            self.assertEqual(loader.connector.execute("SELECT * FROM Pas_Annotated").fetchall(), [(1, self.documents[0].name)])
+            with self.assertRaises(sqlite3.IntegrityError):
+                loader.connector.execute("INSERT INTO Pas_Annotated VALUES (1, 'other')")
+        for plan in before:
+            self.assertIn('TEMP B-TREE', plan)
+        for plan in after:
+            self.assertNotIn('TEMP B-TREE', plan)
+        with database.DatabaseLoader(self.filename) as loader:
+            self.assertEqual(loader.migrate(), 2)
+
+
+class ConnectionProfileTest(unittest.TestCase):
+    """接続の設定(CONNECTION_PROFILES)の検証
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, 'profile.db')
+        self.documents = testsamplemaker.NlElementSampleMaker().synthetic_documents(4, sent_num=2, chunk_num=3)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def __indices__(loader):
+        return {name for name, in loader.connector.execute(
+            "SELECT NAME FROM SQLITE_MASTER WHERE TYPE='index' AND SQL IS NOT NULL"
+        )}
+
+    def test_bulk_load(self):
+        with database.DatabaseWriter(self.filename, bulk=True, profile='bulk_load') as writer:
+            pragmas = writer.loader.pragmas()
+            self.assertEqual(pragmas['journal_mode'], 'wal')
+            self.assertEqual(pragmas['synchronous'], 0)
+            writer.add_documents(iter(self.documents), batch_size=2)
+            # インデックスは書き込みの最後に作る
+            self.assertSetEqual(self.__indices__(writer.loader), set())
+        with database.DatabaseLoader(self.filename) as loader:
+            self.assertEqual(loader.pragmas()['journal_mode'], 'delete')
+            self.assertIn('Token_Sent_Tid_Idx', self.__indices__(loader))
+            self.assertListEqual([doc.name for doc in loader.load_as_iter()], [doc.name for doc in self.documents])
+
+    def test_read_only(self):
+        with database.DatabaseWriter(self.filename) as writer:
+            writer.add_documents(self.documents)
+        with database.DatabaseLoader(self.filename, profile='read_only') as loader:
+            self.assertEqual(loader.pragmas()['query_only'], 1)
+            self.assertListEqual([doc.name for doc in loader.load_as_iter()], [doc.name for doc in self.documents])
+            with self.assertRaises(sqlite3.OperationalError):
+                loader.connector.execute("DELETE FROM Documents")
+        with self.assertRaises(ValueError):
+            database.DatabaseLoader(self.filename, profile='unknown')
+
+
+class DatabaseBuildTest(unittest.TestCase):
+    """DatabaseWriter.buildによるコーパスの構築と中断後の再開の検証
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, 'build.db')
+        self.documents = testsamplemaker.NlElementSampleMaker().synthetic_documents(7, sent_num=2, chunk_num=3)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def __interrupted__(self, stop):
+        for i, document in enumerate(self.documents):
+            if i == stop:
+                raise KeyboardInterrupt()
+            yield document
+
+    def test_resume(self):
+        with self.assertRaises(KeyboardInterrupt):
+            database.build(self.filename, self.__interrupted__(5), batch_size=2)
+        with database.DatabaseLoader(self.filename) as loader:
+            # 確定したバッチの文書だけが残り、インデックスはまだない
+            self.assertListEqual(list(loader.get_names()), [doc.name for doc in self.documents[:4]])
+            self.assertIsNone(loader.connector.execute(
+                "SELECT NAME FROM SQLITE_MASTER WHERE NAME = 'Token_Sent_Tid_Idx'").fetchone())
+        self.assertEqual(database.build(self.filename, iter(self.documents + self.documents[:1]), batch_size=2), 3)
+        with database.DatabaseLoader(self.filename) as loader:
+            self.assertListEqual([doc.name for doc in loader.load_as_iter()], [doc.name for doc in self.documents])
+            self.assertIsNotNone(loader.connector.execute(
+                "SELECT NAME FROM SQLITE_MASTER WHERE NAME = 'Token_Sent_Tid_Idx'").fetchone())
+            self.assertGreater(loader.connector.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0], 0)
+            for doc, expected in zip(loader.load_as_iter(), self.documents):
+                self.assertEqual(
+                    [tok.surface for tok in nlelement.tokens(doc)], [tok.surface for tok in nlelement.tokens(expected)]
+                )
+
+    def test_failed_batch(self):
+        broken = testsamplemaker.NlElementSampleMaker().synthetic_document('BROKEN', sent_num=1, chunk_num=2)
+        broken.sentences[0].tokens[0].surface = object()
+        with database.DatabaseWriter(self.filename, bulk=True) as writer:
+            with self.assertRaises(sqlite3.Error):
+                writer.build(iter(self.documents[:3] + [broken]), batch_size=2)
+            self.assertListEqual(list(writer.loader.get_names()), [doc.name for doc in self.documents[:2]])
+
+
+class SurfaceTableTest(unittest.TestCase):
+    """表層の表(materialize_surfaces)の上に作り直したビューの検証
+    """
+    VIEWS = ('SentenceView', 'ChunkView', 'LinkView', 'CoreferenceView', 'PredicateView')
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, 'surface.db')
+        self.documents = testsamplemaker.NlElementSampleMaker().synthetic_documents(6, sent_num=3, chunk_num=3)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def __rows__(loader):
+        return {view: sorted(loader.connector.execute("SELECT * FROM {}".format(view)).fetchall(), key=repr)
+                for view in SurfaceTableTest.VIEWS}
+
+    def test_materialize(self):
+        with database.DatabaseWriter(self.filename) as writer:
+            writer.add_documents(self.documents[:3])
+        with database.DatabaseWriter(self.filename, append=True) as writer:
+            writer.add_documents(self.documents[3:])
+            expected = self.__rows__(writer.loader)
+            self.assertFalse(writer.loader.has_surface_tables())
+            writer.loader.materialize_surfaces()
+            self.assertTrue(writer.loader.has_surface_tables())
+            self.assertEqual(self.__rows__(writer.loader), expected)
+            plan = ' / '.join(row[-1] for row in writer.loader.connector.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM CoreferenceView"))
+            self.assertNotIn('GROUP BY', plan)
+            self.assertGreater(len(expected['CoreferenceView']), 0)
+            writer.loader.clear()
+            self.assertFalse(writer.loader.has_surface_tables())
+            self.assertEqual(writer.loader.connector.execute("SELECT COUNT(*) FROM SentenceView").fetchone()[0], 0)
+
+    def test_incremental(self):
+        with database.DatabaseWriter(self.filename, materialize=True) as writer:
+            writer.add_documents(self.documents[:2])
+        # 表がある場合は追加した文書の分も更新する
+        database.build(self.filename, iter(self.documents), batch_size=2)
+        with database.DatabaseLoader(self.filename) as loader:
+            self.assertTrue(loader.has_surface_tables())
+            surfaces = [row[0] for row in loader.connector.execute("SELECT surface FROM SentenceView ORDER BY id")]
+        self.assertListEqual(surfaces, [sent.get_surface() for doc in self.documents for sent in doc.sentences])
+
+    def test_loader_save(self):
+        """DatabaseLoaderのsave, save_in_additionalとdatabase.saveでも表層の表を更新することを確認する
+        """
+        with database.DatabaseWriter(self.filename, materialize=True) as writer:
+            writer.add_documents(self.documents[:2])
+        with database.DatabaseLoader(self.filename) as loader:
+            loader.save(self.documents[2:3])
+            loader.save_in_additional(self.documents[3:4])
+            loader.connector.commit()
+        database.save(self.filename, self.documents[4:])
+        with database.DatabaseLoader(self.filename) as loader:
+            self.assertTrue(loader.has_surface_tables())
+            rows = self.__rows__(loader)
+            surfaces = [row[0] for row in loader.connector.execute("SELECT surface FROM SentenceView ORDER BY id")]
+            loader.connector.executescript("DROP TABLE Sentence_Surface; DROP TABLE Chunk_Surface;")
+            loader.update_views()
+            self.assertEqual(self.__rows__(loader), rows)
+        self.assertListEqual(surfaces, [sent.get_surface() for doc in self.documents for sent in doc.sentences])
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
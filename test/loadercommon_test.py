@@ -0,0 +1,43 @@
+import unittest
+from nlelement import loadercommon
+
+class SymbolTableTest(unittest.TestCase):
+    def test_intern(self):
+        table = loadercommon.SymbolTable()
+        first = table.intern(''.join(['名', '詞']))
+        self.assertIs(table.intern(''.join(['名', '詞'])), first)
+        self.assertIsNone(table.intern(None))
+        self.assertIs(loadercommon.symbols.intern(''.join(['名', '詞'])), first)
+
+class FeatureCacheTest(unittest.TestCase):
+    """素性文字列の変換結果のキャッシュの検証
+    """
+    def test_lru(self):
+        cache = loadercommon.FeatureCache(maxsize=2)
+        decode = lambda feature: tuple(feature.split(','))
+        first = cache.get('test', '名詞,一般', decode)
+        self.assertEqual(first, ('名詞', '一般'))
+        self.assertIs(cache.get('test', '名詞,一般', decode), first)
+        cache.get('test', '動詞,自立', decode)
+        # 最近使った'名詞,一般'は残り、'動詞,自立'が追い出される
+        cache.get('test', '名詞,一般', decode)
+        cache.get('test', '助詞,格助詞', decode)
+        self.assertIn(('test', '名詞,一般'), cache.records)
+        self.assertNotIn(('test', '動詞,自立'), cache.records)
+        self.assertDictEqual(
+            cache.stats(), {'hits': 2, 'misses': 3, 'size': 2, 'maxsize': 2, 'hit_rate': 0.4}
+        )
+        cache.resize(1)
+        self.assertEqual(len(cache.records), 1)
+
+    def test_intern(self):
+        cache = loadercommon.FeatureCache()
+        decode = lambda feature: (feature.split(',')[0], len(feature))
+        noun1 = cache.get('test', '名詞,一般', decode)
+        noun2 = cache.get('test', '名詞,固有名詞', decode)
+        self.assertIs(noun1[0], noun2[0])
+        self.assertIsNot(cache.get('other', '名詞,一般', decode), noun1)
+
+
+if __name__ == "__main__":
+    unittest.main()
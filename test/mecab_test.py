@@ -0,0 +1,61 @@
+import unittest
+from nlelement import loadercommon
+from nlelement.loaders import mecab
+
+def __make_parser__():
+    try:
+        return mecab.MeCabParser()
+    except RuntimeError:
+        return None
+
+# 辞書が使えない環境ではMeCabParserのテストを飛ばす
+PARSER = __make_parser__()
+
+class MorphUnpackerTest(unittest.TestCase):
+    """素性文字列からの形態素の生成とキャッシュの検証
+    """
+    features = [
+        '名詞,固有名詞,人名,名,*,*,太郎,タロウ,タロー',
+        '助詞,係助詞,*,*,*,*,は,ハ,ワ',
+        '動詞,自立,*,*,五段・ラ行,基本形,走る,ハシル,ハシル',
+        '名詞,一般,*,*,*,*',
+    ]
+
+    def test_unpack_string(self):
+        unpacker = mecab.MorphUnpacker.ipadic()
+        for feature in self.features:
+            expected = unpacker.unpack('表層', feature.split(','))
+            for _ in range(2):
+                token = unpacker.unpack_string('表層', feature)
+                for attr in ('surface', 'pos', 'part', 'attr1', 'attr2', 'conj_type', 'conj_form', 'basic_surface', 'read'):
+                    self.assertEqual(getattr(token, attr), getattr(expected, attr), attr)
+        # 未知語は原形が表層になる
+        self.assertEqual(unpacker.unpack_string('ほげ', self.features[3]).basic_surface, 'ほげ')
+
+    def test_shared_cache(self):
+        loadercommon.feature_cache.clear()
+        for unpacker in (mecab.MorphUnpacker.ipadic(), mecab.MorphUnpacker.ipadic()):
+            for feature in self.features:
+                unpacker.unpack_string('表層', feature)
+        self.assertEqual(loadercommon.feature_cache.misses, len(self.features))
+        self.assertEqual(loadercommon.feature_cache.hits, len(self.features))
+        # 設定が異なる変換器とは共有しない
+        mecab.MorphUnpacker.unidic().unpack_string('表層', self.features[0])
+        self.assertEqual(loadercommon.feature_cache.misses, len(self.features) + 1)
+
+@unittest.skipIf(PARSER is None, 'MeCabの辞書が見つからない')
+class MeCabParserTest(unittest.TestCase):
+    def test_parse_many(self):
+        texts = ['太郎は走った。', '花子が歩いた。'] * 50
+        expected = [PARSER.parse(text, sid) for sid, text in enumerate(texts)]
+        for workers in (1, 4):
+            sentences = PARSER.parse_many(texts, workers=workers, batch_size=8)
+            self.assertEqual([sent.sid for sent in sentences], list(range(len(texts))))
+            self.assertEqual(
+                [[tok.surface for tok in sent.tokens] for sent in sentences],
+                [[tok.surface for tok in sent.tokens] for sent in expected]
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,6 @@
+import os
+import pickle
+import tempfile
 import unittest
 from nlelement.testutil import testsamplemaker
 from nlelement import nlelement, cabochainput, KNBCInput
@@ -138,6 +141,83 @@ class KNBCLoaderTest(unittest.TestCase):
             self.assertEqual(sentences[2].chunks[0].get_particle_surf(), 'に')
 
 
+class KNBCCacheTest(unittest.TestCase):
+    """KNBCLoaderの並列読み込みと解析結果のキャッシュの検証(合成したKNBC形式のコーパスを使う)
+    """
+    sentence = [
+        '# S-ID:{name}_1-1-1-{sid:02d} KNP:96/10/27 MOD:2005/03/08',
+        '* 1D <文頭><体言>',
+        '+ 1D <文頭><体言>',
+        '{noun} {noun} {noun} 名詞 6 人名 5 * 0 * 0 "代表表記:{noun}/{noun}" <文頭><自立><内容語><文節主辞><NE:PERSON:single>',
+        'は は は 助詞 9 副助詞 2 * 0 * 0 NIL <付属>',
+        '* -1D <文末>',
+        '+ -1D <文末>',
+        '走る はしる 走る 動詞 2 * 0 子音動詞ラ行 10 基本形 2 "代表表記:走る/はしる" <自立><内容語><文節主辞>',
+        'EOS',
+    ]
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmpdir.name, 'cache')
+        for i, noun in enumerate(('太郎', '花子', '次郎')):
+            name = 'KN{:03d}_Test'.format(i)
+            # 文番号順とファイル名の辞書順が一致しないようにする
+            for sid in (10, 2, 1):
+                self.__write__(name, sid, noun)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def __write__(self, name, sid, noun):
+        dirname = os.path.join(self.tmpdir.name, 'corpus1', name)
+        os.makedirs(dirname, exist_ok=True)
+        text = '\n'.join(self.sentence).format(name=name, sid=sid, noun=noun) + '\n'
+        with open(os.path.join(dirname, '{}_1-1-1-{:02d}'.format(name, sid)), 'w', encoding='euc-jp') as file:
+            file.write(text)
+
+    @staticmethod
+    def __summary__(documents):
+        return [
+            (doc.name, [sent.name for sent in doc.sentences], [tok.surface for tok in nlelement.tokens(doc)])
+            for doc in documents
+        ]
+
+    def test_cache(self):
+        expected = self.__summary__(KNBCInput.KNBCLoader(self.tmpdir.name).load())
+        self.assertEqual(expected[0][1][-1], 'S-ID:{}_1-1-1-10'.format(expected[0][0]))
+        loader = KNBCInput.KNBCLoader(self.tmpdir.name, cache_dir=self.cache_dir)
+        self.assertListEqual(self.__summary__(loader.load()), expected)
+        self.assertEqual((loader.cache.hits, loader.cache.misses), (0, 3))
+        loader = KNBCInput.KNBCLoader(self.tmpdir.name, cache_dir=self.cache_dir)
+        self.assertListEqual(self.__summary__(loader.load()), expected)
+        self.assertEqual((loader.cache.hits, loader.cache.misses), (3, 0))
+        # 内容が変わった文書だけ読み直す
+        self.__write__('KN001_Test', 2, '三郎')
+        loader = KNBCInput.KNBCLoader(self.tmpdir.name, cache_dir=self.cache_dir)
+        documents = {doc.name: doc for doc in loader.load()}
+        self.assertEqual((loader.cache.hits, loader.cache.misses), (2, 1))
+        self.assertIn('三郎', [tok.surface for tok in nlelement.tokens(documents['KN001_Test'])])
+
+    def test_load_parallel(self):
+        expected = self.__summary__(KNBCInput.KNBCLoader(self.tmpdir.name).load())
+        self.assertListEqual(self.__summary__(KNBCInput.KNBCLoader(self.tmpdir.name).load_parallel(workers=2)), expected)
+        for hits in (0, 3):
+            loader = KNBCInput.KNBCLoader(self.tmpdir.name, cache_dir=self.cache_dir)
+            self.assertListEqual(self.__summary__(loader.load_parallel(workers=2)), expected)
+            self.assertEqual(loader.cache.hits, hits)
+
+    def test_load_parallel_error(self):
+        """ワーカーで発生したLoadError以外の例外も文書ディレクトリのパスを付けたLoadErrorになることを確認する
+        """
+        dirname = os.path.join(self.tmpdir.name, 'corpus1', 'KN001_Test')
+        # EUC-JPとして読めないファイル(Documentの解析前に読み込みで失敗する)
+        with open(os.path.join(dirname, 'KN001_Test_1-1-1-02'), 'ab') as file:
+            file.write(b'\xff\xfe\n')
+        with self.assertRaises(KNBCInput.LoadError) as context:
+            KNBCInput.KNBCLoader(self.tmpdir.name).load_parallel(workers=2)
+        self.assertEqual(context.exception.document_name, 'KN001_Test')
+        self.assertIn(dirname, context.exception.args[0])
+        self.assertIsInstance(context.exception.__cause__, UnicodeDecodeError)
+
 @unittest.skip("モジュール cabochaが機能置き換え")
 class CabochaLoaderTest(unittest.TestCase):
     """cabochainputの機能テスト なんだけどもはや不要な気が・・・
@@ -244,7 +324,237 @@ class NLElementTest(unittest.TestCase):
         self.assertEqual(doc.refer(nlelement.ChunkReference(0, 0)), doc.sentences[0].chunks[0])
         self.assertEqual(doc.refer_sentence(0), doc.sentences[0])
         
+    def test_refer_sentence_index(self):
+        doc = self.samples.sample1()
+        sentences = list(doc.sentences)
+        doc.sentences = list(reversed(sentences))
+        self.assertIsInstance(doc.sentences, nlelement.SentenceList)
+        self.assertIs(doc.refer_sentence(0), sentences[0])
+        new_sentence = nlelement.Sentence()
+        new_sentence.sid = len(sentences)
+        doc.sentences.append(new_sentence)
+        self.assertIs(doc.refer_sentence(new_sentence.sid), new_sentence)
+        replaced = nlelement.Sentence()
+        replaced.sid = new_sentence.sid
+        doc.sentences[-1] = replaced
+        self.assertIs(doc.refer_sentence(new_sentence.sid), replaced)
+        del doc.sentences[-1]
+        self.assertIsNone(doc.refer_sentence(new_sentence.sid))
+        sentences[0].sid = 100
+        self.assertIsNone(doc.refer_sentence(0))
+        self.assertIs(doc.refer_sentence(100), sentences[0])
+
+    def test_refer_sentence_after_sid_assignment(self):
+        doc = nlelement.Document()
+        sentences = [nlelement.Sentence() for _ in range(3)]
+        doc.sentences.extend(sentences)
+        self.assertIs(doc.refer_sentence(0), sentences[0])
+        self.assertIsNone(doc.refer_sentence(1))
+        for sid, sentence in enumerate(sentences):
+            sentence.sid = sid + 1
+        # 文IDを書き換えた後はinvalidate_index()で索引を作り直す
+        doc.invalidate_index()
+        self.assertIsNone(doc.refer_sentence(0))
+        for sid, sentence in enumerate(sentences):
+            self.assertIs(doc.refer_sentence(sid + 1), sentence)
+
+    def test_refer_sentence_miss(self):
+        """無効な文IDを引いても索引を作り直さないことを確認する
+        """
+        doc = self.samples.synthetic_document('MISS', sent_num=3, chunk_num=2)
+        self.assertIs(doc.refer_sentence(1), doc.sentences[1])
+        index = doc.sentences.sid_index
+        for _ in range(3):
+            self.assertIsNone(doc.refer_sentence(len(doc.sentences)))
+            self.assertIsNone(doc.refer(nlelement.TokenReference(-1, 0)))
+        self.assertIs(doc.sentences.sid_index, index)
+
+    def test_position_index(self):
+        doc = self.samples.synthetic_document('POSITION', sent_num=4, chunk_num=3)
+        surface = ''.join(doc.get_surface())
+        position = 0
+        for sent in doc.sentences:
+            self.assertEqual(nlelement.get_position(doc, sent), position)
+            for tok in sent.tokens:
+                self.assertEqual(nlelement.get_position(doc, tok), position)
+                self.assertEqual(nlelement.get_position(doc, nlelement.make_reference(tok)), position)
+                for i in range(len(tok.surface)):
+                    self.assertIs(nlelement.position_to_token(doc, position + i), tok)
+                    self.assertIs(nlelement.position_to_sentence(doc, position + i), sent)
+                position += len(tok.surface)
+        for chunk in nlelement.chunks(doc):
+            begin = nlelement.get_position(doc, chunk)
+            self.assertEqual(surface[begin:begin + len(chunk.get_surface())], chunk.get_surface())
+            self.assertIs(nlelement.position_to_chunk(doc, begin), chunk)
+        self.assertIsNone(nlelement.position_to_token(doc, -1))
+        self.assertIsNone(nlelement.position_to_token(doc, len(surface)))
+        sent = self.samples.synthetic_document('APPEND', sent_num=1, chunk_num=2).sentences[0]
+        sent.sid = len(doc.sentences)
+        doc.sentences.append(sent)
+        self.assertIs(nlelement.position_to_sentence(doc, len(surface)), sent)
+        sent.tokens[0].surface += 'あ'
+        doc.invalidate_index()
+        self.assertEqual(nlelement.position_to_token(doc, len(surface) + len(sent.tokens[0].surface) - 1), sent.tokens[0])
+
+    def test_position_index_after_inplace_edit(self):
+        doc = self.samples.synthetic_document('EDIT', sent_num=2, chunk_num=2)
+        first, second = doc.sentences
+        begin = nlelement.get_position(doc, second)
+        first.tokens[-1].surface += 'あい'
+        # 単語の書き換えは検知しないので、invalidate_index()を呼ぶまでは古い位置のまま
+        self.assertEqual(nlelement.get_position(doc, second), begin)
+        doc.invalidate_index()
+        self.assertEqual(nlelement.get_position(doc, second), begin + 2)
+        self.assertIs(nlelement.position_to_token(doc, begin + 1), first.tokens[-1])
+        self.assertIs(nlelement.position_to_sentence(doc, begin + 2), second)
+
+    def test_reference_converter(self):
+        src = self.samples.sample_diffreference_converter_a()
+        dest = self.samples.sample_diffreference_converter_b()
+        converter = nlelement.ReferenceConverter(dest, src)
+        refs = [nlelement.TokenReference(2, 4), nlelement.TokenReference(1, 1), nlelement.ChunkReference(2, 2)]
+        self.assertListEqual(
+            converter.convert_many(refs),
+            [nlelement.TokenReference(1, 8), nlelement.TokenReference(1, 0), nlelement.ChunkReference(2, 0)]
+        )
+        self.assertListEqual(
+            converter.convert_many(refs[:2], 'tail'), [nlelement.TokenReference(1, 9), nlelement.TokenReference(1, 2)]
+        )
+        converter.no_sid_convert = True
+        self.assertEqual(converter.convert(refs[0]), nlelement.TokenReference(2, 3))
+        self.assertEqual(converter.convert(refs[0], 'tail'), nlelement.TokenReference(2, 5))
+        self.assertEqual(converter.convert(refs[2]), nlelement.ChunkReference(2, -1))
+
+    def test_reference_converter_char(self):
+        """1文字ずつに分割した文書への変換で、単語の始点/終点の文字に変換されることを確認する
+        """
+        src = self.samples.synthetic_document('CONVERT', sent_num=3, chunk_num=3)
+        dest = nlelement.Document()
+        for sent in src.sentences:
+            char_sent = nlelement.Sentence()
+            char_sent.sid = sent.sid
+            for tid, char in enumerate(sent.get_surface()):
+                token = nlelement.Token()
+                token.sid, token.tid, token.surface = sent.sid, tid, char
+                char_sent.tokens.append(token)
+            dest.sentences.append(char_sent)
+        converter = nlelement.ReferenceConverter(dest, src)
+        for tok in nlelement.tokens(src):
+            position = nlelement.get_position(src, tok) - nlelement.get_position(src, src.refer_sentence(tok.sid))
+            ref = nlelement.make_reference(tok)
+            self.assertEqual(converter.convert(ref), nlelement.TokenReference(tok.sid, position))
+            if tok is not src.refer_sentence(tok.sid).tokens[-1]:
+                # 文末の単語の終点は次の文の始点として扱われる(以前からの仕様)
+                self.assertEqual(converter.convert(ref, 'tail'), nlelement.TokenReference(tok.sid, position + len(tok.surface) - 1))
+        # count_funcは文・単語の両方に適用される
+        converter.count_func = lambda elem: 2 * elem.get_length()
+        self.assertEqual(
+            converter.convert(nlelement.TokenReference(1, 1)), converter.convert_many([nlelement.TokenReference(1, 1)])[0]
+        )
+
+    def test_reference_converter_reassigned_sentences(self):
+        """変換の途中で文書の文のリストを差し替えても、新しい文のリストで変換されることを確認する
+        """
+        src = self.samples.synthetic_document('REASSIGN', sent_num=2, chunk_num=3)
+        dest = nlelement.Document()
+        char_sent = nlelement.Sentence()
+        for tid, char in enumerate(''.join(src.get_surface())):
+            token = nlelement.Token()
+            token.tid, token.surface = tid, char
+            char_sent.tokens.append(token)
+        dest.sentences = [char_sent]
+        converter = nlelement.ReferenceConverter(dest, src)
+        tok = src.sentences[1].tokens[1]
+        ref = nlelement.make_reference(tok)
+        self.assertEqual(converter.convert(ref), nlelement.TokenReference(0, nlelement.get_position(src, tok)))
+        dest.sentences = list(src.sentences)
+        self.assertEqual(converter.convert(ref), ref)
+
+    def test_chunk_from_token(self):
+        doc = self.samples.synthetic_document('CHUNK_INDEX', sent_num=2, chunk_num=3)
+        for sent in doc.sentences:
+            for chunk in sent.chunks:
+                for tok in chunk.tokens:
+                    self.assertIs(sent.chunk_from_token(tok), chunk)
+                    self.assertIs(tok.chunk, chunk)
+                    self.assertEqual(doc.chunkref_from_tokenref(nlelement.make_reference(tok)), nlelement.make_reference(chunk))
+        sent = doc.sentences[1]
+        # 文節に含まれない単語は後ろの文節から、参照は取得できない
+        gap = sent.chunks[1].tokens.pop(0)
+        sent.index_chunks()
+        self.assertIs(sent.chunk_from_token(gap), sent.chunks[1])
+        self.assertIsNone(doc.chunkref_from_tokenref(nlelement.make_reference(gap)))
+        self.assertIsNone(sent.chunk_from_tid(len(sent.tokens)))
+        # 文節が追加された場合は索引を作り直す
+        chunk = nlelement.Chunk()
+        token = nlelement.Token()
+        token.sid, token.tid = sent.sid, len(sent.tokens)
+        chunk.add_token(token)
+        sent.tokens.append(token)
+        sent.chunks.append(chunk)
+        self.assertIs(sent.chunk_from_token(token), chunk)
+        copied = pickle.loads(pickle.dumps(doc))
+        self.assertIs(copied.sentences[0].tokens[0].chunk, copied.sentences[0].chunks[0])
+
     def test_make_reference(self):
         doc = self.samples.sample1()        
         self.assertEqual(nlelement.make_reference(doc.sentences[0].tokens[0]), nlelement.TokenReference(0, 0))
         self.assertEqual(nlelement.make_reference(doc.sentences[0].chunks[0]), nlelement.ChunkReference(0, 0))
+
+class CompactElementTest(unittest.TestCase):
+    def test_lazy_container(self):
+        token = nlelement.CompactToken()
+        self.assertDictEqual(token.coreference_link, {})
+        self.assertIsNone(token._coreference_link)
+        links = token.coreference_link
+        links['ga'] = 1
+        links['o'] = 2
+        self.assertDictEqual(token.coreference_link, {'ga': 1, 'o': 2})
+        self.assertDictEqual(nlelement.CompactToken().coreference_link, {})
+        token.other_features.append('feature')
+        self.assertListEqual(token.other_features, ['feature'])
+        token.semroles = {'ga': '動作主'}
+        self.assertDictEqual(vars(token), {'semroles': {'ga': '動作主'}})
+        self.assertIsInstance(token, nlelement.Token)
+
+    def test_chunk_link(self):
+        sentence = nlelement.CompactSentence()
+        chunks = [nlelement.CompactChunk() for _ in range(3)]
+        for cid, chunk in enumerate(chunks):
+            chunk.cid, chunk.link_id = cid, (2 if cid < 2 else -1)
+        sentence.chunks = chunks
+        for cid, chunk in enumerate(chunks):
+            sentence.__link_chunk__(cid, chunk)
+        self.assertIs(chunks[0].link, chunks[2])
+        self.assertListEqual(list(chunks[2].reverse_links), chunks[:2])
+        self.assertListEqual(chunks[2].reverse_link_ids, [0, 1])
+        self.assertEqual(len(chunks[0].reverse_links), 0)
+        copied = pickle.loads(pickle.dumps(sentence))
+        self.assertIs(copied.chunks[0].link, copied.chunks[2])
+        self.assertListEqual(list(copied.chunks[2].reverse_links), copied.chunks[:2])
+        self.assertListEqual(copied.chunks[2].reverse_link_ids, [0, 1])
+
+    def test_pickle_token_chunk(self):
+        """単語の文節への参照は直列化せず、文の復元時に設定し直されることを確認する
+        """
+        for sentence_class, chunk_class, token_class in (
+                (nlelement.Sentence, nlelement.Chunk, nlelement.Token),
+                (nlelement.CompactSentence, nlelement.CompactChunk, nlelement.CompactToken)
+            ):
+            sentence = sentence_class()
+            for cid in range(2):
+                chunk = chunk_class()
+                chunk.cid = cid
+                for _ in range(2):
+                    token = token_class()
+                    token.tid = len(sentence.tokens)
+                    chunk.add_token(token)
+                    sentence.tokens.append(token)
+                sentence.chunks.append(chunk)
+            sentence.index_chunks()
+            self.assertIsNone(pickle.loads(pickle.dumps(sentence.tokens[0])).chunk)
+            copied = pickle.loads(pickle.dumps(sentence))
+            for chunk in copied.chunks:
+                for token in chunk.tokens:
+                    self.assertIs(token.chunk, chunk)
+            self.assertEqual(copied.chunk_from_tid(3), copied.chunks[1])